@@ -0,0 +1,257 @@
+"""
+Casos de agentes por periodo (mes), particionados y solo de anexar.
+
+agent_score_central_period_v2.csv es una foto única del periodo completo. Este
+módulo deriva desde las llamadas crudas los casos de cada agente por mes y los
+guarda como una partición Parquet por mes:
+
+    agentes_por_periodo/
+        periodo=2023-01/casos.parquet   id_agente, casos_ganados, casos_perdidos,
+        periodo=2023-02/casos.parquet   casos_sin_resultado
+        indice.json                     particiones escritas (filas, bytes, fecha)
+
+Un caso es una llamada (fecha_rep, id_user, id_agente). Se considera ganado si
+el cliente NO aparece con churn en resultado_churn_por_mes.csv HORIZONTE_MESES
+después del mes de la llamada, perdido si aparece con churn, y sin resultado si
+no hay fila para ese cliente y mes. Un mes solo se escribe cuando su mes de
+resultado ya está en los datos de churn (periodo cerrado): desde entonces no
+cambia, por eso las particiones solo se anexan y cada corrida procesa
+únicamente los meses nuevos.
+
+El ranking de cualquier ventana de meses se arma sumando particiones
+(agentes_en_rango), con el mismo esquema que el CSV de agentes.
+
+Uso:
+    cd app
+    python agentes_por_periodo.py [--salida agentes_por_periodo] [--horizonte 1] [--rehacer]
+"""
+import argparse
+import json
+import os
+import shutil
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from procesamiento_datos import validar_churn, validar_llamadas
+
+base_dir = os.path.dirname(os.path.abspath(__file__))
+PARTICIONES_DIR = os.path.join(base_dir, "agentes_por_periodo")
+INDICE_NOMBRE = "indice.json"
+ARCHIVO_PARTICION = "casos.parquet"
+HORIZONTE_MESES = 1
+
+CALLS_FILE = os.path.join(base_dir, "debug_central_period_last_report_v2_filtrado.csv")
+CHURN_FILE = os.path.join(base_dir, "resultado_churn_por_mes.csv")
+
+COLUMNAS_CONTEO = ['casos_ganados', 'casos_perdidos', 'casos_sin_resultado']
+
+
+def _dir_particion(salida, periodo):
+    return os.path.join(salida, f"periodo={periodo}")
+
+
+def casos_por_periodo(df_calls, df_churn, horizonte_meses=HORIZONTE_MESES, periodos=None):
+    """
+    Cuenta casos ganados / perdidos / sin resultado por (periodo, id_agente).
+
+    Args:
+        df_calls: llamadas con fecha_rep (datetime), id_user, id_agente
+        df_churn: churn mensual con mes (datetime), id_user, churn
+        periodos: si se indica, solo se procesan esos meses ('YYYY-MM')
+
+    Returns:
+        DataFrame (periodo, id_agente, casos_ganados, casos_perdidos, casos_sin_resultado)
+    """
+    llamadas = df_calls[['fecha_rep', 'id_user', 'id_agente']].dropna()
+    mes = llamadas['fecha_rep'].dt.to_period('M')
+    periodo = mes.astype(str).to_numpy()
+    if periodos is not None:
+        dentro = np.isin(periodo, list(periodos))
+        llamadas, mes, periodo = llamadas[dentro], mes[dentro], periodo[dentro]
+
+    # Resultado de cada caso: churn del cliente en el mes de la llamada + horizonte
+    resultado = pd.DataFrame({
+        'id_user': llamadas['id_user'].to_numpy(),
+        'mes_resultado': (mes + horizonte_meses).dt.to_timestamp().to_numpy()
+    })
+    churn = df_churn[['mes', 'id_user', 'churn']].drop_duplicates(['mes', 'id_user'])
+    churn = churn.rename(columns={'mes': 'mes_resultado'})
+    churn['mes_resultado'] = churn['mes_resultado'].dt.to_period('M').dt.to_timestamp()
+    churn_caso = resultado.merge(churn, on=['mes_resultado', 'id_user'], how='left')['churn'].to_numpy()
+
+    con_resultado = ~pd.isna(churn_caso)
+    perdido = con_resultado & (churn_caso == True)  # noqa: E712 (object con NaN)
+    casos = pd.DataFrame({
+        'periodo': periodo,
+        'id_agente': llamadas['id_agente'].to_numpy().astype(np.int64),
+        'casos_ganados': (con_resultado & ~perdido).astype(np.int64),
+        'casos_perdidos': perdido.astype(np.int64),
+        'casos_sin_resultado': (~con_resultado).astype(np.int64)
+    })
+    return casos.groupby(['periodo', 'id_agente'], as_index=False, sort=True)[COLUMNAS_CONTEO].sum()
+
+
+def periodos_cerrados(df_calls, df_churn, horizonte_meses=HORIZONTE_MESES):
+    """Meses de llamadas ('YYYY-MM') cuyo mes de resultado ya está en los datos de churn"""
+    ultimo_churn = df_churn['mes'].max().to_period('M')
+    meses = df_calls['fecha_rep'].dropna().dt.to_period('M').unique()
+    return sorted(str(m) for m in meses if m + horizonte_meses <= ultimo_churn)
+
+
+def leer_indice(salida=PARTICIONES_DIR):
+    """Índice de particiones o None si todavía no se ha escrito ninguna"""
+    ruta = os.path.join(salida, INDICE_NOMBRE)
+    if not os.path.exists(ruta):
+        return None
+    with open(ruta) as f:
+        return json.load(f)
+
+
+def _escribir_indice(indice, salida):
+    ruta = os.path.join(salida, INDICE_NOMBRE)
+    with open(ruta + ".tmp", 'w') as f:
+        json.dump(indice, f, indent=2)
+    os.replace(ruta + ".tmp", ruta)
+
+
+def actualizar_particiones(df_calls, df_churn, salida=PARTICIONES_DIR, horizonte_meses=HORIZONTE_MESES):
+    """
+    Escribe las particiones de los meses cerrados que aún no existen.
+
+    Returns:
+        lista de periodos escritos en esta corrida
+    """
+    os.makedirs(salida, exist_ok=True)
+    indice = leer_indice(salida)
+    if indice is not None and indice.get('horizonte_meses') != horizonte_meses:
+        raise ValueError(
+            f"Las particiones de {salida} usan horizonte {indice.get('horizonte_meses')}; "
+            f"usa --rehacer para regenerarlas con horizonte {horizonte_meses}"
+        )
+    if indice is None:
+        indice = {'horizonte_meses': horizonte_meses, 'particiones': {}}
+
+    nuevos = [p for p in periodos_cerrados(df_calls, df_churn, horizonte_meses) if p not in indice['particiones']]
+    if not nuevos:
+        return []
+
+    casos = casos_por_periodo(df_calls, df_churn, horizonte_meses, periodos=nuevos)
+    for periodo, grupo in casos.groupby('periodo', sort=True):
+        directorio = _dir_particion(salida, periodo)
+        os.makedirs(directorio, exist_ok=True)
+        ruta = os.path.join(directorio, ARCHIVO_PARTICION)
+        grupo.drop(columns='periodo').to_parquet(ruta + ".tmp", index=False)
+        os.replace(ruta + ".tmp", ruta)
+        indice['particiones'][periodo] = {
+            'filas': int(len(grupo)),
+            'casos': int(grupo[COLUMNAS_CONTEO].to_numpy().sum()),
+            'bytes': os.path.getsize(ruta),
+            'escrito': datetime.now().isoformat(timespec='seconds')
+        }
+    indice['particiones'] = dict(sorted(indice['particiones'].items()))
+    indice['version'] = f"{len(indice['particiones'])}-{max(indice['particiones'])}"
+    _escribir_indice(indice, salida)
+    return sorted(set(casos['periodo']))
+
+
+def leer_particiones(salida=PARTICIONES_DIR, desde=None, hasta=None):
+    """
+    Lee las particiones del rango [desde, hasta] ('YYYY-MM', inclusive).
+
+    Returns:
+        DataFrame (periodo, id_agente, conteos) o None si no hay índice
+    """
+    indice = leer_indice(salida)
+    if indice is None:
+        return None
+    partes = []
+    for periodo in indice['particiones']:
+        if (desde and periodo < desde) or (hasta and periodo > hasta):
+            continue
+        parte = pd.read_parquet(os.path.join(_dir_particion(salida, periodo), ARCHIVO_PARTICION))
+        parte.insert(0, 'periodo', periodo)
+        partes.append(parte)
+    if not partes:
+        return pd.DataFrame(columns=['periodo', 'id_agente'] + COLUMNAS_CONTEO)
+    return pd.concat(partes, ignore_index=True)
+
+
+def agentes_en_rango(df_periodos, desde=None, hasta=None):
+    """
+    Suma las particiones del rango por agente.
+
+    Returns:
+        DataFrame con el esquema del CSV de agentes (id_agente, total_casos,
+        casos_ganados, casos_perdidos, winrate); los casos sin resultado no
+        cuentan en total_casos
+    """
+    periodo = df_periodos['periodo'].to_numpy()
+    mascara = np.ones(len(df_periodos), dtype=bool)
+    if desde:
+        mascara &= periodo >= desde
+    if hasta:
+        mascara &= periodo <= hasta
+    suma = df_periodos[mascara].groupby('id_agente', as_index=False)[['casos_ganados', 'casos_perdidos']].sum()
+    suma['total_casos'] = suma['casos_ganados'] + suma['casos_perdidos']
+    suma = suma[suma['total_casos'] > 0]
+    suma['winrate'] = suma['casos_ganados'] / suma['total_casos'] * 100
+    return suma[['id_agente', 'total_casos', 'casos_ganados', 'casos_perdidos', 'winrate']].reset_index(drop=True)
+
+
+def tendencia_equipo(df_periodos):
+    """Winrate ponderado del equipo por periodo (periodo, total_casos, casos_ganados, winrate)"""
+    por_mes = df_periodos.groupby('periodo', as_index=False)[['casos_ganados', 'casos_perdidos']].sum()
+    por_mes['total_casos'] = por_mes['casos_ganados'] + por_mes['casos_perdidos']
+    por_mes['winrate'] = np.where(
+        por_mes['total_casos'] > 0,
+        por_mes['casos_ganados'] / por_mes['total_casos'].where(por_mes['total_casos'] > 0, 1) * 100,
+        np.nan
+    )
+    return por_mes[['periodo', 'total_casos', 'casos_ganados', 'winrate']]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Particiones mensuales de casos por agente (solo se anexan meses nuevos)")
+    parser.add_argument('--salida', default=PARTICIONES_DIR, help="Directorio de particiones")
+    parser.add_argument('--llamadas', default=CALLS_FILE, help="CSV de llamadas (fecha_rep, id_user, id_agente)")
+    parser.add_argument('--churn', default=CHURN_FILE, help="CSV de churn por mes")
+    parser.add_argument('--horizonte', type=int, default=HORIZONTE_MESES, help="Meses después de la llamada para medir el resultado")
+    parser.add_argument('--rehacer', action='store_true', help="Borrar las particiones existentes y recalcular todo")
+    args = parser.parse_args()
+
+    print("="*80)
+    print("CASOS DE AGENTES POR PERIODO")
+    print("="*80)
+    inicio = time.time()
+
+    if args.rehacer and os.path.isdir(args.salida):
+        shutil.rmtree(args.salida)
+        print(f"\n   Particiones anteriores eliminadas ({args.salida})")
+
+    print("\n1. Leyendo llamadas y churn...")
+    df_calls = pd.read_csv(args.llamadas, usecols=['fecha_rep', 'Motivo', 'id_user', 'id_agente'], low_memory=False)
+    validar_llamadas(df_calls, args.llamadas)
+    df_churn = pd.read_csv(args.churn, usecols=['mes', 'id_user', 'dias_sin_transacciones', 'churn', 'monto_total'], low_memory=False)
+    validar_churn(df_churn, args.churn)
+    print(f"   ✓ {len(df_calls):,} llamadas, {len(df_churn):,} filas de churn")
+
+    print("\n2. Anexando meses cerrados nuevos...")
+    nuevos = actualizar_particiones(df_calls, df_churn, args.salida, args.horizonte)
+    indice = leer_indice(args.salida)
+    total = len(indice['particiones']) if indice else 0
+    if nuevos:
+        print(f"   ✓ {len(nuevos)} particiones nuevas: {nuevos[0]} … {nuevos[-1]}")
+    else:
+        print("   ✓ Sin meses nuevos")
+    print(f"   Particiones totales: {total}")
+
+    print("\n" + "="*80)
+    print(f"✅ PARTICIONES ACTUALIZADAS EN {time.time() - inicio:.1f}s")
+    print("="*80)
+
+
+if __name__ == "__main__":
+    main()
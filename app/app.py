@@ -20,9 +20,10 @@ import plotly.express as px
 import plotly.graph_objects as go
 import numpy as np
 import os
+import json
 import re
-from datetime import datetime, timedelta
-import random
+import time
+from datetime import datetime
 
 # ============================================================
 # 🎭 MODO DEMO - Datos ficticios para demostración
@@ -30,31 +31,51 @@ import random
 # IMPORTANTE: Esta rama usa datos ficticios, no requiere archivos CSV
 DEMO_MODE = True
 
+# Variables de entorno para pruebas de rendimiento (benchmark_paginas.py). Sin
+# ellas la app se comporta igual que siempre.
+if 'DANU_DEMO_MODE' in os.environ:
+    DEMO_MODE = os.environ['DANU_DEMO_MODE'] == '1'
+TAMANO_DEMO = {
+    'n_clients': int(os.environ.get('DANU_DEMO_CLIENTES', 500)),
+    'n_calls': int(os.environ.get('DANU_DEMO_LLAMADAS', 1000))
+}
+
 # Limpiar caché al inicio (solo una vez por sesión)
 if 'cache_cleared' not in st.session_state:
     st.cache_data.clear()
     st.session_state.cache_cleared = True
 
-def generate_dummy_data():
-    """Genera datos ficticios para demostración del dashboard"""
-    np.random.seed(42)
-    random.seed(42)
+def generate_dummy_data(n_clients=500, n_calls=1000, n_agents=20, n_months=12, seed=42):
+    """
+    Genera datos ficticios para demostración del dashboard.
+
+    Toda la generación es vectorizada (numpy.random.Generator), así que también
+    sirve para pruebas de carga con millones de clientes.
+
+    Args:
+        n_clients: número de clientes
+        n_calls: número de llamadas/reportes
+        n_agents: número de agentes
+        n_months: meses de historial
+        seed: semilla del generador
+    """
+    rng = np.random.default_rng(seed)
     
-    # ============ DATOS HISTÓRICOS (12 meses) ============
-    dates = pd.date_range(end=datetime.now(), periods=12, freq='M')
+    # ============ DATOS HISTÓRICOS ============
+    dates = pd.date_range(end=datetime.now(), periods=n_months, freq='M')
+    meses = np.arange(n_months)
     
     # Generar tendencia realista de churn (empieza alto, baja con el tiempo)
     base_churn = 15  # 15% base
-    churn_rates = [base_churn + np.random.normal(0, 2) - i*0.3 for i in range(12)]
-    churn_rates = [max(5, min(25, c)) for c in churn_rates]  # Limitar entre 5-25%
+    churn_rates = np.clip(base_churn + rng.normal(0, 2, n_months) - meses*0.3, 5, 25)  # Limitar entre 5-25%
     
     # Ingresos crecientes
     base_income = 500000
-    incomes = [base_income * (1 + i*0.08) + np.random.normal(0, 30000) for i in range(12)]
+    incomes = base_income * (1 + meses*0.08) + rng.normal(0, 30000, n_months)
     
     # Transacciones crecientes
     base_tx = 50000
-    transactions = [int(base_tx * (1 + i*0.05) + np.random.normal(0, 2000)) for i in range(12)]
+    transactions = (base_tx * (1 + meses*0.05) + rng.normal(0, 2000, n_months)).astype(int)
     
     df_history = pd.DataFrame({
         'Fecha': dates,
@@ -65,9 +86,9 @@ def generate_dummy_data():
     
     # ============ PREDICCIONES FUTURAS (3 meses) ============
     future_dates = pd.date_range(start=dates[-1], periods=4, freq='M')[1:]
-    last_churn = churn_rates[-1]
-    future_churn = [last_churn - 0.5*i + np.random.normal(0, 0.5) for i in range(1, 4)]
-    future_income = [incomes[-1] * (1.05 ** i) for i in range(1, 4)]
+    pasos = np.arange(1, 4)
+    future_churn = churn_rates[-1] - 0.5*pasos + rng.normal(0, 0.5, 3)
+    future_income = incomes[-1] * (1.05 ** pasos)
     
     df_future = pd.DataFrame({
         'Fecha': future_dates,
@@ -75,76 +96,41 @@ def generate_dummy_data():
         'Ingresos Proyectados': future_income
     })
     
-    # ============ CLIENTES (500 clientes demo) ============
-    n_clients = 500
+    # ============ CLIENTES ============
+    client_ids = np.char.mod('USR%06d', np.arange(1, n_clients + 1)).astype(object)
     
-    # Generar IDs de cliente
-    client_ids = [f"USR{str(i).zfill(6)}" for i in range(1, n_clients + 1)]
+    # Segmentos con distribución realista (códigos: 0=Básico, 1=Premium, 2=VIP)
+    segmentos = ['Básico', 'Premium', 'VIP']
+    seg = rng.choice(3, n_clients, p=[0.5, 0.35, 0.15])
     
-    # Segmentos con distribución realista
-    segments = np.random.choice(['Básico', 'Premium', 'VIP'], n_clients, p=[0.5, 0.35, 0.15])
+    # Probabilidad de churn basada en segmento: Básico alto, Premium medio, VIP bajo
+    churn_probs = rng.beta(np.array([4, 3, 2])[seg], np.array([6, 7, 10])[seg])
     
-    # Probabilidad de churn basada en segmento
-    churn_probs = []
-    for seg in segments:
-        if seg == 'VIP':
-            churn_probs.append(np.random.beta(2, 10))  # Bajo churn
-        elif seg == 'Premium':
-            churn_probs.append(np.random.beta(3, 7))   # Medio churn
-        else:
-            churn_probs.append(np.random.beta(4, 6))   # Alto churn
-    
-    # Nivel de riesgo basado en probabilidad
-    def get_risk(prob):
-        if prob < 0.25:
-            return 'Bajo'
-        elif prob < 0.50:
-            return 'Medio'
-        elif prob < 0.75:
-            return 'Alto'
-        else:
-            return 'Crítico'
-    
-    risks = [get_risk(p) for p in churn_probs]
+    # Nivel de riesgo basado en probabilidad (<0.25 Bajo, <0.50 Medio, <0.75 Alto, resto Crítico)
+    niveles = ['Bajo', 'Medio', 'Alto', 'Crítico']
+    riesgo = np.digitize(churn_probs, [0.25, 0.50, 0.75])
     
     # Días sin transacciones correlacionados con riesgo
-    days_no_tx = []
-    for risk in risks:
-        if risk == 'Bajo':
-            days_no_tx.append(np.random.randint(0, 15))
-        elif risk == 'Medio':
-            days_no_tx.append(np.random.randint(10, 30))
-        elif risk == 'Alto':
-            days_no_tx.append(np.random.randint(25, 42))
-        else:
-            days_no_tx.append(np.random.randint(35, 60))
+    days_no_tx = rng.integers(np.array([0, 10, 25, 35])[riesgo], np.array([15, 30, 42, 60])[riesgo])
     
     # Monto total basado en segmento
-    amounts = []
-    for seg in segments:
-        if seg == 'VIP':
-            amounts.append(np.random.uniform(50000, 200000))
-        elif seg == 'Premium':
-            amounts.append(np.random.uniform(10000, 50000))
-        else:
-            amounts.append(np.random.uniform(500, 10000))
+    amounts = rng.uniform(np.array([500, 10000, 50000])[seg], np.array([10000, 50000, 200000])[seg])
     
     # Churn real (basado en días sin transacciones >= 42)
-    churned = [d >= 42 for d in days_no_tx]
+    churned = days_no_tx >= 42
     
     df_clients = pd.DataFrame({
         'ID': client_ids,
-        'Segmento': pd.Categorical(segments, categories=['Básico', 'Premium', 'VIP'], ordered=True),
+        'Segmento': pd.Categorical.from_codes(seg, categories=segmentos, ordered=True),
         'Probabilidad Churn': churn_probs,
-        'Riesgo': pd.Categorical(risks, categories=['Bajo', 'Medio', 'Alto', 'Crítico'], ordered=True),
+        'Riesgo': pd.Categorical.from_codes(riesgo, categories=niveles, ordered=True),
         'Días sin Trans': days_no_tx,
         'Monto Total': amounts,
         'Churn': churned
     })
     
-    # ============ LLAMADAS/REPORTES (1000 registros) ============
-    n_calls = 1000
-    call_dates = [datetime.now() - timedelta(days=np.random.randint(0, 90)) for _ in range(n_calls)]
+    # ============ LLAMADAS/REPORTES ============
+    call_dates = datetime.now() - pd.to_timedelta(rng.integers(0, 90, n_calls), unit='D')
     motivos = [
         'Consulta de saldo', 'Problema con tarjeta', 'Transferencia fallida',
         'Solicitud de información', 'Queja por cobros', 'Bloqueo de cuenta',
@@ -154,29 +140,26 @@ def generate_dummy_data():
     
     df_calls = pd.DataFrame({
         'fecha_rep': call_dates,
-        'Motivo': np.random.choice(motivos, n_calls, p=motivo_probs),
-        'id_user': np.random.choice(client_ids, n_calls),
-        'duracion_min': np.random.exponential(5, n_calls),
-        'resuelto': np.random.choice([True, False], n_calls, p=[0.85, 0.15])
+        'Motivo': np.array(motivos, dtype=object)[rng.choice(len(motivos), n_calls, p=motivo_probs)],
+        'id_user': client_ids[rng.integers(0, n_clients, n_calls)],
+        'duracion_min': rng.exponential(5, n_calls),
+        'resuelto': rng.random(n_calls) < 0.85
     })
     
-    # ============ AGENTES (20 agentes) ============
-    n_agents = 20
-    agent_names = [f"Agente {i}" for i in range(1, n_agents + 1)]
-    
+    # ============ AGENTES ============
     df_agents = pd.DataFrame({
         'id_agente': range(1, n_agents + 1),
-        'nombre': agent_names,
-        'winrate': np.random.uniform(0.6, 0.95, n_agents),
-        'casos_ganados': np.random.randint(50, 200, n_agents),
-        'total_casos': np.random.randint(100, 250, n_agents),
-        'calificacion': np.random.uniform(3.5, 5.0, n_agents)
+        'nombre': [f"Agente {i}" for i in range(1, n_agents + 1)],
+        'winrate': rng.uniform(0.6, 0.95, n_agents),
+        'casos_ganados': rng.integers(50, 200, n_agents),
+        'total_casos': rng.integers(100, 250, n_agents),
+        'calificacion': rng.uniform(3.5, 5.0, n_agents)
     })
     df_agents['winrate'] = df_agents['casos_ganados'] / df_agents['total_casos']
     
     # ============ CHURN RAW (para compatibilidad) ============
     df_churn_raw = pd.DataFrame({
-        'mes': np.random.choice(dates, n_clients),
+        'mes': dates[rng.integers(0, n_months, n_clients)],
         'id_user': client_ids,
         'churn': churned,
         'monto_total': amounts,
@@ -193,16 +176,37 @@ def generate_dummy_data():
         "base_datos": None  # No necesario en demo
     }
 
+@st.cache_resource(show_spinner=False)
+def get_datos_demo(n_clients, n_calls):
+    """Datos demo compartidos por todas las sesiones del proceso (no se copian por sesión)"""
+    return DatasetCompartido(generate_dummy_data(n_clients=n_clients, n_calls=n_calls),
+                             version=f"demo-{n_clients}-{n_calls}")
+
 # Solo importar ChurnPredictor si no estamos en modo demo
 if not DEMO_MODE:
     from churn_predictor import ChurnPredictor
+    from scoring_online import ScorerOnline
 
 # Constantes globales para cálculos
 PESO_PROBABILIDAD = 0.4
 PESO_MONTO = 0.4
 PESO_DIAS = 0.2
-UMBRAL_CHURN_ML = 0.5  # Para modelo ML
-UMBRAL_CHURN_DIAS = 42  # Regla de negocio: días para considerar churn real
+from procesamiento_datos import estimar_ingresos_desde_monto_total, leer_fuentes, derivar_tablas
+from ingesta_streaming import leer_fuentes_streaming
+from precalcular_tablas import ARTEFACTOS_DIR, leer_manifest, fuentes_modificadas, cargar_artefactos
+import instrumentacion
+import metricas
+import memoria_sesiones
+from dataset_compartido import DatasetCompartido, congelar
+from agentes_por_periodo import (
+    PARTICIONES_DIR as AGENTES_PERIODO_DIR, leer_indice as leer_indice_periodos,
+    leer_particiones, agentes_en_rango, tendencia_equipo
+)
+from ranking_agentes import (
+    COLUMNAS_REQUERIDAS as COLUMNAS_REQUERIDAS_AGENTES, IndiceRanking, comparativa_agentes, etiqueta_agente
+)
+from simulacion_montecarlo import simular_escenario, UMBRAL_CHURN
+from streamlit.runtime.scriptrunner import get_script_run_ctx
 
 # Configuración de la página
 st.set_page_config(
@@ -852,10 +856,34 @@ st.markdown("""
 
 # Carga de datos desde CSVs
 base_dir = os.path.dirname(os.path.abspath(__file__))
-CALLS_FILE = os.path.join(base_dir, "debug_central_period_last_report_v2_filtrado.csv")
-AGENTS_FILE = os.path.join(base_dir, "agent_score_central_period_v2.csv")
-CHURN_FILE = os.path.join(base_dir, "resultado_churn_por_mes.csv")
-BASE_DATOS_FILE = os.path.join(base_dir, "BaseDeDatos.csv")
+datos_dir = os.environ.get('DANU_DATOS_DIR', base_dir)
+CALLS_FILE = os.path.join(datos_dir, "debug_central_period_last_report_v2_filtrado.csv")
+AGENTS_FILE = os.path.join(datos_dir, "agent_score_central_period_v2.csv")
+CHURN_FILE = os.path.join(datos_dir, "resultado_churn_por_mes.csv")
+BASE_DATOS_FILE = os.path.join(datos_dir, "BaseDeDatos.csv")
+ARTEFACTOS_DIR = os.environ.get('DANU_ARTEFACTOS_DIR', ARTEFACTOS_DIR)
+# Casos por agente y mes (ver agentes_por_periodo.py); si no existen, el ranking
+# usa la foto de AGENTS_FILE
+AGENTES_PERIODO_DIR = os.environ.get('DANU_AGENTES_PERIODO_DIR', AGENTES_PERIODO_DIR)
+FEATURES_FILE = os.path.join(base_dir, "churn_features.json")
+
+# Ingesta por bloques para archivos más grandes que la RAM (ver ingesta_streaming.py)
+INGESTA_STREAMING = False
+MEMORIA_MAX_INGESTA_MB = 256  # Memoria aproximada por bloque de lectura (no el pico del proceso)
+
+# Procesos para evaluar el modelo en load_data (0 = proceso actual, ver scoring_paralelo.py)
+PROCESOS_SCORING = 0
+
+# Métricas en formato Prometheus (ver metricas.py): endpoint local GET /metrics
+# y/o archivo reescrito periódicamente ("{pid}" en la ruta = un archivo por proceso)
+METRICAS_PUERTO = os.environ.get('DANU_METRICAS_PUERTO')
+METRICAS_ARCHIVO = os.environ.get('DANU_METRICAS_ARCHIVO')
+METRICAS_INTERVALO_S = int(os.environ.get('DANU_METRICAS_INTERVALO_S', metricas.INTERVALO_ARCHIVO_S))
+
+# Presupuesto de memoria de los cachés por sesión (clients_cache, dashboard_cache)
+# de todo el proceso; al superarlo se vacían los menos usados (memoria_sesiones.py)
+PRESUPUESTO_CACHE_SESIONES_MB = int(os.environ.get('DANU_PRESUPUESTO_CACHE_MB', 512))
+memoria_sesiones.configurar(PRESUPUESTO_CACHE_SESIONES_MB * 1024 * 1024)
 
 def calcular_ingresos_reales(df_transacciones):
     """
@@ -906,282 +934,58 @@ def calcular_ingresos_reales(df_transacciones):
     
     return ingresos_totales
 
-def estimar_ingresos_desde_monto_total(monto_total, num_usuarios=None, num_transacciones=None):
-    """
-    Estima ingresos de DANU basados en tasa de comisión efectiva realista.
-    
-    Considerando que:
-    - Solo ~25-30% de transacciones generan comisión
-    - La mayoría son transferencias GRATIS
-    - Depósitos con tarjeta (2.2%) son minoría
-    - Comisiones fijas ($12-18) son sobre transacciones específicas
-    
-    Tasa de comisión efectiva típica en fintechs: 0.3% - 0.5% del monto transaccionado
-    """
-    
-    # Tasa de comisión efectiva conservadora
-    # Basada en: ~25% de transacciones generan comisión promedio de 1.5%
-    # Tasa efectiva = 0.25 * 0.015 = 0.00375 ≈ 0.4%
-    TASA_COMISION_EFECTIVA = 0.004  # 0.4% del monto total
-    
-    # Calcular ingresos base por comisiones porcentuales
-    ingresos_porcentuales = monto_total * TASA_COMISION_EFECTIVA
-    
-    # Agregar ingresos por comisiones fijas (basado en usuarios)
-    ingresos_fijos = 0
-    if num_usuarios and num_usuarios > 0:
-        # Comisiones fijas estimadas por usuario activo por mes:
-        # - ~20% hacen depósito efectivo ($13): 0.20 * $13 = $2.60
-        # - ~15% hacen retiro QR ($12): 0.15 * $12 = $1.80
-        # - ~5% hacen retiro sin tarjeta ($18): 0.05 * $18 = $0.90
-        # - ~5% hacen 3ra+ transferencia ($2.55): 0.05 * $2.55 = $0.13
-        # - ~0.5% reponen tarjeta ($55): 0.005 * $55 = $0.28
-        # Total por usuario activo: ~$5.70/mes
-        INGRESO_FIJO_POR_USUARIO = 5.70
-        ingresos_fijos = num_usuarios * INGRESO_FIJO_POR_USUARIO
-    elif num_transacciones and num_transacciones > 0:
-        # Si no tenemos usuarios, estimar basado en transacciones
-        # Asumiendo ~8 transacciones por usuario
-        usuarios_estimados = num_transacciones / 8
-        ingresos_fijos = usuarios_estimados * 5.70
-    
-    ingresos_totales = ingresos_porcentuales + ingresos_fijos
-    
-    return ingresos_totales
-
-@st.cache_data(ttl=300, show_spinner=False)  # Caché de 5 minutos, sin persistencia en disco
+# Caché de 5 minutos compartido por todas las sesiones: cache_resource no copia el
+# resultado en cada llamada, así cada sesión solo guarda una referencia al mismo
+# DatasetCompartido (tablas de solo lectura, ver dataset_compartido.py).
+@st.cache_resource(ttl=300, show_spinner=False)
 def load_data():
-    try:
-        # Cargar CSV de llamadas/reportes
-        df_calls = pd.read_csv(CALLS_FILE, low_memory=False)
-        if df_calls.empty:
-            raise ValueError(f"El archivo {CALLS_FILE} está vacío o solo tiene headers")
-        if len(df_calls) < 10:
-            st.warning(f"El archivo {CALLS_FILE} tiene muy pocos registros ({len(df_calls)})")
-        if 'fecha_rep' in df_calls.columns:
-            df_calls['fecha_rep'] = pd.to_datetime(df_calls['fecha_rep'], errors='coerce')
-        if 'Motivo' not in df_calls.columns:
-            raise ValueError("El archivo de llamadas no contiene la columna 'Motivo'")
+    metricas.marcar_ejecucion_carga()  # Solo corre si el caché no tenía el resultado
 
-        # Cargar CSV de agentes
-        df_agents = pd.read_csv(AGENTS_FILE, low_memory=False)
-        if df_agents.empty:
-            raise ValueError(f"El archivo {AGENTS_FILE} está vacío o solo tiene headers")
-        if len(df_agents) < 10:
-            st.warning(f"El archivo {AGENTS_FILE} tiene muy pocos registros ({len(df_agents)})")
-        required_agent_cols = ['id_agente', 'winrate', 'casos_ganados', 'total_casos']
-        missing_cols = [col for col in required_agent_cols if col not in df_agents.columns]
-        if missing_cols:
-            raise ValueError(f"El archivo de agentes no contiene las columnas: {missing_cols}")
+    def avisar(nivel, mensaje):
+        getattr(st, nivel)(mensaje)
 
-        # Cargar CSV de churn por mes
-        df_churn = pd.read_csv(CHURN_FILE, low_memory=False)
-        if df_churn.empty:
-            raise ValueError(f"El archivo {CHURN_FILE} está vacío o solo tiene headers")
-        if len(df_churn) < 10:
-            st.warning(f"El archivo {CHURN_FILE} tiene muy pocos registros ({len(df_churn)})")
-        df_churn['mes'] = pd.to_datetime(df_churn['mes'], errors='coerce')
-        required_churn_cols = ['mes', 'churn', 'monto_total', 'id_user', 'dias_sin_transacciones']
-        missing_cols = [col for col in required_churn_cols if col not in df_churn.columns]
-        if missing_cols:
-            raise ValueError(f"El archivo de churn no contiene las columnas: {missing_cols}")
-        
-        # Procesar datos históricos de churn
-        # Verificar si resultado_churn_por_mes.csv tiene columna tx_count
-        if 'tx_count' in df_churn.columns:
-            # Usar tx_count para sumar transacciones reales
-            agg_dict = {
-                'churn': lambda x: (x.sum() / len(x) * 100),  # Porcentaje de churn
-                'monto_total': 'sum',  # Ingresos totales del mes
-                'tx_count': 'sum'  # Sumar transacciones reales por usuario
-            }
-        else:
-            # Si no tiene tx_count, intentar obtenerlo de BaseDeDatos
-            if os.path.exists(BASE_DATOS_FILE):
-                try:
-                    df_base_temp = pd.read_csv(BASE_DATOS_FILE, low_memory=False)
-                    if 'tx_count' in df_base_temp.columns and 'id_user' in df_base_temp.columns:
-                        # Merge para obtener tx_count
-                        df_churn = df_churn.merge(
-                            df_base_temp[['id_user', 'tx_count']].groupby('id_user')['tx_count'].first().reset_index(),
-                            on='id_user',
-                            how='left'
-                        )
-                        df_churn['tx_count'] = df_churn['tx_count'].fillna(0)
-                        agg_dict = {
-                            'churn': lambda x: (x.sum() / len(x) * 100),
-                            'monto_total': 'sum',
-                            'tx_count': 'sum'
-                        }
-                    else:
-                        # Fallback: usar count pero renombrar métrica
-                        agg_dict = {
-                            'churn': lambda x: (x.sum() / len(x) * 100),
-                            'monto_total': 'sum',
-                            'id_user': 'count'  # Registros usuario-mes (no transacciones reales)
-                        }
-                except:
-                    # Fallback: usar count
-                    agg_dict = {
-                        'churn': lambda x: (x.sum() / len(x) * 100),
-                        'monto_total': 'sum',
-                        'id_user': 'count'
-                    }
-            else:
-                # Fallback: usar count
-                agg_dict = {
-                    'churn': lambda x: (x.sum() / len(x) * 100),
-                    'monto_total': 'sum',
-                    'id_user': 'count'
-                }
-        
-        df_history = df_churn.groupby('mes').agg(agg_dict).reset_index()
-        
-        # Renombrar columnas según lo que se agregó
-        if 'tx_count' in agg_dict:
-            df_history.columns = ['Fecha', 'Tasa Churn', 'Monto_Transaccionado', 'Transacciones']
-        else:
-            df_history.columns = ['Fecha', 'Tasa Churn', 'Monto_Transaccionado', 'Transacciones']  # Mantener nombre aunque sea count
-        
-        df_history['Ingresos'] = 0.0
-        
-        for idx, row in df_history.iterrows():
-            fecha = row['Fecha']
-            monto_transaccionado = row['Monto_Transaccionado']
-            
-            usuarios_mes = df_churn[df_churn['mes'] == fecha]['id_user'].nunique()
-            
-            ingresos_estimados = estimar_ingresos_desde_monto_total(
-                monto_total=monto_transaccionado,
-                num_usuarios=usuarios_mes
-            )
-            
-            df_history.at[idx, 'Ingresos'] = ingresos_estimados
-        
-        df_history = df_history[['Fecha', 'Tasa Churn', 'Ingresos', 'Transacciones']]
-        
-        df_history = df_history.sort_values('Fecha')
-        
-        # Validar que no esté vacío
-        if df_history.empty:
-            raise ValueError("No hay datos históricos después del procesamiento")
-        if len(df_history) < 10:
-            st.warning(f"El archivo de churn tiene muy pocos registros ({len(df_history)})")
+    try:
+        # Si existen artefactos precalculados (precalcular_tablas.py), solo leerlos
+        manifest = leer_manifest(ARTEFACTOS_DIR)
+        if manifest is not None:
+            modificadas = fuentes_modificadas(manifest, [CALLS_FILE, AGENTS_FILE, CHURN_FILE, BASE_DATOS_FILE])
+            if modificadas:
+                st.warning(f"Los artefactos precalculados ({manifest['version']}) son anteriores a: {', '.join(modificadas)}. Ejecuta precalcular_tablas.py para actualizarlos.")
+            return DatasetCompartido(cargar_artefactos(ARTEFACTOS_DIR, manifest), version=manifest['version'])
 
-        # Generar predicciones futuras
-        dates_future = pd.date_range(start=df_history['Fecha'].max(), periods=4, freq='M')[1:]
-        df_base = None
-        if os.path.exists(BASE_DATOS_FILE):
-            try:
-                df_base = pd.read_csv(BASE_DATOS_FILE, low_memory=False)
-                if 'first_tx' in df_base.columns:
-                    df_base['first_tx'] = pd.to_datetime(df_base['first_tx'], errors='coerce')
-                if 'last_tx' in df_base.columns:
-                    df_base['last_tx'] = pd.to_datetime(df_base['last_tx'], errors='coerce')
-            except:
-                df_base = None
-        
-        # Calcular predicciones futuras
-        if df_base is not None:
-            try:
-                predictor = get_predictor()
-                probas = predictor.predict_proba(df_base)
-                churn_rate_actual = (probas >= UMBRAL_CHURN_ML).mean() * 100
-                
-                last_churn = df_history['Tasa Churn'].iloc[-1]
-                trend = df_history['Tasa Churn'].diff().mean() if len(df_history) > 1 else 0
-                
-                future_churn_rates = []
-                for i in range(1, 4):
-                    pred = churn_rate_actual + (trend * i)
-                    future_churn_rates.append(max(0, min(100, pred)))
-                
-                ingresos_promedio = df_history['Ingresos'].mean()
-                ingresos_ultimos_3 = df_history['Ingresos'].tail(3).mean() if len(df_history) >= 3 else ingresos_promedio
-                
-                if len(df_history) >= 2:
-                    tasa_crecimiento_ingresos = (df_history['Ingresos'].iloc[-1] / df_history['Ingresos'].iloc[-2]) if df_history['Ingresos'].iloc[-2] > 0 else 1.0
-                else:
-                    tasa_crecimiento_ingresos = 1.0
-                
-                ingresos_proyectados = []
-                ultimo_ingreso = df_history['Ingresos'].iloc[-1] if not df_history.empty else ingresos_promedio
-                
-                for i in range(1, 4):
-                    ingreso_proyectado = ultimo_ingreso * (tasa_crecimiento_ingresos ** i)
-                    ingresos_proyectados.append(ingreso_proyectado)
-                
-                df_future = pd.DataFrame({
-                    "Fecha": dates_future,
-                    "Predicción Churn": future_churn_rates,
-                    "Ingresos Proyectados": ingresos_proyectados
-                })
-            except Exception as e:
-                last_churn = df_history['Tasa Churn'].iloc[-1]
-                trend = df_history['Tasa Churn'].diff().mean() if len(df_history) > 1 else 0
-                
-                ingresos_promedio = df_history['Ingresos'].mean()
-                ingresos_ultimos_3 = df_history['Ingresos'].tail(3).mean() if len(df_history) >= 3 else ingresos_promedio
-                
-                if len(df_history) >= 2:
-                    tasa_crecimiento_ingresos = (df_history['Ingresos'].iloc[-1] / df_history['Ingresos'].iloc[-2]) if df_history['Ingresos'].iloc[-2] > 0 else 1.0
-                else:
-                    tasa_crecimiento_ingresos = 1.0
-                
-                ingresos_proyectados = []
-                ultimo_ingreso = df_history['Ingresos'].iloc[-1] if not df_history.empty else ingresos_promedio
-                
-                for i in range(1, 4):
-                    ingreso_proyectado = ultimo_ingreso * (tasa_crecimiento_ingresos ** i)
-                    ingresos_proyectados.append(ingreso_proyectado)
-                
-                df_future = pd.DataFrame({
-                    "Fecha": dates_future,
-                    "Predicción Churn": [last_churn + trend*i for i in range(1, 4)],
-                    "Ingresos Proyectados": ingresos_proyectados
-                })
-        else:
-            last_churn = df_history['Tasa Churn'].iloc[-1]
-            trend = df_history['Tasa Churn'].diff().mean() if len(df_history) > 1 else 0
-            
-            ingresos_promedio = df_history['Ingresos'].mean()
-            ingresos_ultimos_3 = df_history['Ingresos'].tail(3).mean() if len(df_history) >= 3 else ingresos_promedio
-            
-            if len(df_history) >= 2:
-                tasa_crecimiento_ingresos = (df_history['Ingresos'].iloc[-1] / df_history['Ingresos'].iloc[-2]) if df_history['Ingresos'].iloc[-2] > 0 else 1.0
+        agregados, df_ultimo_mes = None, None
+        with instrumentacion.span('carga_datos.lectura_csv') as span_lectura:
+            if INGESTA_STREAMING:
+                df_calls, df_agents, df_churn, df_base, agregados, df_ultimo_mes = leer_fuentes_streaming(
+                    CALLS_FILE, AGENTS_FILE, CHURN_FILE, BASE_DATOS_FILE,
+                    FEATURES_FILE, MEMORIA_MAX_INGESTA_MB, avisar
+                )
             else:
-                tasa_crecimiento_ingresos = 1.0
-            
-            ingresos_proyectados = []
-            ultimo_ingreso = df_history['Ingresos'].iloc[-1] if not df_history.empty else ingresos_promedio
-            
-            for i in range(1, 4):
-                ingreso_proyectado = ultimo_ingreso * (tasa_crecimiento_ingresos ** i)
-                ingresos_proyectados.append(ingreso_proyectado)
-            
-            df_future = pd.DataFrame({
-                "Fecha": dates_future,
-                "Predicción Churn": [last_churn + trend*i for i in range(1, 4)],
-                "Ingresos Proyectados": ingresos_proyectados
-            })
+                df_calls, df_agents, df_churn, df_base = leer_fuentes(
+                    CALLS_FILE, AGENTS_FILE, CHURN_FILE, BASE_DATOS_FILE, avisar
+                )
+            span_lectura.filas = len(df_churn)
 
-        # Cargar BaseDeDatos completa para el modelo ML (si no se cargó antes)
-        if df_base is None and os.path.exists(BASE_DATOS_FILE):
-            try:
-                df_base = pd.read_csv(BASE_DATOS_FILE, low_memory=False)
-                # Convertir fechas si existen
-                if 'first_tx' in df_base.columns:
-                    df_base['first_tx'] = pd.to_datetime(df_base['first_tx'], errors='coerce')
-                if 'last_tx' in df_base.columns:
-                    df_base['last_tx'] = pd.to_datetime(df_base['last_tx'], errors='coerce')
-            except Exception as e:
-                df_base = None
+        try:
+            predictor = get_predictor()
+        except Exception as e:
+            st.warning(f"Error al usar modelo ML, usando método alternativo: {e}")
+            predictor = None
+
+        with instrumentacion.span('carga_datos.derivar_tablas'):
+            return DatasetCompartido(derivar_tablas(
+                df_calls, df_agents, df_churn, df_base, predictor, avisar,
+                agregados=agregados, df_ultimo_mes=df_ultimo_mes
+            ))
+
+    except FileNotFoundError as e:
+        st.error(f"Error Crítico: No se encontró el archivo **{e.filename}**.")
+        st.warning("Por favor, asegúrate de que los archivos CSV estén en la misma carpeta que `app.py`.")
+        st.stop()
+    except Exception as e:
+        st.error(f"Ocurrió un error cargando los datos: {e}")
+        st.stop()
 
-        # Clientes en Riesgo (del archivo de churn)
-        # Tomamos el último mes disponible
-        ultimo_mes = df_churn['mes'].max()
-        df_ultimo_mes = df_churn[df_churn['mes'] == ultimo_mes].copy()
-        
 # ============================================================
 # ==================== DULZURA - PARTE 2 ====================
 # ============================================================
@@ -1201,239 +1005,154 @@ def load_data():
 #     * Gráficos de evolución histórica, transacciones, distribución
 #     * Top motivos de contacto con tasa de churn
 #     * Tendencia de ingresos
+# NOTA: La categorización, el ML y la segmentación viven en
+#       procesamiento_datos.py (compartido con precalcular_tablas.py)
 # ============================================================
 
-        # CORRECCIÓN CONCEPTUAL: Separar clientes en categorías según umbral de 42 días
-        # Categorizar: Activo (<30), En Riesgo (30-42), Churneado (>=42)
-        df_ultimo_mes['estado_cliente'] = pd.cut(
-            df_ultimo_mes['dias_sin_transacciones'],
-            bins=[0, 30, UMBRAL_CHURN_DIAS, float('inf')],
-            labels=['Activo', 'En Riesgo', 'Churneado']
-        )
-        
-        # Incluir TODOS los usuarios (incluidos churneados) para permitir filtrado en UI
-        # El ML se aplicará solo a usuarios activos
-        df_clients = df_ultimo_mes.copy()
-        
-        # CORRECCIÓN CONCEPTUAL: Bins de riesgo alineados con regla de 42 días
-        # Riesgo basado en % del umbral: 50%, 75%, 100%, >100%
-        bins_riesgo = [
-            0,
-            UMBRAL_CHURN_DIAS * 0.5,   # 21 días = Bajo
-            UMBRAL_CHURN_DIAS * 0.75,  # 31.5 días = Medio
-            UMBRAL_CHURN_DIAS,         # 42 días = Alto (límite)
-            float('inf')               # 42+ días = Crítico (churneado)
-        ]
-        labels_riesgo = ['Bajo', 'Medio', 'Alto', 'Crítico']
-        
-        # Si tenemos BaseDeDatos, usar el modelo ML para calcular probabilidades reales
-        # CORRECCIÓN CONCEPTUAL: Filtrar SOLO usuarios activos antes de predecir
-        if df_base is not None:
-            try:
-                # Usar predictor cacheado
-                predictor = get_predictor()
-                
-                # Obtener IDs de todos los clientes del último mes (incluidos churneados)
-                # El ML se aplicará solo a usuarios activos
-                client_ids = df_clients['id_user'].unique()
-                
-                # FILTRAR solo usuarios NO churneados (activos) usando recency_days de BaseDeDatos.csv
-                usuarios_activos = df_base[
-                    (df_base['id_user'].isin(client_ids)) & 
-                    (df_base['recency_days'] < UMBRAL_CHURN_DIAS)
-                ].copy()
-                
-                # VALIDAR calidad de datos antes de predecir
-                validation = predictor.validate_data_quality(usuarios_activos)
-                
-                if not validation['is_valid']:
-                    st.error("Problemas con datos para ML:")
-                    for issue in validation['issues']:
-                        st.error(f"  - {issue}")
-                    # Usar método fallback
-                    usuarios_activos = pd.DataFrame()
-                elif validation['warnings']:
-                    for warning in validation['warnings']:
-                        st.warning(f"ML: {warning}")
-                
-                if validation['is_valid'] and not usuarios_activos.empty:
-                    # Predecir con el modelo solo para usuarios activos
-                    probas = predictor.predict_proba(usuarios_activos)
-                    
-                    # Mapear probabilidades solo a estos usuarios activos
-                    proba_dict = dict(zip(usuarios_activos['id_user'], probas))
-                    
-                    df_clients['Probabilidad Churn'] = df_clients['id_user'].map(proba_dict)
-                    
-                    # Rellenar probabilidades faltantes con método basado en días sin transacciones
-                    df_clients['Probabilidad Churn'] = df_clients['Probabilidad Churn'].fillna(
-                        df_clients['dias_sin_transacciones'] / 100
-                    ).clip(0, 1)
-                    
-                    # CORRECCIÓN: El nivel de Riesgo SIEMPRE se basa en días sin transacciones
-                    # No en la probabilidad del ML - respeta la regla de negocio de 42 días
-                    # Crítico = 42+ días, Alto = 31.5-42, Medio = 21-31.5, Bajo = 0-21
-                    df_clients['Riesgo'] = pd.cut(
-                        df_clients['dias_sin_transacciones'],
-                        bins=bins_riesgo,
-                        labels=labels_riesgo
-                    )
-                else:
-                    if usuarios_activos.empty:
-                        st.warning("No hay usuarios activos para predecir con ML (todos tienen recency_days >= 42)")
-                    # Fallback al método basado en días sin transacciones
-                    df_clients['Probabilidad Churn'] = df_clients['dias_sin_transacciones'] / 100
-                    df_clients['Probabilidad Churn'] = df_clients['Probabilidad Churn'].clip(0, 1)
-                    df_clients['Riesgo'] = pd.cut(
-                        df_clients['dias_sin_transacciones'],
-                        bins=bins_riesgo,
-                        labels=labels_riesgo
-                    )
-            except Exception as e:
-                # Si hay error con el modelo, usar método anterior
-                st.warning(f"Error al usar modelo ML, usando método alternativo: {e}")
-                df_clients['Probabilidad Churn'] = df_clients['dias_sin_transacciones'] / 100
-                df_clients['Probabilidad Churn'] = df_clients['Probabilidad Churn'].clip(0, 1)
-                df_clients['Riesgo'] = pd.cut(
-                    df_clients['dias_sin_transacciones'],
-                    bins=bins_riesgo,
-                    labels=labels_riesgo
-                )
-        else:
-            # Método anterior si no hay BaseDeDatos
-            df_clients['Probabilidad Churn'] = df_clients['dias_sin_transacciones'] / 100
-            df_clients['Probabilidad Churn'] = df_clients['Probabilidad Churn'].clip(0, 1)
-            df_clients['Riesgo'] = pd.cut(
-                df_clients['dias_sin_transacciones'],
-                bins=bins_riesgo,
-                labels=labels_riesgo
-            )
-        
-        # PRIMERO: Obtener monto histórico acumulado de BaseDeDatos para segmentación
-        if df_base is not None and 'amount_sum' in df_base.columns:
-            df_clients = df_clients.merge(
-                df_base[['id_user', 'amount_sum']].drop_duplicates(subset='id_user'),
-                on='id_user',
-                how='left'
-            )
-            # Usar amount_sum (histórico) para segmentación, fallback a monto_total del mes
-            df_clients['monto_para_segmentar'] = df_clients['amount_sum'].fillna(df_clients['monto_total'])
-        else:
-            df_clients['monto_para_segmentar'] = df_clients['monto_total']
-        
-        # Crear segmentos basados en monto HISTÓRICO usando percentiles fijos
-        if not df_clients['monto_para_segmentar'].empty and len(df_clients) > 0:
-            # Filtrar usuarios con monto positivo para calcular percentiles más representativos
-            montos_positivos = df_clients[df_clients['monto_para_segmentar'] > 0]['monto_para_segmentar']
-            
-            if len(montos_positivos) > 0:
-                # Calcular percentiles 33 y 66 SOLO de usuarios con actividad
-                p33 = montos_positivos.quantile(0.33)
-                p66 = montos_positivos.quantile(0.66)
-                
-                # Asignar segmentos con función vectorizada
-                conditions = [
-                    df_clients['monto_para_segmentar'] <= p33,  # Bajo monto -> Básico
-                    (df_clients['monto_para_segmentar'] > p33) & (df_clients['monto_para_segmentar'] <= p66),  # Medio -> Premium
-                    df_clients['monto_para_segmentar'] > p66  # Alto -> VIP
-                ]
-                choices = ['Básico', 'Premium', 'VIP']
-                
-                df_clients['Segmento'] = np.select(conditions, choices, default='Básico')
-            else:
-                # Todos tienen monto 0
-                df_clients['Segmento'] = 'Básico'
-            
-            # Convertir a categoría para mejor manejo
-            df_clients['Segmento'] = pd.Categorical(
-                df_clients['Segmento'], 
-                categories=['Básico', 'Premium', 'VIP'], 
-                ordered=True
-            )
-        else:
-            df_clients['Segmento'] = 'Básico'
-        
-        # Validar distribución de segmentos (solo loggear si hay problema)
-        segmento_counts_final = df_clients['Segmento'].value_counts()
-        total_clientes = len(df_clients)
-        
-        if total_clientes > 0:
-            min_pct = (segmento_counts_final.min() / total_clientes * 100) if len(segmento_counts_final) > 0 else 0
-            if min_pct < 5 and len(segmento_counts_final) < 3:
-                import logging
-                logging.warning(f"Distribución de segmentos no equitativa. Segmentos con datos: {len(segmento_counts_final)}. Distribución: {segmento_counts_final.to_dict()}")
-        
-        # Incluir campo churn para filtrado
-        # Usar monto_para_segmentar que ya tiene el monto histórico (del merge anterior)
-        df_clients = df_clients[['id_user', 'Segmento', 'Probabilidad Churn', 'Riesgo', 
-                                  'dias_sin_transacciones', 'monto_para_segmentar', 'churn']].copy()
-        
-        df_clients.columns = ['ID', 'Segmento', 'Probabilidad Churn', 'Riesgo', 
-                               'Días sin Trans', 'Monto Total', 'Churn']
-        
-        # Asegurar que churn sea boolean
-        df_clients['Churn'] = df_clients['Churn'].astype(bool)
-
-        return {
-            "history": df_history,
-            "calls": df_calls,
-            "agents": df_agents,
-            "future": df_future,
-            "clients": df_clients,
-            "churn_raw": df_churn,
-            "base_datos": df_base
-        }
-
-    except FileNotFoundError as e:
-        st.error(f"Error Crítico: No se encontró el archivo **{e.filename}**.")
-        st.warning("Por favor, asegúrate de que los archivos CSV estén en la misma carpeta que `app.py`.")
-        st.stop()
-    except Exception as e:
-        st.error(f"Ocurrió un error cargando los datos: {e}")
-        st.stop()
-
 @st.cache_resource
 def get_predictor():
     """Retorna el predictor de churn cacheado"""
     if DEMO_MODE:
         return None  # No usar predictor en modo demo
-    return ChurnPredictor()
+    return ChurnPredictor(procesos=PROCESOS_SCORING)
+
+@st.cache_resource(show_spinner=False, max_entries=1)
+def get_scorer_online(_df_base, version_datos):
+    """
+    Índice de scoring en línea (scoring_online.py), compartido entre sesiones.
+    version_datos (DatasetCompartido.version) distingue cargas (df_base no se hashea);
+    solo se conserva el índice de la última carga de load_data.
+    """
+    predictor = get_predictor()
+    if predictor is None or _df_base is None:
+        return None
+    return ScorerOnline(predictor, _df_base)
+
+@st.cache_resource(show_spinner=False, max_entries=32)
+def get_indice_ranking(_df_agentes, version_agentes):
+    """
+    Índice de ranking (ranking_agentes.py) compartido entre sesiones: el equipo se
+    puntúa y ordena una vez por carga; los filtros de la página son máscaras.
+    version_agentes (carga + rango de meses) distingue índices (_df_agentes no se hashea).
+    """
+    indice = IndiceRanking(_df_agentes)
+    congelar(indice.agentes)
+    return indice
+
+@st.cache_resource(show_spinner=False)
+def get_particiones_agentes(version_indice):
+    """
+    Particiones de casos por agente y mes (solo lectura), compartidas entre sesiones.
+    version_indice cambia cada vez que agentes_por_periodo.py anexa meses.
+    """
+    df_periodos = leer_particiones(AGENTES_PERIODO_DIR)
+    return congelar(df_periodos) if df_periodos is not None else None
+
+@st.cache_data(show_spinner=False, max_entries=64)
+def get_agentes_en_rango(_df_periodos, version_indice, desde, hasta):
+    """Agentes del rango de meses [desde, hasta] sumando particiones (esquema del CSV de agentes)"""
+    return agentes_en_rango(_df_periodos, desde, hasta)
+
+# Comparador de agentes: arriba de este número de agentes las barras no llevan
+# texto y la gráfica ocupa todo el ancho
+COMPARADOR_MAX_TEXTO = 6
+
+@st.cache_data(show_spinner=False, max_entries=64)
+def get_figura_comparador(_df_agentes, version_agentes, ids_agentes):
+    """
+    JSON de la figura del comparador, una vez por selección de agentes (tupla de ids).
+    Barras agrupadas desde la tabla larga de comparativa_agentes: una traza por
+    métrica (no por agente), así 50 agentes siguen siendo 3 trazas.
+    """
+    larga = comparativa_agentes(_df_agentes, ids_agentes)
+    con_texto = len(ids_agentes) <= COMPARADOR_MAX_TEXTO
+    fig_comp = go.Figure()
+    for metrica, grupo in larga.groupby('metrica', sort=False):
+        fig_comp.add_trace(go.Bar(
+            name=metrica,
+            x=grupo['agente'],
+            y=grupo['valor'],
+            text=grupo['texto'] if con_texto else None,
+            textposition='outside',
+            customdata=grupo['texto'],
+            hovertemplate='<b>%{x}</b><br>' + metrica + ': %{customdata}<extra></extra>'
+        ))
+    fig_comp.update_layout(
+        height=350 if con_texto else 450,
+        plot_bgcolor='rgba(248, 250, 252, 0.5)',
+        paper_bgcolor='white',
+        font=dict(family="Inter", size=11),
+        barmode='group',
+        legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1),
+        margin=dict(l=10, r=10, t=40, b=10)
+    )
+    fig_comp.update_xaxes(type='category')
+    fig_comp.update_yaxes(showgrid=True, gridwidth=1, gridcolor='#f1f5f9')
+    return fig_comp.to_json()
+
+@st.cache_data(show_spinner=False, max_entries=128)
+def get_simulacion(_df_hist, version_datos, meses_historia, meses_proyeccion, escenario, peso_tendencia, factor_mejora):
+    """
+    Bandas por percentil de la simulación Monte Carlo (simulacion_montecarlo.py),
+    una vez por estado de los controles del simulador.
+    version_datos + meses_historia identifican la ventana histórica (_df_hist no se hashea).
+    """
+    return simular_escenario(
+        _df_hist['Tasa Churn'].to_numpy(), _df_hist['Ingresos'].to_numpy(),
+        meses_proyeccion, escenario, peso_tendencia, factor_mejora
+    )
+
+# Perfil de rendimiento por sección (instrumentacion.py): ?perfil=1 en la URL o
+# DANU_PERFIL=1. Desactivado, las marcas de sección no hacen nada.
+PERFIL_ACTIVO = os.environ.get('DANU_PERFIL') == '1' or st.query_params.get('perfil') == '1'
+if PERFIL_ACTIVO:
+    instrumentacion.iniciar_rerun()
+
+inicio_rerun = time.perf_counter()
+if METRICAS_PUERTO or METRICAS_ARCHIVO:
+    metricas.iniciar_exportacion(METRICAS_PUERTO, METRICAS_ARCHIVO, METRICAS_INTERVALO_S)
 
 # Cargar datos con caché persistente
 # El caché se mantiene entre navegaciones de pestañas
 if 'data_loaded' not in st.session_state:
-    with st.spinner("Cargando datos iniciales..."):
+    with st.spinner("Cargando datos iniciales..."), instrumentacion.span('carga_datos') as span_carga:
         if DEMO_MODE:
-            st.session_state.data = generate_dummy_data()
+            st.session_state.data = get_datos_demo(**TAMANO_DEMO)
         else:
-            st.session_state.data = load_data()
+            with metricas.medir_carga():
+                st.session_state.data = load_data()
+        span_carga.filas = len(st.session_state.data['clients'])
         st.session_state.data_loaded = True
 
 # Asegurar que data esté disponible
-if DEMO_MODE:
-    data = st.session_state.get('data', generate_dummy_data())
+if 'data' in st.session_state:
+    data = st.session_state.data
+elif DEMO_MODE:
+    data = get_datos_demo(**TAMANO_DEMO)
 else:
-    data = st.session_state.get('data', load_data())
+    with metricas.medir_carga():
+        data = load_data()
 
 # ============================================================
 # CACHÉ PARA PESTAÑAS - Evitar recarga al cambiar de pestaña
 # ============================================================
 # Inicializar caché de clientes si no existe
+# (CacheSesion: dict que memoria_sesiones puede vaciar si se supera el presupuesto)
 if 'clients_cache' not in st.session_state:
-    st.session_state.clients_cache = {
+    st.session_state.clients_cache = memoria_sesiones.CacheSesion({
         'df_filtered': None,
         'df_display': None,
         'filtros_hash': None,
         'metricas': None,
         'matriz_data': None
-    }
+    })
 
 # Inicializar caché de dashboard si no existe
 if 'dashboard_cache' not in st.session_state:
-    st.session_state.dashboard_cache = {
+    st.session_state.dashboard_cache = memoria_sesiones.CacheSesion({
         'df_h': None,
         'filtros_hash': None
-    }
+    })
 
 def get_filtros_hash(filtros_dict):
     """Genera un hash único para los filtros actuales"""
@@ -1525,7 +1244,7 @@ def render_dashboard():
     col_filtro1, col_filtro2, col_filtro3 = st.columns(3, gap="medium")
     
     with col_filtro1:
-        df_churn_raw = data['churn_raw'].copy()
+        df_churn_raw = data['churn_raw']
         df_churn_raw['mes'] = pd.to_datetime(df_churn_raw['mes'], errors='coerce')
         fechas_disponibles = sorted(df_churn_raw['mes'].dropna().unique())
         
@@ -1586,7 +1305,7 @@ def render_dashboard():
         else:
             monto_range = (float(monto_min), float(monto_max))
     
-    df_churn_filtrado = df_churn_raw.copy()
+    df_churn_filtrado = df_churn_raw.copy(deep=False)
     
     if fecha_inicio_dt is not None and fecha_fin_dt is not None:
         df_churn_filtrado = df_churn_filtrado[
@@ -1647,7 +1366,7 @@ def render_dashboard():
         # PRIMERO: Calcular transacciones REALES por mes usando tx_count y tenure
         if data['base_datos'] is not None and not data['base_datos'].empty:
             try:
-                df_base_local = data['base_datos'].copy()
+                df_base_local = data['base_datos']
                 
                 # Calcular tasa de transacciones por usuario por mes
                 # tx_count = total de transacciones del usuario en todo su tenure
@@ -1661,7 +1380,7 @@ def render_dashboard():
                     avg_tx_per_user_per_month = df_base_local['tx_per_month'].mean()
                     
                     # Calcular usuarios activos por mes desde data['churn_raw'] (DataFrame completo)
-                    df_churn_temp = data['churn_raw'].copy()
+                    df_churn_temp = data['churn_raw']
                     df_churn_temp['mes'] = pd.to_datetime(df_churn_temp['mes'])
                     
                     # Usuarios activos = los que tienen monto_total > 0 (transaccionaron)
@@ -1706,7 +1425,7 @@ def render_dashboard():
             ), axis=1
         )
     else:
-        df_h = data['history'].copy()
+        df_h = data['history']
         st.warning("No hay datos para los filtros seleccionados. Mostrando todos los datos.")
     
     col1, col2, col3, col4 = st.columns(4, gap="large")
@@ -2037,7 +1756,7 @@ def render_dashboard():
             </div>
         """, unsafe_allow_html=True)
         
-        df_calls_filtrado = data['calls'].copy()
+        df_calls_filtrado = data['calls']
         if 'fecha_rep' in df_calls_filtrado.columns and fecha_inicio_dt is not None and fecha_fin_dt is not None:
             df_calls_filtrado = df_calls_filtrado[
                 (df_calls_filtrado['fecha_rep'] >= fecha_inicio_dt) &
@@ -2057,7 +1776,7 @@ def render_dashboard():
         if 'id_user' in df_calls_filtrado.columns and not data['churn_raw'].empty:
             # Obtener último mes de churn
             ultimo_mes_churn = data['churn_raw']['mes'].max()
-            df_churn_ultimo = data['churn_raw'][data['churn_raw']['mes'] == ultimo_mes_churn].copy()
+            df_churn_ultimo = data['churn_raw'][data['churn_raw']['mes'] == ultimo_mes_churn]
             
             # Merge de llamadas con churn
             df_motivos_churn = df_calls_filtrado.merge(
@@ -2371,7 +2090,7 @@ def render_dashboard():
 #     * Métricas generales (Total Casos, Tasa de Éxito, Desv. Estándar)
 #     * Tab "Rankings": Top 3 agentes, tabla completa con selección
 #     * Tab "Análisis Visual": Matriz de eficiencia, Top 10 por casos
-#     * Tab "Comparativas": Comparador de hasta 3 agentes
+#     * Tab "Comparativas": Comparador de agentes (cualquier número)
 #     * Exportación de datos a CSV
 #     * Perfil detallado del agente seleccionado
 # ============================================================
@@ -2390,15 +2109,68 @@ def render_agents():
     
     FUENTE DE DATOS:
     - data['agents']: DataFrame cargado de 'agent_score_central_period_v2.csv'
+    - Particiones de agentes_por_periodo.py (si existen): casos por agente y mes,
+      sumados para el rango de meses seleccionado
     """
     st.title("Ranking de Agentes")
     st.markdown('<p class="subtitle">Evaluación de desempeño basada en datos reales</p>', unsafe_allow_html=True)
     
     # ==================== CARGA Y VALIDACIÓN DE DATOS ====================
-    # df: Copia del DataFrame de agentes para trabajar sin modificar el original
+    # df: Vista del DataFrame de agentes (dataset_compartido.py): se le pueden
+    # agregar columnas sin modificar el original, que es de solo lectura
     # ORIGEN: data['agents'] cargado al inicio de la app desde CSV
-    # NOTA: Se usa .copy() para evitar warnings de pandas al modificar
-    df = data['agents'].copy()
+    df = data['agents']
+    # version_agentes: llave de caché del ranking (carga + rango de meses)
+    version_agentes = data.version
+    
+    # ==================== PERIODO (PARTICIONES POR MES) ====================
+    # Si existen particiones de agentes_por_periodo.py, el ranking se arma para el
+    # rango de meses elegido sumando particiones (no se releen las llamadas)
+    indice_periodos = None if DEMO_MODE else leer_indice_periodos(AGENTES_PERIODO_DIR)
+    if indice_periodos and indice_periodos.get('particiones'):
+        df_periodos = get_particiones_agentes(indice_periodos['version'])
+        periodos = list(indice_periodos['particiones'])
+        if len(periodos) > 1:
+            desde, hasta = st.select_slider(
+                "Periodo de evaluación",
+                options=periodos,
+                value=(periodos[0], periodos[-1]),
+                help="Meses cerrados (con resultado de churn) que entran al ranking"
+            )
+        else:
+            desde = hasta = periodos[0]
+        df = get_agentes_en_rango(df_periodos, indice_periodos['version'], desde, hasta)
+        version_agentes = f"{data.version}:{indice_periodos['version']}:{desde}..{hasta}"
+        
+        # Winrate del equipo por mes; la banda marca el rango seleccionado
+        df_tendencia = tendencia_equipo(df_periodos)
+        fig_periodo = go.Figure(go.Scatter(
+            x=df_tendencia['periodo'],
+            y=df_tendencia['winrate'],
+            mode='lines+markers',
+            line=dict(color='#3b82f6', width=2),
+            customdata=df_tendencia['total_casos'],
+            hovertemplate='<b>%{x}</b><br>Winrate: %{y:.1f}%<br>Casos: %{customdata:,.0f}<extra></extra>'
+        ))
+        fig_periodo.add_vrect(x0=desde, x1=hasta, fillcolor='#3b82f6', opacity=0.08, line_width=0)
+        fig_periodo.update_layout(
+            height=200,
+            plot_bgcolor='rgba(248, 250, 252, 0.5)',
+            paper_bgcolor='white',
+            font=dict(family="Inter", size=11),
+            margin=dict(l=10, r=10, t=10, b=10),
+            yaxis_title="Winrate equipo (%)"
+        )
+        fig_periodo.update_xaxes(type='category', showgrid=False)
+        fig_periodo.update_yaxes(showgrid=True, gridwidth=1, gridcolor='#f1f5f9')
+        st.plotly_chart(fig_periodo, use_container_width=True, config={'displayModeBar': False})
+        
+        if df.empty:
+            st.info("No hay casos con resultado en el periodo seleccionado.")
+            return
+    elif not DEMO_MODE:
+        st.caption("Ranking del periodo completo (agent_score_central_period_v2.csv). "
+                   "Ejecuta `python agentes_por_periodo.py` para filtrar por mes.")
     
     # req_cols: Columnas obligatorias que debe tener el CSV de agentes
     # Si falta alguna, la función no puede continuar
@@ -2406,7 +2178,7 @@ def render_agents():
     # - 'winrate': Porcentaje de éxito (casos_ganados/total_casos * 100)
     # - 'casos_ganados': Clientes que el agente logró retener
     # - 'total_casos': Total de casos asignados al agente
-    req_cols = ['id_agente', 'winrate', 'casos_ganados', 'total_casos']
+    req_cols = COLUMNAS_REQUERIDAS_AGENTES
     if not all(col in df.columns for col in req_cols):
         st.error(f"El CSV de agentes no tiene las columnas esperadas: {req_cols}")
         return
@@ -2468,26 +2240,28 @@ def render_agents():
             help="Selecciona cuántos agentes mostrar en el ranking"
         )
     
-    # ==================== APLICACIÓN DE FILTROS ====================
-    # df_filtrado: DataFrame resultante después de aplicar todos los filtros
-    # Se inicia como copia completa y se va reduciendo con cada filtro
-    df_filtrado = df.copy()
+    # ==================== APLICACIÓN DE FILTROS Y RANKING ====================
+    # indice_ranking: el equipo completo ya puntuado y preordenado por bayesian_score,
+    # winrate y casos_ganados (ver SISTEMA DE RANKING más abajo y ranking_agentes.py).
+    # Se construye una vez por carga (get_indice_ranking); los filtros solo arman
+    # una máscara y cada vista (top 3, top 10, tabla) es un corte del orden guardado
+    indice_ranking = get_indice_ranking(df, version_agentes)
     
     # FILTRO 1: Búsqueda por ID específico
     # Si el usuario ingresó un ID, filtrar solo ese agente
+    id_buscar = None
     if buscar_id:
         try:
             id_buscar = int(buscar_id)
-            df_filtrado = df_filtrado[df_filtrado['id_agente'] == id_buscar]
-        except:
+        except ValueError:
             st.warning("ID de agente inválido. Mostrando todos los agentes.")
     
     # FILTRO 2: Rango de winrate
     # Mantener solo agentes cuyo winrate esté dentro del rango seleccionado
-    df_filtrado = df_filtrado[
-        (df_filtrado['winrate'] >= winrate_range[0]) &
-        (df_filtrado['winrate'] <= winrate_range[1])
-    ]
+    mascara_filtros = indice_ranking.mascara(id_buscar, (float(winrate_range[0]), float(winrate_range[1])))
+    
+    # df_filtrado: agentes que pasan los filtros, en orden de bayesian_score
+    df_filtrado = indice_ranking.filtrar(mascara_filtros)
     
     # ==================== CÁLCULO DE MÉTRICAS DEL EQUIPO ====================
     # Estas métricas resumen el rendimiento del equipo filtrado
@@ -2524,85 +2298,16 @@ def render_agents():
     # SOLUCIÓN: Promedio Bayesiano
     # Agregamos "casos virtuales" basados en el rendimiento promedio del equipo.
     # Esto "suaviza" los extremos y da más peso a agentes con más datos.
-    
-    def calculate_bayesian_average(casos_ganados, total_casos, confianza_minima=10, winrate_global=None):
-        """
-        Calcula un promedio bayesiano que penaliza muestras pequeñas.
-        
-        PARÁMETROS:
-        - casos_ganados: int - Número de casos que el agente ganó (retuvo al cliente)
-          ORIGEN: Columna 'casos_ganados' del DataFrame de agentes
-          
-        - total_casos: int - Número total de casos asignados al agente
-          ORIGEN: Columna 'total_casos' del DataFrame de agentes
-          
-        - confianza_minima: int (default=10) - Número de "casos virtuales" a agregar
-          EFECTO: Controla qué tanto se penaliza a muestras pequeñas
-          - Valor bajo (5): Poca penalización, confía más en datos observados
-          - Valor alto (20): Mucha penalización, requiere más datos para destacar
-          
-        - winrate_global: float - Promedio ponderado del equipo (expectativa base)
-          ORIGEN: Se calcula como sum(casos_ganados)/sum(total_casos)*100
-          USO: Representa hacia dónde "regresa" el score de agentes con pocos datos
-        
-        RETORNA:
-        - bayesian_winrate: float - Score ajustado entre 0-100
-        
-        FÓRMULA MATEMÁTICA:
-        bayesian_score = (ganados + confianza * winrate_global/100) / (total + confianza) * 100
-        
-        EJEMPLO:
-        Agente con 2/2 (100%), confianza=10, winrate_global=48%:
-        adjusted_ganados = 2 + (10 * 48/100) = 2 + 4.8 = 6.8
-        adjusted_total = 2 + 10 = 12
-        bayesian_score = (6.8/12) * 100 = 56.7%  (bajó de 100% a 56.7%)
-        
-        Agente con 80/100 (80%), mismos parámetros:
-        adjusted_ganados = 80 + 4.8 = 84.8
-        adjusted_total = 100 + 10 = 110
-        bayesian_score = (84.8/110) * 100 = 77.1%  (bajó poco, de 80% a 77.1%)
-        """
-        if winrate_global is None:
-            winrate_global = 48  # Valor por defecto basado en datos históricos
-        
-        # Agregar casos virtuales basados en el promedio global
-        # INTERPRETACIÓN: Es como si el agente hubiera tenido 'confianza_minima'
-        # casos adicionales con el rendimiento promedio del equipo
-        adjusted_ganados = casos_ganados + (confianza_minima * winrate_global / 100)
-        adjusted_total = total_casos + confianza_minima
-        
-        # Calcular el winrate ajustado
-        bayesian_winrate = (adjusted_ganados / adjusted_total) * 100
-        
-        return bayesian_winrate
-    
-    # winrate_global_equipo: Promedio PONDERADO del winrate del equipo
-    # FÓRMULA: sum(casos_ganados) / sum(total_casos) * 100
-    # DIFERENCIA vs avg_winrate: avg_winrate es promedio simple de porcentajes,
-    #   winrate_global_equipo pondera por volumen de casos
-    # EJEMPLO: Si Agente A tiene 1/2 (50%) y Agente B tiene 90/100 (90%)
-    #   avg_winrate = (50 + 90)/2 = 70%
-    #   winrate_global_equipo = (1+90)/(2+100)*100 = 89.2% (más representativo)
-    # USO: Sirve como "prior" bayesiano - la expectativa base de rendimiento
-    winrate_global_equipo = (df_filtrado['casos_ganados'].sum() / df_filtrado['total_casos'].sum() * 100) if df_filtrado['total_casos'].sum() > 0 else 48
-    
-    # Agregar columna de Bayesian Score a cada agente
-    # PROCESO: Aplicar calculate_bayesian_average a cada fila del DataFrame
-    # RESULTADO: Nueva columna 'bayesian_score' con el score ajustado
-    df_filtrado['bayesian_score'] = df_filtrado.apply(
-        lambda row: calculate_bayesian_average(
-            row['casos_ganados'], 
-            row['total_casos'],
-            confianza_minima=10,  # Ajustable: más alto = más penalización a muestras pequeñas
-            winrate_global=winrate_global_equipo
-        ),
-        axis=1
-    )
-    
-    # ORDENAR POR BAYESIAN SCORE (no por winrate simple)
-    # RAZÓN: El bayesian_score es más justo para comparar agentes
-    # RESULTADO: Los mejores agentes (considerando volumen Y rendimiento) quedan arriba
-    df_filtrado = df_filtrado.sort_values('bayesian_score', ascending=False)
+    #
+    # CÁLCULO (ranking_agentes.py, vectorizado sobre todos los agentes a la vez):
+    # - bayesian_score = (ganados + 10 * winrate_global/100) / (total + 10) * 100
+    #   con winrate_global = sum(casos_ganados) / sum(total_casos) * 100 de todo el
+    #   equipo (un filtro no cambia el score de nadie)
+    #   Ej. con winrate_global=48%: 2/2 (100%) -> 56.7 y 80/100 (80%) -> 77.1
+    # - wilson_inferior: límite inferior del intervalo de Wilson al 95% (cota pesimista)
+    # - rank_bayesiano, rank_wilson, rank_winrate: posición 1..n en el equipo
+    # - percentil_bayesiano: % del equipo con score ajustado menor o igual
+    # df_filtrado ya viene ORDENADO POR BAYESIAN SCORE (no por winrate simple)
     
     # ==================== TARJETAS KPI DEL EQUIPO ====================
     # PROPÓSITO: Mostrar métricas resumidas del rendimiento del equipo filtrado
@@ -2659,16 +2364,16 @@ def render_agents():
     # PROPÓSITO: Organizar el contenido en pestañas para mejor navegación
     # Tab 1 "Rankings": Top 3 agentes + tabla completa
     # Tab 2 "Análisis Visual": Gráficos de eficiencia y volumen
-    # Tab 3 "Comparativas": Comparador de hasta 3 agentes seleccionados
+    # Tab 3 "Comparativas": Comparador de agentes (selección, top 10 o equipo completo)
     tab1, tab2, tab3 = st.tabs(["Rankings", "Análisis Visual", "Comparativas"])
     
     with tab1:
         # ==================== TOP 3 AGENTES ====================
         # top3: DataFrame con los 3 primeros agentes ordenados por bayesian_score
-        # ORIGEN: df_filtrado.head(3) - ya está ordenado por bayesian_score
+        # ORIGEN: indice_ranking.top(3) - corte del orden precalculado (con los filtros)
         # PROPÓSITO: Destacar visualmente a los mejores agentes del equipo
         # reset_index: Para acceder por posición 0,1,2 sin problemas
-        top3 = df_filtrado.head(3).reset_index(drop=True)
+        top3 = indice_ranking.top(3, 'bayesian_score', mascara_filtros).reset_index(drop=True)
         c1, c2, c3 = st.columns(3, gap="medium")
     
     # titles: Etiquetas para cada posición del podio
@@ -2717,14 +2422,17 @@ def render_agents():
     q3 = df_filtrado['winrate'].quantile(0.25)
     
     # df_display: DataFrame limitado a los primeros N agentes para mostrar
-    # ORIGEN: df_filtrado.head(num_agentes) donde num_agentes viene del slider
-    # 'Rank': Columna calculada con la posición 1,2,3...N
-    df_display = df_filtrado.head(num_agentes).copy()
-    df_display['Rank'] = range(1, len(df_display) + 1)
-    
-    # 'Bayesian Score': Columna formateada para mostrar con 1 decimal
-    # ORIGEN: df_filtrado['bayesian_score'] calculado con calculate_bayesian_average()
+    # ORIGEN: indice_ranking.top(num_agentes) donde num_agentes viene del slider
+    # 'Rank': Posición en el equipo por bayesian_score (rank_bayesiano de ranking_agentes.py)
+    # 'Percentil': % del equipo que el agente iguala o supera en score ajustado
+    df_display = indice_ranking.top(num_agentes, 'bayesian_score', mascara_filtros).copy()
+    df_display['Rank'] = df_display['rank_bayesiano']
+    df_display['Percentil'] = df_display['percentil_bayesiano'].round(0)
+    
+    # 'Bayesian Score' y 'Wilson': Columnas formateadas para mostrar con 1 decimal
+    # ORIGEN: bayesian_score y wilson_inferior calculados en puntuar_agentes()
     df_display['Bayesian Score'] = df_display['bayesian_score'].round(1)
+    df_display['Wilson'] = df_display['wilson_inferior'].round(1)
     
     # Crear contenedor para la tabla con estilo premium
     st.markdown("""
@@ -2741,7 +2449,7 @@ def render_agents():
     """, unsafe_allow_html=True)
     
     selected_rows = st.dataframe(
-            df_display[['Rank', 'id_agente', 'winrate', 'Bayesian Score', 'casos_ganados', 'total_casos']],
+            df_display[['Rank', 'id_agente', 'winrate', 'Bayesian Score', 'Wilson', 'Percentil', 'casos_ganados', 'total_casos']],
             use_container_width=True,
             hide_index=True,
             height=450,
@@ -2776,6 +2484,18 @@ def render_agents():
                     width="medium",
                     help="Score ajustado por volumen de casos (usado para el ranking)"
                 ),
+                "Wilson": st.column_config.NumberColumn(
+                    "Winrate Mínimo (95%)", 
+                    format="%.1f%%", 
+                    width="small",
+                    help="Límite inferior del intervalo de Wilson: winrate que el agente supera con 95% de confianza"
+                ),
+                "Percentil": st.column_config.NumberColumn(
+                    "Percentil", 
+                    format="%d", 
+                    width="small",
+                    help="Porcentaje del equipo con score ajustado menor o igual"
+                ),
                 "casos_ganados": st.column_config.NumberColumn(
                     "Casos Ganados", 
                     format="%d", 
@@ -2816,7 +2536,8 @@ def render_agents():
                             </div>
                             <div>
                                 <p style="margin: 0; color: #64748b; font-size: 0.85rem; font-weight: 600;">Posición en Ranking</p>
-                                <p style="margin: 0; color: #1e293b; font-size: 1.5rem; font-weight: 800;">#{int(agente_seleccionado['Rank'])}</p>
+                                <p style="margin: 0; color: #1e293b; font-size: 1.5rem; font-weight: 800;">#{int(agente_seleccionado['Rank'])} de {len(indice_ranking)}</p>
+                                <p style="margin: 0; color: #64748b; font-size: 0.75rem; font-weight: 600;">Percentil {int(agente_seleccionado['percentil_bayesiano'])} del equipo</p>
                             </div>
                         </div>
                     </div>
@@ -2935,14 +2656,13 @@ def render_agents():
                 </div>
             """, unsafe_allow_html=True)
             
-            # Obtener top 10 por casos ganados, eliminando duplicados si existen
-            top_10_casos = df_filtrado.sort_values('casos_ganados', ascending=False).copy()
-            top_10_casos = top_10_casos.drop_duplicates(subset=['id_agente'], keep='first')
-            top_10_casos = top_10_casos.head(10)  # Asegurar que sean exactamente 10
+            # Top 10 por casos ganados: corte del orden precalculado (el índice ya
+            # tiene una fila por agente)
+            top_10_casos = indice_ranking.top(10, 'casos_ganados', mascara_filtros)
             
             fig_bar = go.Figure()
             fig_bar.add_trace(go.Bar(
-                y=[f"Agente {int(id)}" for id in top_10_casos['id_agente']],
+                y=top_10_casos['id_agente'].map(etiqueta_agente),
                 x=top_10_casos['casos_ganados'],
                 orientation='h',
                 marker=dict(
@@ -2952,10 +2672,10 @@ def render_agents():
                     colorbar=dict(title="Casos Ganados", x=1.02),
                     line=dict(color='white', width=1)
                 ),
-                text=[f"{int(c)}" for c in top_10_casos['casos_ganados']],
+                text=top_10_casos['casos_ganados'].astype('int64').astype(str),
                 textposition='outside',
                 hovertemplate='<b>%{y}</b><br>Casos Ganados: %{x:,.0f}<br>Winrate: %{customdata[0]:.1f}%<br>Total Casos: %{customdata[1]:,.0f}<extra></extra>',
-                customdata=[[w, t] for w, t in zip(top_10_casos['winrate'], top_10_casos['total_casos'])]
+                customdata=top_10_casos[['winrate', 'total_casos']].to_numpy()
             ))
             
             fig_bar.update_layout(
@@ -2981,43 +2701,35 @@ def render_agents():
                 <p class="chart-card-title" style="margin-bottom: 1.5rem;">Comparador de Agentes</p>
         """, unsafe_allow_html=True)
         
-        # Contenedor centrado para los selectboxes
+        # Contenedor centrado para la selección
         st.markdown("""
             <div style="max-width: 900px; margin: 0 auto 1.5rem auto;">
         """, unsafe_allow_html=True)
         
-        col_comp1, col_comp2, col_comp3 = st.columns(3, gap="medium")
-        
-        with col_comp1:
-            agente1 = st.selectbox(
-                "Agente 1",
-                options=agentes_disponibles,
-                index=0 if len(agentes_disponibles) > 0 else None,
-                format_func=lambda x: f"Agente {x}"
-            )
+        # modo_comparacion: agentes elegidos a mano, el top 10 del ranking o todo
+        # el equipo filtrado (el comparador acepta cualquier número de agentes)
+        modo_comparacion = st.radio(
+            "Agentes a comparar",
+            options=["Selección", "Top 10 del ranking", "Todo el equipo filtrado"],
+            horizontal=True
+        )
         
-        with col_comp2:
-            agente2 = st.selectbox(
-                "Agente 2",
+        if modo_comparacion == "Selección":
+            agentes_comp = st.multiselect(
+                "Agentes",
                 options=agentes_disponibles,
-                index=min(1, len(agentes_disponibles)-1) if len(agentes_disponibles) > 1 else 0,
-                format_func=lambda x: f"Agente {x}"
-            )
-        
-        with col_comp3:
-            agente3 = st.selectbox(
-                "Agente 3 (Opcional)",
-                options=[None] + agentes_disponibles,
-                format_func=lambda x: f"Agente {x}" if x else "Ninguno"
+                default=agentes_disponibles[:2],
+                format_func=etiqueta_agente
             )
+        elif modo_comparacion == "Top 10 del ranking":
+            agentes_comp = indice_ranking.top(10, 'bayesian_score', mascara_filtros)['id_agente'].tolist()
+        else:
+            agentes_comp = df_filtrado['id_agente'].tolist()
         
         st.markdown("</div>", unsafe_allow_html=True)
         
-        agentes_comp = [agente1, agente2]
-        if agente3:
-            agentes_comp.append(agente3)
-        
-        df_comp = df_filtrado[df_filtrado['id_agente'].isin(agentes_comp)].copy()
+        # df_comp: agentes seleccionados en orden de ranking (vista, sin copiar)
+        df_comp = df_filtrado[df_filtrado['id_agente'].isin(agentes_comp)]
         
         if not df_comp.empty:
             # Contenedor centrado para las visualizaciones
@@ -3025,7 +2737,12 @@ def render_agents():
                 <div style="max-width: 1200px; margin: 0 auto;">
             """, unsafe_allow_html=True)
             
-            col_comp_viz1, col_comp_viz2 = st.columns(2, gap="large")
+            # Con pocos agentes gráfica y tabla van lado a lado; con muchos, una
+            # debajo de la otra para que las barras tengan todo el ancho
+            if len(agentes_comp) <= COMPARADOR_MAX_TEXTO:
+                col_comp_viz1, col_comp_viz2 = st.columns(2, gap="large")
+            else:
+                col_comp_viz1, col_comp_viz2 = st.container(), st.container()
             
             with col_comp_viz1:
                 st.markdown("""
@@ -3033,27 +2750,9 @@ def render_agents():
                         <p class="chart-card-title" style="margin-bottom: 1rem; font-size: 0.85rem;">Comparación de Métricas</p>
                 """, unsafe_allow_html=True)
                 
-                fig_comp = go.Figure()
-                
-                for idx, row in df_comp.iterrows():
-                    fig_comp.add_trace(go.Bar(
-                        name=f"Agente {int(row['id_agente'])}",
-                        x=['Winrate', 'Casos Ganados', 'Total Casos'],
-                        y=[row['winrate'], row['casos_ganados'], row['total_casos'] / 10],  # Escalar total para visualización
-                        text=[f"{int(row['winrate'])}%", f"{int(row['casos_ganados'])}", f"{int(row['total_casos'])}"],
-                        textposition='outside'
-                    ))
-                
-                fig_comp.update_layout(
-                    height=350,
-                    plot_bgcolor='rgba(248, 250, 252, 0.5)',
-                    paper_bgcolor='white',
-                    font=dict(family="Inter", size=11),
-                    barmode='group',
-                    legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1),
-                    margin=dict(l=10, r=10, t=40, b=10)
-                )
-                fig_comp.update_yaxes(showgrid=True, gridwidth=1, gridcolor='#f1f5f9')
+                # La figura se arma (y serializa) una vez por selección; Total Casos
+                # va escalado ÷10 en la barra, el texto muestra el valor real
+                fig_comp = json.loads(get_figura_comparador(indice_ranking.agentes, version_agentes, tuple(agentes_comp)))
                 st.plotly_chart(fig_comp, use_container_width=True, config={'displayModeBar': False})
                 
                 st.markdown("</div>", unsafe_allow_html=True)
@@ -3090,7 +2789,7 @@ def render_agents():
 # DESCRIPCIÓN: Esta sección incluye:
 #   - Función render_simulator() completa:
 #     * Filtros de proyección (meses, escenario, ventana histórica)
-#     * Cálculos de predicciones con intervalos de confianza
+#     * Simulación Monte Carlo con bandas por percentil (simulacion_montecarlo.py)
 #     * Métricas de proyección (Churn Actual, Proyección Final, Volatilidad)
 #     * Gráfico interactivo de proyección con líneas de benchmark
 #     * Comparación escenario sin acción vs con intervención
@@ -3103,9 +2802,9 @@ def render_agents():
 
 def render_simulator():
     st.title("Simulador a Futuro")
-    st.markdown('<p class="subtitle">Proyección basada en modelo Random Forest y tendencia histórica</p>', unsafe_allow_html=True)
+    st.markdown('<p class="subtitle">Proyección Monte Carlo sobre la tendencia y variabilidad históricas</p>', unsafe_allow_html=True)
     
-    df_hist = data['history'].copy()
+    df_hist = data['history']
     df_fut = data['future']
     
     # Filtros mejorados
@@ -3168,46 +2867,31 @@ def render_simulator():
     if meses_a_considerar < len(df_hist):
         df_hist_filtrado = df_hist.tail(meses_a_considerar).copy()
     else:
-        df_hist_filtrado = df_hist.copy()
-    
-    # Ajustar proyección según escenario
-    factor_escenario = {"Conservador": 1.1, "Moderado": 1.0, "Optimista": 0.9}
-    factor = factor_escenario[escenario]
+        df_hist_filtrado = df_hist.copy(deep=False)
     
-    # Calcular proyecciones mejoradas
+    # Proyección Monte Carlo (simulacion_montecarlo.py): miles de trayectorias con
+    # los cambios mensuales históricos remuestreados; el escenario (Conservador 1.1,
+    # Moderado 1.0, Optimista 0.9) y la mejora con intervención son distribuciones.
+    # Las bandas se calculan una vez por estado de los controles (get_simulacion)
     last_date = df_hist_filtrado['Fecha'].iloc[-1]
     last_val = df_hist_filtrado['Tasa Churn'].iloc[-1]
     
-    # Calcular tendencia con peso
-    trend_reciente = df_hist_filtrado['Tasa Churn'].tail(3).diff().mean() if len(df_hist_filtrado) >= 3 else 0
-    trend_historica = df_hist_filtrado['Tasa Churn'].diff().mean() if len(df_hist_filtrado) > 1 else 0
-    trend = (trend_reciente * peso_tendencia) + (trend_historica * (1 - peso_tendencia))
-    
     # Calcular promedio histórico
     promedio_historico = df_hist_filtrado['Tasa Churn'].mean()
     std_historica = df_hist_filtrado['Tasa Churn'].std()
     
-    # Calcular proyecciones con intervalos de confianza
-    dates_future = pd.date_range(start=last_date, periods=meses_proyeccion+1, freq='M')[1:]
-    proyecciones_ajustadas = []
-    proyecciones_upper = []
-    proyecciones_lower = []
-    
-    for i in range(1, meses_proyeccion+1):
-        pred = last_val + (trend * i * factor)
-        pred = max(0, min(100, pred))
-        proyecciones_ajustadas.append(pred)
-        
-        # Intervalos de confianza (aumentan con la distancia temporal)
-        incertidumbre = std_historica * (1 + i * 0.1)
-        proyecciones_upper.append(min(100, pred + incertidumbre))
-        proyecciones_lower.append(max(0, pred - incertidumbre))
+    simulacion = get_simulacion(
+        df_hist_filtrado, data.version, len(df_hist_filtrado),
+        meses_proyeccion, escenario, float(peso_tendencia), float(factor_mejora)
+    )
     
+    # Mediana de las trayectorias y banda del 90% (percentiles 5-95)
+    dates_future = pd.date_range(start=last_date, periods=meses_proyeccion+1, freq='M')[1:]
     df_fut_ajustado = pd.DataFrame({
         "Fecha": dates_future,
-        "Predicción Churn": proyecciones_ajustadas,
-        "Límite Superior": proyecciones_upper,
-        "Límite Inferior": proyecciones_lower
+        "Predicción Churn": simulacion['churn_p50'].to_numpy(),
+        "Límite Superior": simulacion['churn_p95'].to_numpy(),
+        "Límite Inferior": simulacion['churn_p5'].to_numpy()
     })
     
     # Calcular métricas adicionales
@@ -3218,8 +2902,8 @@ def render_simulator():
     var_explicada = max(0, min(1, 1 - (std_historica / (promedio_historico + 1))))
     r2_score = var_explicada * 100
     
-    # Volatilidad esperada
-    volatilidad = df_fut_ajustado['Predicción Churn'].std() if len(df_fut_ajustado) > 1 else 0
+    # Volatilidad esperada: desviación estándar de las trayectorias en el último mes
+    volatilidad = simulacion['churn_std'].iloc[-1]
     
     # Métricas principales
     col_met1, col_met2, col_met3 = st.columns(3, gap="medium")
@@ -3324,7 +3008,7 @@ def render_simulator():
     y_upper = [last_val] + list(df_fut_ajustado['Límite Superior'])
     y_lower = [last_val] + list(df_fut_ajustado['Límite Inferior'])
     
-    # Área de intervalo de confianza
+    # Área de intervalo de confianza: 90% (p5-p95) y 50% (p25-p75) de las trayectorias
     fig.add_trace(go.Scatter(
         x=x_fut + x_fut[::-1],
         y=y_upper + y_lower[::-1],
@@ -3335,6 +3019,18 @@ def render_simulator():
         showlegend=False,
         name='Intervalo de Confianza'
     ))
+    y_p75 = [last_val] + list(simulacion['churn_p75'])
+    y_p25 = [last_val] + list(simulacion['churn_p25'])
+    fig.add_trace(go.Scatter(
+        x=x_fut + x_fut[::-1],
+        y=y_p75 + y_p25[::-1],
+        fill='toself',
+        fillcolor='rgba(239, 68, 68, 0.15)',
+        line=dict(color='rgba(255,255,255,0)'),
+        hoverinfo="skip",
+        showlegend=False,
+        name='Intervalo 50%'
+    ))
     
     # Línea de proyección sin intervención (roja punteada)
     fig.add_trace(go.Scatter(
@@ -3347,16 +3043,16 @@ def render_simulator():
         hovertemplate='<b>%{x|%b %Y}</b><br>Proyección sin acción: <b>%{y:.1f}%</b><extra></extra>'
     ))
     
-    # Línea de proyección con intervención (verde) - usar factor de mejora parametrizado
+    # Línea de proyección con intervención (verde): mediana de las trayectorias con
+    # la mejora aleatoria alrededor de factor_mejora
     # ✅ CORRECCIÓN: La línea verde debe iniciar EXACTAMENTE desde el punto de transición (estrella)
-    # El primer punto (last_val) se mantiene igual, solo los futuros se reducen con el factor
-    y_fut_intervencion = [last_val] + [y * (1 - factor_mejora) for y in y_fut[1:]]
+    y_fut_intervencion = [last_val] + list(simulacion['intervencion_p50'])
     
     # Crear la línea verde desde el punto de transición hacia adelante
     fig.add_trace(go.Scatter(
         x=x_fut,
         y=y_fut_intervencion,
-        name='Con Retención Activa (-15%)',
+        name=f'Con Retención Activa (-{int(round(factor_mejora * 100))}%)',
         line=dict(color='#10b981', width=3, dash='dot'),
         mode='lines+markers',
         marker=dict(
@@ -3384,19 +3080,19 @@ def render_simulator():
     fig.add_trace(go.Scatter(
         x=x_fut,
         y=y_upper,
-        name='Límite Superior',
+        name='Límite Superior (p95)',
         line=dict(color='rgba(239, 68, 68, 0.3)', dash='dash', width=1),
         mode='lines',
-        hovertemplate='Límite Superior: <b>%{y:.1f}%</b><extra></extra>'
+        hovertemplate='Límite Superior (p95): <b>%{y:.1f}%</b><extra></extra>'
     ))
     
     fig.add_trace(go.Scatter(
         x=x_fut,
         y=y_lower,
-        name='Límite Inferior',
+        name='Límite Inferior (p5)',
         line=dict(color='rgba(239, 68, 68, 0.3)', dash='dash', width=1),
         mode='lines',
-        hovertemplate='Límite Inferior: <b>%{y:.1f}%</b><extra></extra>'
+        hovertemplate='Límite Inferior (p5): <b>%{y:.1f}%</b><extra></extra>'
     ))
     
     # Anotaciones en puntos críticos
@@ -3493,16 +3189,21 @@ def render_simulator():
         </div>
     """, unsafe_allow_html=True)
     
+    # Distribución de las trayectorias en el último mes proyectado
+    final = simulacion.iloc[-1]
     col_stat1, col_stat2, col_stat3, col_stat4 = st.columns(4, gap="medium")
     
     with col_stat1:
-        st.metric("Media", f"{df_fut_ajustado['Predicción Churn'].mean():.1f}%")
+        st.metric("Mediana final", f"{final['churn_p50']:.1f}%")
     with col_stat2:
-        st.metric("Mediana", f"{df_fut_ajustado['Predicción Churn'].median():.1f}%")
+        st.metric("Intervalo 90%", f"{final['churn_p5']:.1f}% – {final['churn_p95']:.1f}%")
     with col_stat3:
-        st.metric("Desv. Estándar", f"{df_fut_ajustado['Predicción Churn'].std():.1f}%")
+        st.metric(f"Prob. churn > {UMBRAL_CHURN:.0f}%", f"{final['prob_sobre_umbral'] * 100:.0f}%",
+                  help="Fracción de trayectorias sin intervención sobre el benchmark fintech máximo")
     with col_stat4:
-        st.metric("Rango", f"{df_fut_ajustado['Predicción Churn'].max() - df_fut_ajustado['Predicción Churn'].min():.1f}%")
+        st.metric("Ingresos retenidos (mediana)",
+                  f"${final['ingresos_retenidos_p50']:,.0f}",
+                  help="Ingresos del último mes con intervención menos sin intervención")
 
 def aplicar_filtros_clientes(df_original, buscar_id_text="", riesgo_filter=None, segmento_filter=None, 
                               prob_range=(0, 1), dias_range=(0, 500), top_n=None, 
@@ -3512,7 +3213,7 @@ def aplicar_filtros_clientes(df_original, buscar_id_text="", riesgo_filter=None,
     Aplica TODOS los filtros y retorna un DataFrame filtrado.
     Este DataFrame será la única fuente de datos para todas las visualizaciones.
     """
-    df_filtered = df_original.copy()
+    df_filtered = df_original.copy(deep=False)  # Vista: las columnas se reemplazan, no se escriben
     
     # Normalizar segmentos
     def normalizar_segmento(s):
@@ -4856,8 +4557,9 @@ def render_clients():
         st.warning("No hay datos de clientes disponibles.")
         return
     
+    instrumentacion.seccion('clientes.filtros', filas=len(data['clients']))
     # Trabajar SIEMPRE con una copia de data['clients']
-    df_clientes_base = data['clients'].copy()
+    df_clientes_base = data['clients']
     
     # MÉTRICAS GLOBALES (para el header, sin filtrar)
     total_clientes_global = len(df_clientes_base)
@@ -5028,6 +4730,7 @@ def render_clients():
                 else:
                     top_n = None
     
+    instrumentacion.seccion('clientes.filtrado')
     # ============================================================
     # SISTEMA DE CACHÉ - Solo recalcular si cambian los filtros
     # ============================================================
@@ -5045,15 +4748,17 @@ def render_clients():
     
     filtros_hash_actual = get_filtros_hash(filtros_actuales)
     
-    # Verificar si podemos usar caché
+    # Verificar si podemos usar caché (se lee una sola vez: otra sesión puede
+    # vaciarlo en cualquier momento si se supera el presupuesto de memoria)
+    df_cacheado = st.session_state.clients_cache['df_filtered']
     usar_cache = (
         st.session_state.clients_cache['filtros_hash'] == filtros_hash_actual and
-        st.session_state.clients_cache['df_filtered'] is not None
+        df_cacheado is not None
     )
     
     if usar_cache:
         # Usar datos cacheados - más rápido al cambiar de pestaña
-        df_filtered = st.session_state.clients_cache['df_filtered']
+        df_filtered = df_cacheado
     else:
         # APLICAR FILTROS (solo si cambiaron)
         df_filtered = aplicar_filtros_clientes(
@@ -5067,8 +4772,8 @@ def render_clients():
             mostrar_solo_accionables=mostrar_solo_accionables
         )
         
-        # Guardar en caché
-        st.session_state.clients_cache['df_filtered'] = df_filtered.copy()
+        # Guardar en caché (sin copia: después solo se le agrega 'Score Prioridad')
+        st.session_state.clients_cache['df_filtered'] = df_filtered
         st.session_state.clients_cache['filtros_hash'] = filtros_hash_actual
     
     # Calcular Score de Prioridad
@@ -5129,6 +4834,7 @@ def render_clients():
         """, unsafe_allow_html=True)
         return
     
+    instrumentacion.seccion('clientes.metricas', filas=len(df_filtered))
     # MÉTRICAS PRINCIPALES CON DATOS FILTRADOS
     st.markdown("<div style='margin-top: 2rem;'></div>", unsafe_allow_html=True)
     
@@ -5168,6 +4874,7 @@ def render_clients():
             </div>
         """, unsafe_allow_html=True)
     
+    instrumentacion.seccion('clientes.matriz_segmentacion', filas=len(df_filtered))
     # Matriz de Segmentación: Riesgo vs Valor
     st.markdown("<div style='margin-top: 1.5rem;'></div>", unsafe_allow_html=True)
     st.markdown("""
@@ -5177,7 +4884,7 @@ def render_clients():
     """, unsafe_allow_html=True)
     
     # Preparar datos para la matriz
-    df_matriz = df_filtered.copy()
+    df_matriz = df_filtered.copy(deep=False)
     df_matriz['Categoría Valor'] = df_matriz['Segmento'].astype(str).fillna('Básico')
     
     # Definir orden correcto
@@ -5339,6 +5046,7 @@ def render_clients():
         col_viz1, col_viz2 = st.columns(2, gap="large")
         
         with col_viz1:
+            instrumentacion.seccion('clientes.grafico_estado')
             st.markdown("""
                 <div class="chart-card">
                     <p class="chart-card-title">Mapa Demográfico por Estado</p>
@@ -5387,6 +5095,7 @@ def render_clients():
                 st.plotly_chart(fig_estado, use_container_width=True, config={'displayModeBar': False})
         
         with col_viz2:
+            instrumentacion.seccion('clientes.grafico_genero')
             st.markdown("""
                 <div class="chart-card">
                     <p class="chart-card-title">Distribución de Clientes por Género</p>
@@ -5401,7 +5110,7 @@ def render_clients():
                 )
             else:
                 np.random.seed(42)
-                df_genero = df_filtered.copy()
+                df_genero = df_filtered.copy(deep=False)
                 df_genero['gender'] = np.random.choice(['Male', 'Female', 'Other'], size=len(df_filtered), p=[0.48, 0.50, 0.02])
             
             if df_genero is not None and 'gender' in df_genero.columns:
@@ -5453,6 +5162,7 @@ def render_clients():
                 st.info("Los datos de género no están disponibles.")
     
     with tab_tabla:
+        instrumentacion.seccion('clientes.tabla', filas=len(df_filtered))
         st.markdown("""
             <div class="chart-card" style="margin-bottom: 1rem;">
                 <p class="chart-card-title">Tabla de Clientes</p>
@@ -5545,6 +5255,7 @@ def render_clients():
         )
         
         if selected_rows.selection.rows:
+            instrumentacion.seccion('clientes.perfil')
             selected_idx = selected_rows.selection.rows[0]
             cliente_seleccionado = df_paginado.iloc[selected_idx]
             cliente_id = cliente_seleccionado['ID']
@@ -5613,6 +5324,49 @@ def render_clients():
                     </div>
                 """, unsafe_allow_html=True)
             
+            # Re-scoring en línea con el modelo (solo fuera de modo demo)
+            if not DEMO_MODE and data.get('base_datos') is not None:
+                try:
+                    scorer = get_scorer_online(data['base_datos'], data.version)
+                except Exception as e:
+                    scorer = None
+                    st.warning(f"No se pudo preparar el scoring en línea: {e}")
+                if scorer is not None and cliente_id in scorer:
+                    with st.expander("Scoring en línea y factores principales", expanded=False):
+                        fila_cliente = scorer.fila_cruda(cliente_id)
+                        campos_editables = [
+                            c for c in ['tx_count', 'amount_sum', 'tx_per_month', 'avg_gap_days', 'tenure_months']
+                            if c in fila_cliente
+                        ]
+                        cambios = {}
+                        cols_edicion = st.columns(max(len(campos_editables), 1), gap="small")
+                        for col_edicion, campo in zip(cols_edicion, campos_editables):
+                            with col_edicion:
+                                valor_actual = float(fila_cliente[campo]) if pd.notna(fila_cliente[campo]) else 0.0
+                                nuevo_valor = st.number_input(campo, value=valor_actual, key=f"online_{campo}_{cliente_id}")
+                                if nuevo_valor != valor_actual:
+                                    cambios[campo] = nuevo_valor
+
+                        inicio_scoring = time.perf_counter()
+                        resultado = scorer.score_one(cliente_id, cambios or None)
+                        base_online = scorer.score_one(cliente_id)
+                        metricas.registrar_scoring('perfil_cliente', 2, time.perf_counter() - inicio_scoring)
+                        delta_online = (resultado['probabilidad'] - base_online['probabilidad']) * 100
+                        st.metric(
+                            "Probabilidad de churn (modelo)",
+                            f"{resultado['probabilidad'] * 100:.1f}%",
+                            delta=f"{delta_online:+.1f} pts" if cambios else None,
+                            delta_color="inverse"
+                        )
+                        if resultado['contribuciones']:
+                            st.dataframe(
+                                pd.DataFrame(resultado['contribuciones']).rename(columns={
+                                    'feature': 'Factor', 'valor': 'Valor', 'aporte': 'Aporte a la probabilidad'
+                                }),
+                                use_container_width=True,
+                                hide_index=True
+                            )
+
             if info_adicional:
                 st.markdown("<br>", unsafe_allow_html=True)
                 col_info1, col_info2 = st.columns(2, gap="large")
@@ -5650,6 +5404,7 @@ def render_clients():
                 if st.button("Enviar Promoción", key=f"promocion_{cliente_id}", use_container_width=True, type="secondary"):
                     st.success(f"Promoción enviada al cliente {int(cliente_id)}")
         
+        instrumentacion.seccion('clientes.exportacion_csv', filas=len(df_display))
         col_exp1, col_exp2 = st.columns(2, gap="small")
         
         with col_exp1:
@@ -5685,11 +5440,46 @@ def render_clients():
 # ============================================================
 
 # Enrutador principal
-if selected_page == "Panel General":
-    render_dashboard()
-elif selected_page == "Ranking Agentes":
-    render_agents()
-elif selected_page == "Simulador Futuro":
-    render_simulator()
-elif selected_page == "Detalle Clientes":
-    render_clients()
+instrumentacion.asignar_pagina(selected_page)
+try:
+    with instrumentacion.span('render'):
+        if selected_page == "Panel General":
+            render_dashboard()
+        elif selected_page == "Ranking Agentes":
+            render_agents()
+        elif selected_page == "Simulador Futuro":
+            render_simulator()
+        elif selected_page == "Detalle Clientes":
+            render_clients()
+finally:
+    # st.rerun()/st.stop() terminan el script con una excepción: la latencia se registra igual
+    metricas.observar('danu_rerun_segundos', time.perf_counter() - inicio_rerun, metricas.BUCKETS_RERUN, pagina=selected_page)
+
+# Panel oculto de perfil (solo con ?perfil=1 o DANU_PERFIL=1)
+if PERFIL_ACTIVO:
+    ultimo_rerun = instrumentacion.finalizar_rerun()
+    with st.sidebar.expander("⏱ Perfil de rendimiento", expanded=False):
+        n_reruns = st.number_input("Últimos N reruns", min_value=1, max_value=instrumentacion.MAX_RERUNS, value=10, key="perfil_n_reruns")
+        st.caption(f"Último rerun ({ultimo_rerun.pagina}): {ultimo_rerun.duracion * 1000:,.0f} ms")
+        st.caption(f"Cachés de sesión del proceso: {memoria_sesiones.total_bytes() / 1024 / 1024:,.1f} MB "
+                   f"de {PRESUPUESTO_CACHE_SESIONES_MB:,} MB")
+        lentas = instrumentacion.secciones_lentas(int(n_reruns))
+        if lentas:
+            df_perfil = pd.DataFrame(lentas)
+            df_perfil['max_ms'] = df_perfil['max_s'] * 1000
+            df_perfil['media_ms'] = df_perfil['media_s'] * 1000
+            st.dataframe(
+                df_perfil[['pagina', 'seccion', 'llamadas', 'max_ms', 'media_ms', 'filas']].round(1),
+                hide_index=True, use_container_width=True
+            )
+
+# Métricas del rerun: memoria de los cachés de esta sesión (la latencia se registra en el enrutador)
+ctx_sesion = get_script_run_ctx()
+if ctx_sesion is not None:
+    metricas.registrar_sesion(ctx_sesion.session_id)
+    for nombre_cache in ('clients_cache', 'dashboard_cache'):
+        memoria_sesiones.tocar(ctx_sesion.session_id, nombre_cache, st.session_state[nombre_cache])
+    for nombre_cache, n_bytes in memoria_sesiones.bytes_por_cache().items():
+        metricas.fijar('danu_session_state_bytes', n_bytes, cache=nombre_cache)
+    metricas.fijar('danu_cache_sesion_presupuesto_bytes', memoria_sesiones.PRESUPUESTO_BYTES)
+    metricas.fijar('danu_dataset_compartido_bytes', metricas.bytes_objeto(data))
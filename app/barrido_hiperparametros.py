@@ -0,0 +1,205 @@
+"""
+Barrido de hiperparámetros del Random Forest de churn.
+
+Evalúa una cuadrícula de tamaños de bosque (n_estimators) y profundidades
+(max_depth) con validación cruzada estratificada en un pool de procesos. La
+matriz de entrenamiento se guarda una sola vez con np.save y cada proceso la
+abre con mmap_mode='r', así que no se copia ni se serializa por tarea.
+
+Por configuración se registra: AUC (media y desviación entre folds), tiempo de
+entrenamiento, latencia de predicción (lote y una fila) y tamaño del modelo
+serializado. Al final se recomienda el bosque más pequeño cuya AUC queda dentro
+de --tolerancia-auc de la AUC de referencia (churn_model_info.json).
+
+Uso:
+    cd app
+    python barrido_hiperparametros.py [--arboles 50,100,250] [--profundidades 12,18,25]
+                                      [--folds 3] [--procesos 4] [--muestra 200000]
+"""
+import argparse
+import json
+import os
+import pickle
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from itertools import product
+
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.metrics import roc_auc_score
+from sklearn.model_selection import StratifiedKFold, train_test_split
+
+from features_churn import leer_matriz_entrenamiento
+
+base_dir = os.path.dirname(os.path.abspath(__file__))
+
+# Hiperparámetros fijos del modelo de producción (guardar_modelo.py)
+PARAMETROS_BASE = {
+    'min_samples_split': 50,
+    'min_samples_leaf': 25,
+    'class_weight': 'balanced',
+    'criterion': 'gini',
+    'random_state': 42
+}
+
+
+def _lista_enteros(texto):
+    return [int(v) for v in texto.split(',') if v.strip()]
+
+
+def evaluar_fold(ruta_X, ruta_y, train_idx, test_idx, n_estimators, max_depth, fold):
+    """
+    Entrena y evalúa una configuración en un fold. Se ejecuta en un proceso del
+    pool: X e y se abren como memmap de solo lectura.
+    """
+    X = np.load(ruta_X, mmap_mode='r')
+    y = np.load(ruta_y, mmap_mode='r')
+    X_train, y_train = X[train_idx], y[train_idx]
+    X_test, y_test = X[test_idx], y[test_idx]
+
+    modelo = RandomForestClassifier(
+        n_estimators=n_estimators, max_depth=max_depth, n_jobs=1, **PARAMETROS_BASE
+    )
+    inicio = time.perf_counter()
+    modelo.fit(X_train, y_train)
+    tiempo_fit = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    probas = modelo.predict_proba(X_test)[:, 1]
+    tiempo_lote = time.perf_counter() - inicio
+
+    # Latencia de una sola fila (caso de scoring en línea): mediana de 20 llamadas
+    fila = np.ascontiguousarray(X_test[:1])
+    tiempos_fila = []
+    for _ in range(20):
+        inicio = time.perf_counter()
+        modelo.predict_proba(fila)
+        tiempos_fila.append(time.perf_counter() - inicio)
+
+    return {
+        'n_estimators': n_estimators,
+        'max_depth': max_depth,
+        'fold': fold,
+        'auc': roc_auc_score(y_test, probas),
+        'tiempo_fit_s': tiempo_fit,
+        'latencia_lote_us_fila': tiempo_lote / len(test_idx) * 1e6,
+        'latencia_fila_ms': float(np.median(tiempos_fila)) * 1e3,
+        'tamano_mb': len(pickle.dumps(modelo, protocol=pickle.HIGHEST_PROTOCOL)) / 1024 / 1024,
+        'nodos': int(sum(arbol.tree_.node_count for arbol in modelo.estimators_))
+    }
+
+
+def resumir(resultados):
+    """Agrega los resultados por configuración (media entre folds)"""
+    df = pd.DataFrame(resultados)
+    resumen = df.groupby(['n_estimators', 'max_depth']).agg(
+        auc=('auc', 'mean'),
+        auc_std=('auc', 'std'),
+        tiempo_fit_s=('tiempo_fit_s', 'mean'),
+        latencia_lote_us_fila=('latencia_lote_us_fila', 'mean'),
+        latencia_fila_ms=('latencia_fila_ms', 'mean'),
+        tamano_mb=('tamano_mb', 'mean'),
+        nodos=('nodos', 'mean')
+    ).reset_index()
+    return resumen.sort_values(['tamano_mb', 'latencia_fila_ms']).reset_index(drop=True)
+
+
+def recomendar(resumen, auc_referencia, tolerancia):
+    """Configuración más pequeña (y luego más rápida) con AUC >= referencia - tolerancia"""
+    candidatos = resumen[resumen['auc'] >= auc_referencia - tolerancia]
+    if candidatos.empty:
+        return None
+    return candidatos.sort_values(['tamano_mb', 'latencia_fila_ms']).iloc[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Barrido de hiperparámetros del Random Forest de churn")
+    parser.add_argument('--datos', default=os.path.join(base_dir, 'BaseDeDatos.csv'))
+    parser.add_argument('--arboles', default='50,100,250', help="Valores de n_estimators separados por coma")
+    parser.add_argument('--profundidades', default='12,18,25', help="Valores de max_depth separados por coma")
+    parser.add_argument('--folds', type=int, default=3)
+    parser.add_argument('--procesos', type=int, default=os.cpu_count(), help="Procesos del pool")
+    parser.add_argument('--muestra', type=int, default=0, help="Submuestra estratificada de filas (0 = todas)")
+    parser.add_argument('--tolerancia-auc', type=float, default=0.005)
+    parser.add_argument('--salida', default=os.path.join(base_dir, 'barrido_resultados.csv'))
+    args = parser.parse_args()
+
+    print("="*80)
+    print("BARRIDO DE HIPERPARÁMETROS")
+    print("="*80)
+
+    if not os.path.exists(args.datos):
+        print(f"ERROR: No se encontró {args.datos}")
+        sys.exit(1)
+
+    print("\n1. Preparando matriz de entrenamiento...")
+    pipeline, X, y, _ = leer_matriz_entrenamiento(args.datos)
+    pipeline.ajustar_medianas(X)
+    if args.muestra and args.muestra < len(y):
+        # Misma proporción de churn que el total
+        idx, _ = train_test_split(np.arange(len(y)), train_size=args.muestra, stratify=y, random_state=42)
+        idx = np.sort(idx)
+        X, y = X[idx], y[idx]
+    print(f"   ✓ {X.shape[0]:,} filas x {X.shape[1]} features")
+
+    # Los árboles son invariantes al escalado: se entrena sobre las features imputadas
+    dir_tmp = tempfile.mkdtemp(prefix='barrido_')
+    try:
+        ruta_X = os.path.join(dir_tmp, 'X.npy')
+        ruta_y = os.path.join(dir_tmp, 'y.npy')
+        np.save(ruta_X, np.ascontiguousarray(X))
+        np.save(ruta_y, y)
+        del X
+
+        configuraciones = list(product(_lista_enteros(args.arboles), _lista_enteros(args.profundidades)))
+        folds = list(StratifiedKFold(n_splits=args.folds, shuffle=True, random_state=42).split(np.zeros(len(y)), y))
+        total = len(configuraciones) * len(folds)
+        print(f"\n2. Evaluando {len(configuraciones)} configuraciones x {len(folds)} folds en {args.procesos} procesos...")
+
+        resultados = []
+        with ProcessPoolExecutor(max_workers=args.procesos) as pool:
+            futuros = [
+                pool.submit(evaluar_fold, ruta_X, ruta_y, train_idx, test_idx, n_est, depth, fold)
+                for (n_est, depth) in configuraciones
+                for fold, (train_idx, test_idx) in enumerate(folds)
+            ]
+            for i, futuro in enumerate(as_completed(futuros), 1):
+                r = futuro.result()
+                resultados.append(r)
+                print(f"   [{i}/{total}] árboles={r['n_estimators']} prof={r['max_depth']} fold={r['fold']}: "
+                      f"AUC {r['auc']:.4f} | fit {r['tiempo_fit_s']:.1f}s | {r['tamano_mb']:.1f} MB")
+    finally:
+        shutil.rmtree(dir_tmp, ignore_errors=True)
+
+    print("\n3. Resultados por configuración...")
+    resumen = resumir(resultados)
+    resumen.to_csv(args.salida, index=False)
+    with pd.option_context('display.width', 200, 'display.max_columns', None):
+        print(resumen.round(4).to_string(index=False))
+    print(f"   ✓ Resultados guardados: {args.salida}")
+
+    auc_referencia = None
+    ruta_info = os.path.join(base_dir, 'churn_model_info.json')
+    if os.path.exists(ruta_info):
+        with open(ruta_info) as f:
+            auc_referencia = json.load(f)['metrics']['auc_roc']
+    if auc_referencia is None:
+        auc_referencia = resumen['auc'].max()
+
+    mejor = recomendar(resumen, auc_referencia, args.tolerancia_auc)
+    print("\n" + "="*80)
+    if mejor is None:
+        print(f"Ninguna configuración alcanza AUC >= {auc_referencia - args.tolerancia_auc:.4f}")
+    else:
+        print(f"✅ RECOMENDADO: n_estimators={int(mejor['n_estimators'])}, max_depth={int(mejor['max_depth'])} "
+              f"(AUC {mejor['auc']:.4f} vs referencia {auc_referencia:.4f}, "
+              f"{mejor['tamano_mb']:.1f} MB, {mejor['latencia_fila_ms']:.2f} ms/fila)")
+    print("="*80)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,266 @@
+"""
+Benchmark sin interfaz de las páginas del dashboard.
+
+Ejecuta app.py con streamlit.testing (AppTest) contra conjuntos de datos de
+tamaño creciente y, por página y estado de widgets representativo (presets de
+clientes, rangos de fechas, escenarios del simulador), mide:
+  - tiempo de pared del rerun (mediana de --repeticiones)
+  - tiempo por sección (carga de datos, scoring, bloques de cada página) con
+    las marcas de instrumentacion.py (la app corre con DANU_PERFIL=1)
+  - pico de memoria de Python asignada durante el rerun (tracemalloc, en una
+    corrida aparte para no inflar los tiempos)
+
+Los conjuntos de datos son el modo demo con --tamanos clientes
+(generate_dummy_data) y, opcionalmente, directorios con los CSV reales o de
+generar_dataset_sintetico.py (--datos). El reporte JSON tiene claves estables
+para poder compararlo entre corridas; --comparar marca las regresiones.
+
+Uso:
+    cd app
+    python benchmark_paginas.py [--tamanos 500,50000,500000] [--datos datos_sinteticos]
+                                [--repeticiones 3] [--salida benchmark_reporte.json]
+                                [--comparar benchmark_anterior.json] [--tolerancia 0.2]
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+import pandas as pd
+import streamlit as st
+from streamlit.testing.v1 import AppTest
+
+import instrumentacion
+
+base_dir = os.path.dirname(os.path.abspath(__file__))
+APP_FILE = os.path.join(base_dir, 'app.py')
+TIMEOUT_S = 600
+
+
+# ============================================================
+# Escenarios: (página, nombre, función que ajusta los widgets)
+# ============================================================
+
+def _widget(lista, etiqueta):
+    for w in lista:
+        if w.label == etiqueta:
+            return w
+    raise LookupError(f"No se encontró el widget '{etiqueta}'")
+
+
+def _rango_fechas(meses):
+    """Últimos `meses` meses del rango disponible en el filtro de fechas del panel general"""
+    def ajustar(at):
+        selector = _widget(at.date_input, "Rango de Fechas")
+        inicio, fin = selector.value
+        if meses is not None:
+            inicio = max(inicio, fin - timedelta(days=30 * meses))
+        selector.set_value((inicio, fin))
+    return ajustar
+
+
+def _boton(clave):
+    return lambda at: at.button(key=clave).click()
+
+
+def _seleccion(etiqueta, valor):
+    return lambda at: _widget(at.selectbox, etiqueta).set_value(valor)
+
+
+ESCENARIOS = [
+    ('Panel General', 'inicial', None),
+    ('Panel General', 'rango_3_meses', _rango_fechas(3)),
+    ('Panel General', 'rango_6_meses', _rango_fechas(6)),
+    ('Panel General', 'rango_completo', _rango_fechas(None)),
+    ('Ranking Agentes', 'inicial', None),
+    ('Simulador Futuro', 'inicial', None),
+    ('Simulador Futuro', 'conservador', _seleccion("Escenario", "Conservador")),
+    ('Simulador Futuro', 'optimista', _seleccion("Escenario", "Optimista")),
+    ('Simulador Futuro', 'todo_el_historial', _seleccion("Ventana histórica", "Todo el historial")),
+    ('Detalle Clientes', 'inicial', None),
+    ('Detalle Clientes', 'preset_urgente', _boton('preset_urgente')),
+    ('Detalle Clientes', 'preset_alto_valor', _boton('preset_alto_valor')),
+    ('Detalle Clientes', 'preset_vip', _boton('preset_vip')),
+    ('Detalle Clientes', 'limpiar_filtros', _boton('limpiar_filtros')),
+]
+
+
+def _ir_a_pagina(at, pagina):
+    radio = at.sidebar.radio[0]
+    if radio.value != pagina:
+        radio.set_value(pagina)
+        at.run()
+
+
+def medir_escenario(at, pagina, ajustar, con_memoria=False):
+    """
+    Lleva la sesión a la página, aplica el estado de widgets y mide el rerun.
+
+    Returns:
+        (segundos, pico de memoria en bytes o None, {sección: segundos}, excepciones)
+    """
+    _ir_a_pagina(at, pagina)
+    if ajustar is not None:
+        ajustar(at)
+    if con_memoria:
+        tracemalloc.start()
+    inicio = time.perf_counter()
+    at.run()
+    segundos = time.perf_counter() - inicio
+    pico = None
+    if con_memoria:
+        pico = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    ultimo = instrumentacion.reruns_recientes(1)
+    secciones = {}
+    for s in (ultimo[0].spans if ultimo else []):
+        secciones[s.nombre] = secciones.get(s.nombre, 0.0) + s.duracion
+    return segundos, pico, secciones, [e.value for e in at.exception]
+
+
+def _sesion(entorno):
+    """Nueva sesión de AppTest con las variables de entorno del conjunto de datos"""
+    os.environ.update(entorno)
+    st.cache_data.clear()
+    st.cache_resource.clear()  # load_data y los datos demo se comparten entre sesiones
+    at = AppTest.from_file(APP_FILE, default_timeout=TIMEOUT_S)
+    inicio = time.perf_counter()
+    at.run()
+    return at, time.perf_counter() - inicio
+
+
+def medir_conjunto(nombre, entorno, repeticiones):
+    print(f"\n   Conjunto {nombre}:")
+    entorno_previo = {k: os.environ.get(k) for k in entorno}
+    resultados = []
+    try:
+        at, carga = _sesion(entorno)
+        ultimo = instrumentacion.reruns_recientes(1)
+        resultados.append({'conjunto': nombre, 'pagina': '(carga)', 'escenario': 'primer_run',
+                           'tiempo_s': carga, 'tiempos_s': [carga], 'memoria_pico_mb': None,
+                           'secciones_s': {s.nombre: s.duracion for s in (ultimo[0].spans if ultimo else [])},
+                           'excepciones': [e.value for e in at.exception]})
+        print(f"      {'(carga inicial)':<45}{carga:>9.3f}s")
+        for pagina, escenario, ajustar in ESCENARIOS:
+            tiempos, secciones, excepciones = [], {}, []
+            for _ in range(repeticiones):
+                segundos, _, por_seccion, exc = medir_escenario(at, pagina, ajustar)
+                tiempos.append(segundos)
+                for seccion, duracion in por_seccion.items():
+                    secciones.setdefault(seccion, []).append(duracion)
+                excepciones = exc
+            _, pico, _, _ = medir_escenario(at, pagina, ajustar, con_memoria=True)
+            r = {
+                'conjunto': nombre,
+                'pagina': pagina,
+                'escenario': escenario,
+                'tiempo_s': statistics.median(tiempos),
+                'tiempos_s': tiempos,
+                'memoria_pico_mb': pico / 1024 / 1024,
+                'secciones_s': {seccion: statistics.median(d) for seccion, d in sorted(secciones.items())},
+                'excepciones': excepciones
+            }
+            resultados.append(r)
+            aviso = f"  ⚠ {len(excepciones)} excepciones" if excepciones else ""
+            print(f"      {pagina + ' / ' + escenario:<45}{r['tiempo_s']:>9.3f}s {r['memoria_pico_mb']:>9.1f} MB{aviso}")
+    finally:
+        for clave, valor in entorno_previo.items():
+            if valor is None:
+                os.environ.pop(clave, None)
+            else:
+                os.environ[clave] = valor
+    return resultados
+
+
+def comparar(actual, anterior, tolerancia):
+    """Escenarios cuyo tiempo creció más de `tolerancia` (fracción) frente al reporte anterior"""
+    clave = lambda r: (r['conjunto'], r['pagina'], r['escenario'])
+    previos = {clave(r): r for r in anterior['resultados']}
+    regresiones = []
+    for r in actual['resultados']:
+        previo = previos.get(clave(r))
+        if previo and previo['tiempo_s'] > 0 and r['tiempo_s'] > previo['tiempo_s'] * (1 + tolerancia):
+            regresiones.append((clave(r), previo['tiempo_s'], r['tiempo_s']))
+    return regresiones
+
+
+def _lista_enteros(texto):
+    return [int(v) for v in texto.split(',') if v.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark sin interfaz de las páginas del dashboard")
+    parser.add_argument('--tamanos', default='500,50000', help="Clientes del modo demo, separados por coma")
+    parser.add_argument('--datos', nargs='*', default=[], help="Directorios con los CSV (modo con datos reales)")
+    parser.add_argument('--repeticiones', type=int, default=3)
+    parser.add_argument('--salida', default=os.path.join(base_dir, 'benchmark_reporte.json'))
+    parser.add_argument('--comparar', help="Reporte anterior para detectar regresiones")
+    parser.add_argument('--tolerancia', type=float, default=0.2, help="Aumento relativo de tiempo tolerado")
+    args = parser.parse_args()
+
+    print("="*80)
+    print("BENCHMARK DE PÁGINAS")
+    print("="*80)
+
+    conjuntos = [
+        (f"demo_{n}", {'DANU_PERFIL': '1', 'DANU_DEMO_MODE': '1', 'DANU_DEMO_CLIENTES': str(n), 'DANU_DEMO_LLAMADAS': str(2 * n)})
+        for n in _lista_enteros(args.tamanos)
+    ]
+    for directorio in args.datos:
+        directorio = os.path.abspath(directorio)
+        conjuntos.append((os.path.basename(directorio), {
+            'DANU_PERFIL': '1',
+            'DANU_DEMO_MODE': '0',
+            'DANU_DATOS_DIR': directorio,
+            # Sin artefactos precalculados: se mide la derivación completa
+            'DANU_ARTEFACTOS_DIR': os.path.join(directorio, 'artefactos')
+        }))
+
+    print(f"\n1. Midiendo {len(conjuntos)} conjuntos x {len(ESCENARIOS)} escenarios...")
+    resultados = []
+    for nombre, entorno in conjuntos:
+        resultados += medir_conjunto(nombre, entorno, args.repeticiones)
+
+    reporte = {
+        'generado': datetime.now().isoformat(timespec='seconds'),
+        'entorno': {
+            'python': platform.python_version(),
+            'pandas': pd.__version__,
+            'streamlit': st.__version__,
+            'maquina': platform.machine(),
+            'cpus': os.cpu_count()
+        },
+        'repeticiones': args.repeticiones,
+        'resultados': resultados
+    }
+    with open(args.salida, 'w') as f:
+        json.dump(reporte, f, indent=2, ensure_ascii=False, default=str)
+    print(f"\n2. ✓ Reporte: {args.salida}")
+
+    con_errores = [r for r in resultados if r['excepciones']]
+    regresiones = []
+    if args.comparar:
+        with open(args.comparar) as f:
+            regresiones = comparar(reporte, json.load(f), args.tolerancia)
+        print(f"\n3. Comparación con {args.comparar} (tolerancia {args.tolerancia:.0%}):")
+        for (conjunto, pagina, escenario), antes, ahora in regresiones:
+            print(f"   ✗ {conjunto} / {pagina} / {escenario}: {antes:.3f}s → {ahora:.3f}s")
+        if not regresiones:
+            print("   ✓ Sin regresiones")
+
+    print("\n" + "="*80)
+    if con_errores or regresiones:
+        print(f"❌ {len(con_errores)} escenarios con excepciones, {len(regresiones)} regresiones")
+        print("="*80)
+        sys.exit(1)
+    print("✅ BENCHMARK COMPLETO")
+    print("="*80)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,240 @@
+"""
+Representación compacta de un Random Forest de sklearn.
+
+Todos los árboles se aplanan en arreglos contiguos: índices de nodos hijos en
+int32, features en int32, umbrales en float32, el lado al que va un NaN en cada
+división (tree_.missing_go_to_left de sklearn) en uint8 y, en las hojas, la
+probabilidad de churn en float32. Se guarda como un directorio de archivos .npy más un
+meta.json, de modo que se carga con np.load(mmap_mode='r') sin deserializar
+objetos de Python: la carga es casi instantánea y varios procesos comparten
+las mismas páginas del archivo.
+"""
+import json
+import os
+
+import numpy as np
+
+FORMATO = 2  # 2: agrega nan_izquierdo (los directorios de formato 1 mandaban todo NaN a la derecha)
+ARREGLOS = ['feature', 'umbral', 'izquierdo', 'derecho', 'nan_izquierdo', 'valor', 'raices']
+HOJA = -1
+
+
+def _umbral_float32(umbrales):
+    """
+    Mayor float32 <= umbral. Las features llegan como float32, así que
+    x <= u equivale exactamente a x <= _umbral_float32(u).
+    """
+    u32 = umbrales.astype(np.float32)
+    pasado = u32.astype(np.float64) > umbrales
+    u32[pasado] = np.nextafter(u32[pasado], np.float32(-np.inf))
+    return u32
+
+
+def _arbol_desde_sklearn(tree):
+    """Extrae los arreglos de un sklearn.tree._tree.Tree (probabilidad de la clase 1 en hojas)"""
+    izquierdo = tree.children_left.astype(np.int32)
+    derecho = tree.children_right.astype(np.int32)
+    hoja = izquierdo == -1
+    feature = np.where(hoja, HOJA, tree.feature).astype(np.int32)
+    umbral = np.where(hoja, 0.0, _umbral_float32(tree.threshold)).astype(np.float32)
+    # sklearn manda los NaN al hijo aprendido en el entrenamiento; versiones sin
+    # soporte de faltantes no tienen el arreglo (NaN <= u es falso: derecha)
+    faltantes = getattr(tree, 'missing_go_to_left', None)
+    if faltantes is None:
+        faltantes = np.zeros(len(izquierdo), dtype=np.uint8)
+    nan_izquierdo = np.where(hoja, 0, faltantes).astype(np.uint8)
+    valores = tree.value[:, 0, :]
+    valor = (valores[:, 1] / valores.sum(axis=1)).astype(np.float32)
+    pesos = tree.weighted_n_node_samples.astype(np.float64)
+    return {'feature': feature, 'umbral': umbral, 'izquierdo': izquierdo,
+            'derecho': derecho, 'nan_izquierdo': nan_izquierdo, 'valor': valor, 'pesos': pesos}
+
+
+def fusionar_hojas(arbol, tolerancia=0.0):
+    """
+    Colapsa nodos internos cuyos dos hijos son hojas con probabilidades a
+    distancia <= tolerancia (con tolerancia 0 las predicciones no cambian). Se
+    repite de abajo hacia arriba y luego se eliminan los nodos inalcanzables.
+
+    Returns:
+        (arbol compactado, número de nodos eliminados)
+    """
+    feature = arbol['feature'].copy()
+    izquierdo = arbol['izquierdo'].copy()
+    derecho = arbol['derecho'].copy()
+    valor = arbol['valor'].copy()
+    pesos = arbol['pesos']
+
+    # Los hijos siempre tienen índice mayor que el padre: recorrer en orden inverso es bottom-up
+    for nodo in range(len(feature) - 1, -1, -1):
+        if feature[nodo] == HOJA:
+            continue
+        i, d = izquierdo[nodo], derecho[nodo]
+        if feature[i] == HOJA and feature[d] == HOJA and abs(valor[i] - valor[d]) <= tolerancia:
+            total = pesos[i] + pesos[d]
+            valor[nodo] = (valor[i] * pesos[i] + valor[d] * pesos[d]) / total if total > 0 else valor[i]
+            feature[nodo] = HOJA
+            izquierdo[nodo] = derecho[nodo] = -1
+
+    # Renumerar solo los nodos alcanzables desde la raíz (preorden)
+    nuevo_indice = np.full(len(feature), -1, dtype=np.int32)
+    orden = []
+    pila = [0]
+    while pila:
+        nodo = pila.pop()
+        nuevo_indice[nodo] = len(orden)
+        orden.append(nodo)
+        if feature[nodo] != HOJA:
+            pila.append(derecho[nodo])
+            pila.append(izquierdo[nodo])
+    orden = np.array(orden, dtype=np.int64)
+    es_hoja = feature[orden] == HOJA
+    compacto = {
+        'feature': feature[orden],
+        'umbral': np.where(es_hoja, 0.0, arbol['umbral'][orden]).astype(np.float32),
+        'izquierdo': np.where(es_hoja, -1, nuevo_indice[izquierdo[orden]]).astype(np.int32),
+        'derecho': np.where(es_hoja, -1, nuevo_indice[derecho[orden]]).astype(np.int32),
+        'nan_izquierdo': np.where(es_hoja, 0, arbol['nan_izquierdo'][orden]).astype(np.uint8),
+        'valor': valor[orden],
+        'pesos': pesos[orden]
+    }
+    return compacto, len(feature) - len(orden)
+
+
+class BosqueCompacto:
+    """Bosque aplanado con predict_proba compatible con sklearn"""
+
+    def __init__(self, feature, umbral, izquierdo, derecho, nan_izquierdo, valor, raices, features=None, meta=None):
+        self.feature = feature
+        self.umbral = umbral
+        self.izquierdo = izquierdo
+        self.derecho = derecho
+        self.nan_izquierdo = nan_izquierdo
+        self.valor = valor
+        self.raices = raices
+        self.features = features
+        self.meta = meta or {}
+        self.directorio = None  # Directorio de origen si se cargó de disco
+
+    @property
+    def n_arboles(self):
+        return len(self.raices)
+
+    @property
+    def n_nodos(self):
+        return len(self.feature)
+
+    @classmethod
+    def desde_arboles(cls, arboles, features=None, meta=None):
+        """Une una lista de árboles (dicts de _arbol_desde_sklearn / fusionar_hojas)"""
+        tamanos = np.array([len(a['feature']) for a in arboles], dtype=np.int64)
+        raices = np.concatenate([[0], np.cumsum(tamanos)[:-1]]).astype(np.int32)
+        desplazar = lambda hijos, base: np.where(hijos >= 0, hijos + base, -1).astype(np.int32)
+        return cls(
+            feature=np.concatenate([a['feature'] for a in arboles]).astype(np.int32),
+            umbral=np.concatenate([a['umbral'] for a in arboles]).astype(np.float32),
+            izquierdo=np.concatenate([desplazar(a['izquierdo'], r) for a, r in zip(arboles, raices)]),
+            derecho=np.concatenate([desplazar(a['derecho'], r) for a, r in zip(arboles, raices)]),
+            nan_izquierdo=np.concatenate([a['nan_izquierdo'] for a in arboles]).astype(np.uint8),
+            valor=np.concatenate([a['valor'] for a in arboles]).astype(np.float32),
+            raices=raices,
+            features=features,
+            meta=meta
+        )
+
+    @classmethod
+    def desde_sklearn(cls, modelo, features=None, tolerancia_hojas=None):
+        """
+        Convierte un RandomForestClassifier (o árbol de decisión) de sklearn.
+        Si tolerancia_hojas no es None se fusionan hojas redundantes.
+        """
+        arboles = [_arbol_desde_sklearn(e.tree_) for e in getattr(modelo, 'estimators_', [modelo])]
+        if tolerancia_hojas is not None:
+            arboles = [fusionar_hojas(a, tolerancia_hojas)[0] for a in arboles]
+        return cls.desde_arboles(arboles, features)
+
+    def recortar(self, n_arboles):
+        """Nuevo bosque con los primeros n_arboles (comparte los arreglos, sin copiar)"""
+        if n_arboles >= self.n_arboles:
+            return self
+        fin = self.raices[n_arboles]
+        return BosqueCompacto(
+            self.feature[:fin], self.umbral[:fin], self.izquierdo[:fin], self.derecho[:fin],
+            self.nan_izquierdo[:fin], self.valor[:fin], self.raices[:n_arboles], self.features, dict(self.meta)
+        )
+
+    def va_izquierda(self, valores, nodos):
+        """Rama de cada (valor, nodo) como en sklearn: x <= umbral, o el lado aprendido si x es NaN"""
+        return np.where(np.isnan(valores), self.nan_izquierdo[nodos] != 0, valores <= self.umbral[nodos])
+
+    def hojas(self, X, filas_por_bloque=4096):
+        """
+        Índice de hoja alcanzada por cada fila en cada árbol.
+
+        Returns:
+            np.ndarray int32 de forma (n_filas, n_arboles)
+        """
+        X = np.asarray(X, dtype=np.float32)
+        resultado = np.empty((len(X), self.n_arboles), dtype=np.int32)
+        for inicio in range(0, len(X), filas_por_bloque):
+            bloque = X[inicio:inicio + filas_por_bloque]
+            filas = np.arange(len(bloque))[:, None]
+            nodos = np.broadcast_to(self.raices, (len(bloque), self.n_arboles)).copy()
+            # Todas las filas y árboles avanzan un nivel por iteración
+            while True:
+                feat = self.feature[nodos]
+                activos = feat != HOJA
+                if not activos.any():
+                    break
+                valores = bloque[filas, np.where(activos, feat, 0)]
+                siguiente = np.where(self.va_izquierda(valores, nodos), self.izquierdo[nodos], self.derecho[nodos])
+                nodos = np.where(activos, siguiente, nodos)
+            resultado[inicio:inicio + len(bloque)] = nodos
+        return resultado
+
+    def probas_por_arbol(self, X):
+        """Probabilidad de churn de cada árbol: (n_filas, n_arboles) float32"""
+        return self.valor[self.hojas(X)]
+
+    def predict_proba(self, X):
+        """Misma salida que RandomForestClassifier.predict_proba: (n_filas, 2)"""
+        p1 = self.probas_por_arbol(X).mean(axis=1, dtype=np.float64)
+        return np.column_stack([1.0 - p1, p1])
+
+    def predict(self, X, threshold=0.5):
+        return (self.predict_proba(X)[:, 1] >= threshold).astype(int)
+
+    def guardar(self, directorio):
+        os.makedirs(directorio, exist_ok=True)
+        for nombre in ARREGLOS:
+            np.save(os.path.join(directorio, f"{nombre}.npy"), np.ascontiguousarray(getattr(self, nombre)))
+        meta = {
+            **self.meta,
+            'formato': FORMATO,
+            'features': self.features,
+            'n_arboles': int(self.n_arboles),
+            'n_nodos': int(self.n_nodos)
+        }
+        with open(os.path.join(directorio, 'meta.json'), 'w') as f:
+            json.dump(meta, f, indent=2)
+
+    @classmethod
+    def cargar(cls, directorio, mmap=True):
+        with open(os.path.join(directorio, 'meta.json')) as f:
+            meta = json.load(f)
+        if meta.get('formato') != FORMATO:
+            raise ValueError(f"Formato de bosque compacto no soportado: {meta.get('formato')}")
+        arreglos = {
+            nombre: np.load(os.path.join(directorio, f"{nombre}.npy"), mmap_mode='r' if mmap else None)
+            for nombre in ARREGLOS
+        }
+        bosque = cls(**arreglos, features=meta.get('features'), meta=meta)
+        bosque.directorio = directorio
+        return bosque
+
+
+def tamano_directorio(directorio):
+    return sum(
+        os.path.getsize(os.path.join(directorio, nombre))
+        for nombre in os.listdir(directorio)
+    )
@@ -0,0 +1,157 @@
+"""
+Módulo de predicción de churn para el dashboard.
+
+Carga el modelo entrenado por guardar_modelo.py (churn_model.pkl, o su versión
+comprimida churn_model_compacto/ si existe) y el pipeline
+de features (churn_pipeline.pkl), que es el mismo objeto que usó el
+entrenamiento. Si solo existen churn_scaler.pkl y churn_features.json (modelos
+anteriores) el pipeline se reconstruye a partir de ellos.
+"""
+import json
+import os
+import pickle
+
+import numpy as np
+
+from procesamiento_datos import UMBRAL_CHURN_DIAS
+from bosque_compacto import BosqueCompacto
+from features_churn import COLUMNAS_IMPUTAR_MEDIANA, PipelineFeatures, calcular_medianas, imputar
+from scoring_paralelo import ScoringParalelo
+
+base_dir = os.path.dirname(os.path.abspath(__file__))
+
+MIN_MUESTRA = 10
+
+
+def cargar_modelo_compacto(model_dir):
+    """
+    Carga churn_model_compacto/ (comprimir_modelo.py) si existe y corresponde al
+    churn_model.pkl actual (o si no hay pickle). Retorna None en otro caso.
+    """
+    directorio = os.path.join(model_dir, 'churn_model_compacto')
+    if not os.path.exists(os.path.join(directorio, 'meta.json')):
+        return None
+    try:
+        compacto = BosqueCompacto.cargar(directorio)
+    except ValueError:
+        return None  # Formato anterior: volver a ejecutar comprimir_modelo.py
+    ruta_pickle = os.path.join(model_dir, 'churn_model.pkl')
+    if os.path.exists(ruta_pickle):
+        huella = os.stat(ruta_pickle)
+        origen = compacto.meta.get('modelo_origen') or {}
+        if origen.get('bytes') != huella.st_size or origen.get('mtime') != huella.st_mtime:
+            return None  # El pickle se reentrenó después de comprimir
+    return compacto
+
+
+class ChurnPredictor:
+    """Encapsula el modelo de churn: preparación de features, normalización y predicción"""
+
+    def __init__(self, model_dir=base_dir, usar_compacto=True, procesos=0):
+        """
+        Args:
+            procesos: si es > 1 y el modelo es un bosque, predict_proba reparte
+                las filas en un pool de procesos (scoring_paralelo.py)
+        """
+        self.model = None
+        if usar_compacto:
+            self.model = cargar_modelo_compacto(model_dir)
+        if self.model is None:
+            with open(os.path.join(model_dir, 'churn_model.pkl'), 'rb') as f:
+                self.model = pickle.load(f)
+
+        ruta_pipeline = os.path.join(model_dir, 'churn_pipeline.pkl')
+        if os.path.exists(ruta_pipeline):
+            self.pipeline = PipelineFeatures.cargar(ruta_pipeline)
+        else:
+            with open(os.path.join(model_dir, 'churn_scaler.pkl'), 'rb') as f:
+                scaler = pickle.load(f)
+            with open(os.path.join(model_dir, 'churn_features.json')) as f:
+                features_info = json.load(f)
+            self.pipeline = PipelineFeatures.desde_archivos_legados(features_info, scaler)
+
+        self.features = self.pipeline.features
+
+        self.ejecutor = None
+        if procesos and procesos > 1:
+            try:
+                self.ejecutor = ScoringParalelo(self.model, procesos=procesos)
+            except ValueError:
+                pass  # Modelos que no son bosques se evalúan en el proceso actual
+
+    def cerrar(self):
+        """Detiene el pool de procesos (procesos > 1) y borra su directorio temporal"""
+        if self.ejecutor is not None:
+            self.ejecutor.cerrar()
+            self.ejecutor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.cerrar()
+
+    @property
+    def columnas_entrada(self):
+        """Columnas de BaseDeDatos que necesita el modelo"""
+        return self.pipeline.columnas_entrada
+
+    def _prepare_features(self, df):
+        if self.pipeline.medianas:
+            return self.pipeline.transform(df)
+        # Sin medianas de entrenamiento: imputar con las del propio lote antes de escalar
+        X = self.pipeline.transform(df, escalar=False)
+        imputar(X, self.pipeline.reglas, calcular_medianas(X, self.pipeline.reglas))
+        return self.pipeline.escalar(X)
+
+    def predict_proba(self, df):
+        """
+        Probabilidad de churn (0-1) para cada fila de df.
+
+        Returns:
+            np.ndarray de longitud len(df)
+        """
+        if len(df) == 0:
+            return np.array([], dtype=np.float64)
+        modelo = self.ejecutor if self.ejecutor is not None else self.model
+        return modelo.predict_proba(self._prepare_features(df))[:, 1]
+
+    def predict(self, df, threshold=0.5):
+        return (self.predict_proba(df) >= threshold).astype(int)
+
+    @staticmethod
+    def get_risk_level(proba):
+        if proba >= 0.7:
+            return 'Crítico'
+        elif proba >= 0.5:
+            return 'Alto'
+        elif proba >= 0.3:
+            return 'Medio'
+        return 'Bajo'
+
+    def validate_data_quality(self, df):
+        """
+        Revisa que df sea apto para predecir.
+
+        Returns:
+            dict: {'is_valid': bool, 'issues': [...], 'warnings': [...]}
+        """
+        issues = []
+        warnings = []
+
+        faltantes = [col for col in self.columnas_entrada if col not in df.columns]
+        criticas = [col for col in faltantes if col not in COLUMNAS_IMPUTAR_MEDIANA]
+        if criticas:
+            issues.append(f"Faltan columnas requeridas por el modelo: {criticas}")
+        elif faltantes:
+            warnings.append(f"Columnas ausentes (se usará la mediana): {faltantes}")
+
+        if 0 < len(df) < MIN_MUESTRA:
+            warnings.append(f"Muestra pequeña ({len(df)} usuarios)")
+
+        if 'recency_days' in df.columns and len(df) > 0:
+            churneados = (df['recency_days'] >= UMBRAL_CHURN_DIAS).mean()
+            if churneados > 0:
+                warnings.append(f"{churneados:.1%} de los usuarios ya son churn (recency_days >= {UMBRAL_CHURN_DIAS})")
+
+        return {'is_valid': not issues, 'issues': issues, 'warnings': warnings}
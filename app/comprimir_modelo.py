@@ -0,0 +1,264 @@
+"""
+Compresión del modelo de churn dentro de un presupuesto de AUC.
+
+Toma churn_model.pkl (RandomForestClassifier) y genera churn_model_compacto/
+(ver bosque_compacto.py):
+  1. Fusiona hojas hermanas redundantes (--tolerancia-hojas; 0 = sin cambio en
+     las predicciones).
+  2. Descarta árboles: se queda con el menor prefijo del bosque cuya AUC sobre
+     el conjunto de validación no cae más de --presupuesto-auc frente al modelo
+     ORIGINAL (fusión + recorte juntos). Si la fusión sola ya se pasa del
+     presupuesto, se reduce --tolerancia-hojas a la mitad hasta llegar a 0.
+
+El 20% de prueba de guardar_modelo.py se parte en dos mitades estratificadas:
+validación para elegir la tolerancia y el número de árboles, y prueba, que no
+interviene en ninguna decisión, para reportar la AUC y verificar el presupuesto.
+(Las filas de entrenamiento no sirven para validar: cada árbol memoriza su
+bootstrap y la AUC ahí es casi 1 con pocos árboles.)
+  3. Verifica que el bosque aplanado (sin fusión ni recorte) dé las mismas
+     probabilidades que sklearn, incluidas filas con NaN.
+  4. Guarda umbrales en float32 e índices de nodos en int32.
+
+Reporta tamaño en disco, tiempo de carga, latencia de predicción y delta de AUC
+frente al modelo original, y lo guarda en comprimir_modelo_reporte.json.
+
+Uso:
+    cd app
+    python comprimir_modelo.py [--presupuesto-auc 0.002] [--tolerancia-hojas 0.0] [--paso 10]
+"""
+import argparse
+import json
+import os
+import pickle
+import shutil
+import sys
+import time
+
+import numpy as np
+from sklearn.metrics import roc_auc_score
+from sklearn.model_selection import train_test_split
+
+from bosque_compacto import BosqueCompacto, tamano_directorio
+from churn_predictor import ChurnPredictor
+from features_churn import leer_matriz_entrenamiento
+
+base_dir = os.path.dirname(os.path.abspath(__file__))
+MODELO_COMPACTO_DIR = os.path.join(base_dir, 'churn_model_compacto')
+
+
+def _medir(funcion, repeticiones=5):
+    """Mediana del tiempo de ejecución (s)"""
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        funcion()
+        tiempos.append(time.perf_counter() - inicio)
+    return float(np.median(tiempos))
+
+
+def conjuntos_evaluacion(archivo, predictor, max_filas=None):
+    """
+    Reconstruye el 20% de prueba de guardar_modelo.py (mismo random_state y
+    stratify), lo transforma con el pipeline del modelo y lo parte en dos
+    mitades estratificadas disjuntas.
+
+    Returns:
+        (X_validacion, y_validacion, X_prueba, y_prueba)
+    """
+    _, X_raw, y, _ = leer_matriz_entrenamiento(archivo, predictor.features)
+    X = predictor.pipeline.escalar(predictor.pipeline.imputar(X_raw))
+    _, X_test, _, y_test = train_test_split(X, y, test_size=0.20, random_state=42, stratify=y)
+    if max_filas and len(y_test) > max_filas:
+        X_test, _, y_test, _ = train_test_split(X_test, y_test, train_size=max_filas, random_state=42, stratify=y_test)
+    X_val, X_test, y_val, y_test = train_test_split(X_test, y_test, test_size=0.5, random_state=42, stratify=y_test)
+    return np.ascontiguousarray(X_val), y_val, np.ascontiguousarray(X_test), y_test
+
+
+TOLERANCIA_MINIMA = 1e-4  # Por debajo de esto la fusión se desactiva (tolerancia 0)
+FILAS_PARIDAD = 2000
+MAX_DIFERENCIA_PARIDAD = 1e-6
+
+
+def elegir_n_arboles(probas_por_arbol, y, presupuesto, paso, auc_referencia):
+    """
+    Menor número de árboles (prefijo) con AUC >= auc_referencia - presupuesto.
+    auc_referencia es la del modelo original, no la del bosque ya fusionado.
+
+    Returns:
+        (n_arboles, auc del prefijo) o (n_total, auc completa) si ningún prefijo
+        cumple (el llamador decide qué hacer)
+    """
+    n_total = probas_por_arbol.shape[1]
+    acumuladas = np.cumsum(probas_por_arbol, axis=1, dtype=np.float64)
+    candidatos = sorted(set(list(range(paso, n_total, paso)) + [n_total]))
+    for n in candidatos:
+        auc = roc_auc_score(y, acumuladas[:, n - 1])
+        if auc >= auc_referencia - presupuesto:
+            return n, auc
+    return n_total, roc_auc_score(y, acumuladas[:, -1])
+
+
+def filas_con_nan(X, n_filas=FILAS_PARIDAD, semilla=42):
+    """Copia de hasta n_filas de X con un NaN por fila, en una feature distinta cada vez"""
+    rng = np.random.default_rng(semilla)
+    X_nan = X[rng.choice(len(X), size=min(n_filas, len(X)), replace=False)].copy()
+    X_nan[np.arange(len(X_nan)), np.arange(len(X_nan)) % X.shape[1]] = np.nan
+    return X_nan
+
+
+def diferencia_paridad(modelo, bosque, X):
+    """
+    Máxima diferencia de probabilidad entre sklearn y el bosque aplanado.
+
+    Returns:
+        float, o None si el modelo de sklearn no acepta NaN (versiones sin
+        soporte de faltantes)
+    """
+    try:
+        esperado = modelo.predict_proba(X)[:, 1]
+    except ValueError:
+        return None
+    return float(np.abs(bosque.predict_proba(X)[:, 1] - esperado).max())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Comprime churn_model.pkl dentro de un presupuesto de AUC")
+    parser.add_argument('--modelo', default=os.path.join(base_dir, 'churn_model.pkl'))
+    parser.add_argument('--datos', default=os.path.join(base_dir, 'BaseDeDatos.csv'))
+    parser.add_argument('--salida', default=MODELO_COMPACTO_DIR)
+    parser.add_argument('--presupuesto-auc', type=float, default=0.002, help="Pérdida máxima de AUC permitida")
+    parser.add_argument('--tolerancia-hojas', type=float, default=0.0, help="Diferencia máxima para fusionar hojas hermanas")
+    parser.add_argument('--paso', type=int, default=10, help="Granularidad al buscar el número de árboles")
+    parser.add_argument('--max-filas-prueba', type=int, default=100_000,
+                        help="Filas del 20%% de prueba a usar (se parten entre validación y prueba)")
+    args = parser.parse_args()
+
+    print("="*80)
+    print("COMPRESIÓN DEL MODELO DE CHURN")
+    print("="*80)
+
+    for ruta in (args.modelo, args.datos):
+        if not os.path.exists(ruta):
+            print(f"ERROR: No se encontró {ruta}")
+            sys.exit(1)
+
+    print("\n1. Cargando modelo original...")
+    tiempo_carga_original = _medir(lambda: pickle.load(open(args.modelo, 'rb')), repeticiones=3)
+    predictor = ChurnPredictor(os.path.dirname(os.path.abspath(args.modelo)), usar_compacto=False)
+    modelo = predictor.model
+    if not hasattr(modelo, 'estimators_') or not hasattr(modelo.estimators_[0], 'tree_'):
+        print(f"ERROR: Solo se pueden comprimir bosques de árboles (actual: {type(modelo).__name__})")
+        sys.exit(1)
+    nodos_original = int(sum(e.tree_.node_count for e in modelo.estimators_))
+    print(f"   ✓ {len(modelo.estimators_)} árboles, {nodos_original:,} nodos")
+
+    print("\n2. Preparando conjuntos de validación y prueba...")
+    X_val, y_val, X_test, y_test = conjuntos_evaluacion(args.datos, predictor, args.max_filas_prueba)
+    print(f"   ✓ Validación: {len(y_val):,} filas | Prueba: {len(y_test):,} filas")
+
+    print("\n3. Verificando paridad con sklearn (incluye filas con NaN)...")
+    aplanado = BosqueCompacto.desde_sklearn(modelo, predictor.features)
+    for nombre, X_paridad in (('sin NaN', X_val[:FILAS_PARIDAD]), ('con NaN', filas_con_nan(X_val))):
+        diferencia = diferencia_paridad(modelo, aplanado, X_paridad)
+        if diferencia is None:
+            print(f"   - {nombre}: el modelo de sklearn no acepta NaN, se omite")
+            continue
+        if diferencia > MAX_DIFERENCIA_PARIDAD:
+            print(f"ERROR: El bosque aplanado difiere de sklearn {nombre} (máx. {diferencia:.2e})")
+            sys.exit(1)
+        print(f"   ✓ {nombre}: diferencia máxima {diferencia:.2e}")
+
+    # La tolerancia y el número de árboles se eligen solo con validación
+    auc_validacion = roc_auc_score(y_val, modelo.predict_proba(X_val)[:, 1])
+    tolerancia = args.tolerancia_hojas
+    while True:
+        print(f"\n4. Fusionando hojas redundantes (tolerancia {tolerancia:g})...")
+        bosque = BosqueCompacto.desde_sklearn(modelo, predictor.features, tolerancia_hojas=tolerancia)
+        print(f"   ✓ {nodos_original:,} → {bosque.n_nodos:,} nodos")
+
+        print("\n5. Eligiendo número de árboles...")
+        n_arboles, auc_prefijo = elegir_n_arboles(
+            bosque.probas_por_arbol(X_val), y_val, args.presupuesto_auc, args.paso, auc_validacion
+        )
+        if auc_prefijo >= auc_validacion - args.presupuesto_auc:
+            break
+        if tolerancia == 0:
+            print(f"ERROR: El bosque aplanado pierde {auc_validacion - auc_prefijo:.4f} de AUC en validación "
+                  f"(presupuesto {args.presupuesto_auc})")
+            sys.exit(1)
+        print(f"   - La fusión pierde {auc_validacion - auc_prefijo:.4f} de AUC con todos los árboles; "
+              f"se reduce la tolerancia")
+        tolerancia = tolerancia / 2 if tolerancia / 2 >= TOLERANCIA_MINIMA else 0.0
+    bosque = bosque.recortar(n_arboles)
+    print(f"   ✓ {n_arboles} de {len(modelo.estimators_)} árboles "
+          f"(AUC de validación {auc_prefijo:.4f} vs original {auc_validacion:.4f})")
+
+    print("\n6. Guardando modelo compacto...")
+    huella = os.stat(args.modelo)
+    bosque.meta = {
+        'modelo_origen': {'bytes': huella.st_size, 'mtime': huella.st_mtime},
+        'tolerancia_hojas': tolerancia,
+        'presupuesto_auc': args.presupuesto_auc
+    }
+    bosque.guardar(args.salida)
+    print(f"   ✓ {args.salida}")
+
+    print("\n7. Midiendo en el conjunto de prueba...")
+    compacto = BosqueCompacto.cargar(args.salida)
+    tiempo_carga_compacto = _medir(lambda: BosqueCompacto.cargar(args.salida), repeticiones=3)
+    fila = X_test[:1]
+    lote = X_test[:min(len(X_test), 10_000)]
+    proba_original = modelo.predict_proba(X_test)[:, 1]
+    proba_compacto = compacto.predict_proba(X_test)[:, 1]
+    auc_original = roc_auc_score(y_test, proba_original)
+    auc_compacto = roc_auc_score(y_test, proba_compacto)
+
+    reporte = {
+        'arboles': {'original': len(modelo.estimators_), 'compacto': compacto.n_arboles},
+        'nodos': {'original': nodos_original, 'compacto': compacto.n_nodos},
+        'tamano_mb': {
+            'original': os.path.getsize(args.modelo) / 1024 / 1024,
+            'compacto': tamano_directorio(args.salida) / 1024 / 1024
+        },
+        'tiempo_carga_ms': {
+            'original': tiempo_carga_original * 1e3,
+            'compacto': tiempo_carga_compacto * 1e3
+        },
+        'latencia_fila_ms': {
+            'original': _medir(lambda: modelo.predict_proba(fila), 20) * 1e3,
+            'compacto': _medir(lambda: compacto.predict_proba(fila), 20) * 1e3
+        },
+        'latencia_lote_us_fila': {
+            'original': _medir(lambda: modelo.predict_proba(lote), 3) / len(lote) * 1e6,
+            'compacto': _medir(lambda: compacto.predict_proba(lote), 3) / len(lote) * 1e6
+        },
+        'auc': {'original': auc_original, 'compacto': auc_compacto, 'delta': auc_compacto - auc_original},
+        'auc_validacion': {'original': auc_validacion, 'compacto': auc_prefijo},
+        'filas': {'validacion': int(len(y_val)), 'prueba': int(len(y_test))},
+        'max_diferencia_proba': float(np.abs(proba_compacto - proba_original).max())
+    }
+
+    ruta_reporte = os.path.join(base_dir, 'comprimir_modelo_reporte.json')
+    with open(ruta_reporte, 'w') as f:
+        json.dump(reporte, f, indent=2)
+
+    print(f"\n   {'':<24}{'original':>14}{'compacto':>14}")
+    for clave in ['arboles', 'nodos', 'tamano_mb', 'tiempo_carga_ms', 'latencia_fila_ms', 'latencia_lote_us_fila']:
+        print(f"   {clave:<24}{reporte[clave]['original']:>14,.3f}{reporte[clave]['compacto']:>14,.3f}")
+    print(f"   {'auc':<24}{auc_original:>14.4f}{auc_compacto:>14.4f}   (delta {auc_compacto - auc_original:+.4f})")
+    print(f"   ✓ Reporte: {ruta_reporte}")
+
+    if auc_original - auc_compacto > args.presupuesto_auc:
+        # No dejar en disco un modelo que ChurnPredictor tomaría automáticamente
+        shutil.rmtree(args.salida)
+        print(f"ERROR: El modelo compacto pierde {auc_original - auc_compacto:.4f} de AUC "
+              f"(presupuesto {args.presupuesto_auc}); se eliminó {args.salida}")
+        sys.exit(1)
+
+    print("\n" + "="*80)
+    print("✅ MODELO COMPACTO LISTO (ChurnPredictor lo usa automáticamente)")
+    print("="*80)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Dataset del dashboard compartido por todas las sesiones de un proceso.
+
+load_data() (y los datos demo) construyen un DatasetCompartido una sola vez vía
+st.cache_resource; cada sesión solo guarda una referencia. Para que nadie pueda
+modificar por accidente lo que ven las demás sesiones:
+
+  - al construirlo, los arreglos NumPy de cada tabla se marcan como de solo
+    lectura (writeable=False); una escritura en el lugar (.loc[...] = x,
+    fillna(inplace=True) sobre una columna, ...) lanza ValueError en vez de
+    corromper el dataset
+  - data['clients'] retorna una vista: un DataFrame nuevo (copy(deep=False))
+    sobre los mismos arreglos. Se le pueden agregar o reemplazar columnas sin
+    afectar a nadie, y no copia datos
+
+Así las páginas no necesitan .copy() defensivos. `version` identifica la carga
+(versión del manifest de artefactos o marca de tiempo) y sirve como llave de
+cachés derivados (p.ej. get_scorer_online).
+"""
+import itertools
+from collections.abc import Mapping
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+_cargas = itertools.count(1)
+
+
+def _arreglos(obj):
+    """Arreglos NumPy que respaldan un DataFrame o Series (incluye fechas y códigos de categóricas)"""
+    for bloque in obj._mgr.blocks:
+        valores = bloque.values
+        arreglo = valores if isinstance(valores, np.ndarray) else getattr(valores, '_ndarray', None)
+        if isinstance(arreglo, np.ndarray):
+            yield arreglo
+
+
+def congelar(obj):
+    """Marca como solo lectura los arreglos de un DataFrame/Series (en el lugar). Returns: obj"""
+    for arreglo in _arreglos(obj):
+        arreglo.flags.writeable = False
+    return obj
+
+
+class DatasetCompartido(Mapping):
+    """Tablas del dashboard (history, calls, agents, ...) de solo lectura y versionadas"""
+
+    def __init__(self, tablas, version=None):
+        self._tablas = {
+            nombre: congelar(valor) if isinstance(valor, (pd.DataFrame, pd.Series)) else valor
+            for nombre, valor in tablas.items()
+        }
+        self.version = version or f"{datetime.now():%Y%m%d-%H%M%S}-{next(_cargas)}"
+
+    def __getitem__(self, nombre):
+        valor = self._tablas[nombre]
+        if isinstance(valor, (pd.DataFrame, pd.Series)):
+            return valor.copy(deep=False)
+        return valor
+
+    def __iter__(self):
+        return iter(self._tablas)
+
+    def __len__(self):
+        return len(self._tablas)
+
+    def __repr__(self):
+        tamanos = ', '.join(f"{n}={len(v)}" for n, v in self._tablas.items() if v is not None)
+        return f"DatasetCompartido(version={self.version!r}, {tamanos})"
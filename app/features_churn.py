@@ -0,0 +1,307 @@
+"""
+Construcción de la matriz de features del modelo de churn.
+
+Compartido por el entrenamiento (guardar_modelo.py) y la inferencia
+(churn_predictor.py). En lugar de aplicar pd.get_dummies sobre todas las
+columnas categóricas y luego quedarse con 11 features, cada dummy seleccionada
+(p.ej. 'usertype_HYBRID') se calcula directamente como una comparación
+booleana sobre su columna base, y todo se escribe en un arreglo float32.
+
+PipelineFeatures agrupa todo lo que se ajusta en el entrenamiento (medianas de
+imputación, reglas de dummies y parámetros del StandardScaler) y se serializa
+como churn_pipeline.pkl junto a churn_scaler.pkl.
+"""
+import pickle
+
+import numpy as np
+import pandas as pd
+
+# Features seleccionadas para el modelo final (mismo orden que el entrenamiento)
+SELECTED_FEATURES = [
+    'tenure_months',
+    'tx_count',
+    'tx_per_contact',
+    'amount_sum',
+    'tx_per_month',
+    'avg_gap_days',
+    'cc_days_since_last_no hubo contacto',
+    'usertype_HYBRID',
+    'qualification',
+    'cc_fcr_rate_no hubo contacto',
+    'is_premium_True'
+]
+
+# Columnas numéricas cuyos faltantes se imputan con la mediana de entrenamiento
+COLUMNAS_IMPUTAR_MEDIANA = ['avg_gap_days']
+
+
+def reglas_features(features, categorical_cols_base):
+    """
+    Traduce los nombres de features a reglas de construcción.
+
+    Una feature '<col>_<categoria>' con <col> en categorical_cols_base es una
+    dummy; cualquier otra es numérica y se toma tal cual.
+
+    Returns:
+        list de tuplas ('numerica', columna) o ('dummy', columna, categoria)
+    """
+    # Las columnas base más largas primero ('cc_fcr_rate' antes que 'cc')
+    bases = sorted(categorical_cols_base, key=len, reverse=True)
+    reglas = []
+    for feat in features:
+        base = next((b for b in bases if feat.startswith(b + '_')), None)
+        if base is None:
+            reglas.append(('numerica', feat))
+        else:
+            reglas.append(('dummy', base, feat[len(base) + 1:]))
+    return reglas
+
+
+def columnas_requeridas(reglas):
+    """Columnas de BaseDeDatos que hay que leer para construir las features"""
+    return list(dict.fromkeys(regla[1] for regla in reglas))
+
+
+def _columna_dummy(valores, categoria):
+    """Equivalente a la columna '<col>_<categoria>' de pd.get_dummies, sin materializar las demás"""
+    if isinstance(getattr(valores, 'dtype', None), pd.CategoricalDtype):
+        etiquetas = valores.cat.categories.astype(str)
+        if categoria not in etiquetas:
+            return 0.0
+        return valores.cat.codes.to_numpy() == etiquetas.get_loc(categoria)
+    valores = np.asarray(valores)
+    return (valores.astype(str) == categoria) & pd.notna(valores)
+
+
+def columnas_categoricas(df_muestra, features=SELECTED_FEATURES):
+    """
+    Columnas categóricas base (como las detectaba el entrenamiento original:
+    object/bool sin identificadores, fechas ni la variable objetivo).
+    """
+    columns_to_drop = ['id_user', 'first_tx', 'last_tx', 'churn']
+    categorical_cols = [
+        col for col in df_muestra.select_dtypes(include=['object', 'bool']).columns
+        if col not in columns_to_drop
+    ]
+    # Eliminar columnas constantes
+    if 'has_transactions' in categorical_cols and df_muestra['has_transactions'].nunique() == 1:
+        categorical_cols.remove('has_transactions')
+    # La muestra puede no tener texto en columnas mixtas (p.ej. cc_days_since_last):
+    # la columna base de cada dummy seleccionada se considera categórica
+    for feat in features:
+        if feat in df_muestra.columns:
+            continue
+        bases = [col for col in df_muestra.columns if feat.startswith(col + '_')]
+        if bases:
+            base = max(bases, key=len)
+            if base not in categorical_cols:
+                categorical_cols.append(base)
+    return categorical_cols
+
+
+def leer_matriz_entrenamiento(archivo, features=SELECTED_FEATURES, columnas_extra=(),
+                              chunksize=200_000, avisar=print):
+    """
+    Lee BaseDeDatos.csv por bloques y construye la matriz de entrenamiento sin
+    imputar ni escalar (solo se leen las columnas del modelo).
+
+    Args:
+        columnas_extra: columnas adicionales a conservar (p.ej. 'last_tx')
+
+    Returns:
+        tuple: (pipeline sin ajustar, X_raw float32, y int8, dict columna -> arreglo de columnas_extra)
+    """
+    df_muestra = pd.read_csv(archivo, nrows=10000)
+    pipeline = PipelineFeatures(features, columnas_categoricas(df_muestra, features))
+    faltantes = [col for col in pipeline.columnas_entrada if col not in df_muestra.columns]
+    for col in faltantes:
+        avisar(f"   Advertencia: Columna '{col}' no encontrada, sus features se crearán con valor 0")
+    extras = [col for col in columnas_extra if col in df_muestra.columns]
+    columnas_leer = list(dict.fromkeys(
+        [col for col in pipeline.columnas_entrada if col in df_muestra.columns] + ['churn'] + extras
+    ))
+
+    # Cada bloque se convierte de inmediato a float32
+    bloques_X = []
+    bloques_y = []
+    bloques_extra = {col: [] for col in extras}
+    for bloque in pd.read_csv(archivo, usecols=columnas_leer, chunksize=chunksize, low_memory=False):
+        bloques_X.append(pipeline.transform(bloque, escalar=False))
+        bloques_y.append(bloque['churn'].astype(int).to_numpy(dtype=np.int8))
+        for col in extras:
+            bloques_extra[col].append(bloque[col].to_numpy())
+    X_raw = np.concatenate(bloques_X)
+    y = np.concatenate(bloques_y)
+    return pipeline, X_raw, y, {col: np.concatenate(b) for col, b in bloques_extra.items()}
+
+
+def calcular_medianas(X, reglas, columnas=COLUMNAS_IMPUTAR_MEDIANA):
+    """Medianas (ignorando NaN) de las columnas numéricas a imputar"""
+    medianas = {}
+    for j, regla in enumerate(reglas):
+        if regla[0] == 'numerica' and regla[1] in columnas:
+            medianas[regla[1]] = float(np.nanmedian(X[:, j]))
+    return medianas
+
+
+def imputar(X, reglas, medianas):
+    """Rellena in-place los NaN de las columnas con mediana conocida"""
+    for j, regla in enumerate(reglas):
+        if regla[0] == 'numerica' and regla[1] in medianas:
+            faltantes = np.isnan(X[:, j])
+            X[faltantes, j] = medianas[regla[1]]
+    return X
+
+
+class PipelineFeatures:
+    """
+    Pipeline de features ajustado: imputación + dummies + escalado en una sola
+    pasada por columna sobre un arreglo float32, sin DataFrames intermedios.
+    """
+
+    def __init__(self, features=SELECTED_FEATURES, categorical_cols_base=()):
+        self.features = list(features)
+        self.categorical_cols_base = list(categorical_cols_base)
+        self.reglas = reglas_features(self.features, self.categorical_cols_base)
+        self.medianas = {}
+        self.media = None
+        self.escala = None
+
+    @property
+    def columnas_entrada(self):
+        return columnas_requeridas(self.reglas)
+
+    def ajustar_medianas(self, X_raw):
+        """Calcula las medianas sobre la matriz sin imputar y las aplica in-place"""
+        self.medianas = calcular_medianas(X_raw, self.reglas)
+        imputar(X_raw, self.reglas, self.medianas)
+        return X_raw
+
+    def imputar(self, X_raw):
+        """Aplica in-place las medianas ya ajustadas a una matriz sin imputar"""
+        return imputar(X_raw, self.reglas, self.medianas)
+
+    def ajustar_escala(self, media, escala):
+        """Guarda los parámetros de un StandardScaler ya ajustado (mean_, scale_)"""
+        # float64 como StandardScaler: el resultado redondeado a float32 es idéntico
+        self.media = np.asarray(media, dtype=np.float64)
+        self.escala = np.asarray(escala, dtype=np.float64)
+
+    def escalar(self, X):
+        """Escala in-place, columna por columna, una matriz ya construida e imputada"""
+        if self.media is not None:
+            for j in range(X.shape[1]):
+                X[:, j] = (X[:, j] - self.media[j]) / self.escala[j]
+        return X
+
+    def transform(self, df, escalar=True):
+        """
+        Construye la matriz de features lista para el modelo.
+
+        Args:
+            df: DataFrame (o dict de arreglos) con las columnas de columnas_entrada;
+                las columnas ausentes se dejan en 0, como en el entrenamiento
+            escalar: False para obtener las features en unidades originales
+
+        Returns:
+            np.ndarray float32 de forma (n, len(features))
+        """
+        n = len(df) if hasattr(df, 'columns') else len(next(iter(df.values())))
+        X = np.empty((n, len(self.reglas)), dtype=np.float32)
+        columna = np.empty(n, dtype=np.float64)
+        for j, regla in enumerate(self.reglas):
+            col = regla[1]
+            if col not in df.keys():
+                columna.fill(0.0)
+            elif regla[0] == 'dummy':
+                columna[:] = _columna_dummy(df[col], regla[2])
+            else:
+                columna[:] = pd.to_numeric(df[col], errors='coerce')
+                if col in self.medianas:
+                    columna[np.isnan(columna)] = self.medianas[col]
+            if escalar and self.media is not None:
+                columna -= self.media[j]
+                columna /= self.escala[j]
+            X[:, j] = columna
+        return X
+
+    def guardar(self, ruta):
+        with open(ruta, 'wb') as f:
+            pickle.dump(self, f)
+
+    @staticmethod
+    def cargar(ruta):
+        with open(ruta, 'rb') as f:
+            return pickle.load(f)
+
+    @classmethod
+    def desde_archivos_legados(cls, features_info, scaler):
+        """Reconstruye el pipeline a partir de churn_features.json + churn_scaler.pkl"""
+        pipeline = cls(features_info['features'], features_info.get('categorical_cols_base', []))
+        pipeline.medianas = dict(features_info.get('medianas') or {})
+        if features_info.get('escalar_features', not features_info.get('escalado_plegado', False)):
+            pipeline.ajustar_escala(scaler.mean_, scaler.scale_)
+        return pipeline
+
+    def plegar_escalado(self, modelo):
+        """
+        Reescribe los umbrales de los árboles del modelo en unidades originales
+        y desactiva el escalado del pipeline (ver plegar_escalado_en_arboles).
+        """
+        plegar_escalado_en_arboles(modelo, self.media, self.escala)
+        self.media = None
+        self.escala = None
+
+
+def _escalar_como_pipeline(x, media, escala):
+    """Valor escalado tal como lo ve el árbol: float64 -> float32 -> comparación en float64"""
+    return ((x.astype(np.float64) - media) / escala).astype(np.float32).astype(np.float64)
+
+
+def umbral_sin_escala(umbrales, media, escala):
+    """
+    Convierte umbrales sobre la feature escalada z = (x - media) / escala a
+    umbrales sobre x.
+
+    Los árboles comparan el valor float32 contra el umbral (x <= u va a la
+    izquierda). Como escala > 0 la transformación es monótona, así que se busca
+    el mayor float32 x tal que z(x) <= u: con ese umbral cada fila toma la misma
+    rama que con el escalado, incluidos los casos de redondeo.
+    """
+    umbrales = np.asarray(umbrales, dtype=np.float64)
+    x = (umbrales * escala + media).astype(np.float32)
+    # Bajar mientras z(x) > u
+    for _ in range(64):
+        pasado = _escalar_como_pipeline(x, media, escala) > umbrales
+        if not pasado.any():
+            break
+        x[pasado] = np.nextafter(x[pasado], np.float32(-np.inf))
+    # Subir mientras el siguiente float32 siga cumpliendo z(x) <= u
+    for _ in range(64):
+        siguiente = np.nextafter(x, np.float32(np.inf))
+        cabe = _escalar_como_pipeline(siguiente, media, escala) <= umbrales
+        if not cabe.any():
+            break
+        x[cabe] = siguiente[cabe]
+    return x.astype(np.float64)
+
+
+def plegar_escalado_en_arboles(modelo, media, escala):
+    """
+    Pliega un escalado afín por feature dentro de los umbrales de un bosque de
+    sklearn (RandomForest / árboles de decisión), modificándolo in-place. Los
+    árboles son invariantes a transformaciones monótonas por feature, así que
+    el modelo resultante recibe las features en unidades originales.
+    """
+    media = np.asarray(media, dtype=np.float64)
+    escala = np.asarray(escala, dtype=np.float64)
+    arboles = getattr(modelo, 'estimators_', [modelo])
+    for arbol in arboles:
+        tree = arbol.tree_
+        internos = np.flatnonzero(tree.children_left != -1)
+        feats = tree.feature[internos]
+        umbrales = tree.threshold  # Vista escribible sobre los nodos del árbol
+        for f in np.unique(feats):
+            nodos = internos[feats == f]
+            umbrales[nodos] = umbral_sin_escala(umbrales[nodos], media[f], escala[f])
+    return modelo
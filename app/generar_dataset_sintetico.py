@@ -0,0 +1,259 @@
+"""
+Generador de un conjunto de datos sintético a escala de producción.
+
+Escribe los mismos archivos que lee load_data() (nombres y columnas):
+  - BaseDeDatos.csv: las 34 columnas del export original (una fila por usuario),
+    con las 11 features del modelo y las categóricas base de churn_features.json
+  - resultado_churn_por_mes.csv: REQUIRED_CHURN_COLS + tx_count (usuario x mes)
+  - debug_central_period_last_report_v2_filtrado.csv: fecha_rep, Motivo, id_user, id_agente
+  - agent_score_central_period_v2.csv: id_agente, total_casos, casos_ganados, casos_perdidos, winrate
+
+Las filas se generan y se escriben por bloques (--filas-por-bloque), así que la
+memoria no depende del tamaño total y se pueden producir decenas de millones de
+filas. Con la misma semilla y el mismo tamaño de bloque la salida es idéntica.
+
+Uso:
+    cd app
+    python generar_dataset_sintetico.py [--salida datos_sinteticos] [--clientes 1000000]
+                                        [--meses 12] [--llamadas 2000000] [--agentes 760]
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from procesamiento_datos import REQUIRED_CHURN_COLS, UMBRAL_CHURN_DIAS
+
+base_dir = os.path.dirname(os.path.abspath(__file__))
+
+CALLS_NOMBRE = "debug_central_period_last_report_v2_filtrado.csv"
+AGENTS_NOMBRE = "agent_score_central_period_v2.csv"
+CHURN_NOMBRE = "resultado_churn_por_mes.csv"
+BASE_DATOS_NOMBRE = "BaseDeDatos.csv"
+
+# Orden de columnas del export original de BaseDeDatos.csv
+COLUMNAS_BASE = [
+    'creationflow', 'age', 'gender', 'occupation', 'qualification', 'state', 'usertype',
+    'userchannel', 'id_user', 'tx_count', 'amount_sum', 'amount_mean', 'amount_p95',
+    'first_tx', 'last_tx', 'recency_days', 'tenure_days', 'has_transactions', 'cc_contacts',
+    'cc_csats_mean', 'cc_fcr_rate', 'tx_per_month', 'high_ticket', 'tx_per_week',
+    'avg_gap_days', 'is_digital', 'churn', 'cc_days_since_last', 'age_category',
+    'tx_per_contact', 'tenure_months', 'avg_monthly_spend', 'is_premium', 'long_gap'
+]
+COLUMNAS_CHURN = REQUIRED_CHURN_COLS + ['tx_count']
+COLUMNAS_LLAMADAS = ['fecha_rep', 'Motivo', 'id_user', 'id_agente']
+COLUMNAS_AGENTES = ['id_agente', 'total_casos', 'casos_ganados', 'casos_perdidos', 'winrate']
+
+SIN_CONTACTO = 'no hubo contacto'
+ESTADOS = ['VE', 'NL', 'SO', 'BC', 'EM', 'JA', 'CX', 'PU', 'GT', 'CH', 'TM', 'SI', 'YU', 'QR', 'OA']
+OCUPACIONES = ['Empleado', 'Negocio propio', 'Otro', 'Estudiante', 'Hogar', 'Profesionista']
+MOTIVOS = [
+    '1 Consulta de saldo', '2 Problema con tarjeta', '3 Transferencia fallida',
+    '4 Solicitud de información', '5 Queja por cobros', '6 Bloqueo de cuenta',
+    '7 Actualización de datos', '8 Promociones', '9 Cancelación', '10 Otros'
+]
+PROB_MOTIVOS = [0.25, 0.15, 0.12, 0.12, 0.10, 0.08, 0.07, 0.05, 0.03, 0.03]
+
+
+def _elegir(rng, opciones, n, p=None):
+    return np.asarray(opciones, dtype=object)[rng.choice(len(opciones), n, p=p)]
+
+
+def _fechas(dias):
+    """Días desde 1970 -> texto AAAA-MM-DD (vectorizado)"""
+    return dias.astype('datetime64[D]').astype(str)
+
+
+def bloque_base(rng, ids, fecha_fin):
+    """
+    Filas de BaseDeDatos para un bloque de usuarios.
+
+    Una "actividad" latente por usuario correlaciona frecuencia, recencia y monto,
+    de modo que el modelo tiene señal que aprender; churn = recency_days >= 42.
+    """
+    n = len(ids)
+    actividad = rng.beta(2, 2, n)
+
+    creationflow = _elegir(rng, ['POS', 'MOBILE', 'WEB'], n, p=[0.55, 0.40, 0.05])
+    userchannel = np.where(creationflow == 'POS', 'POS', _elegir(rng, ['ORGANIC', 'REFERRAL_ORGANIC'], n))
+    age = rng.integers(18, 75, n)
+
+    tenure_days = np.floor(rng.uniform(1, 365, n))
+    tenure_months = tenure_days / 30
+    tx_per_month = rng.gamma(2, 10 * actividad + 0.5)
+    tx_count = np.maximum(1, np.round(tx_per_month * np.maximum(tenure_months, 1)))
+    amount_mean = rng.lognormal(6, 0.6, n)
+    amount_sum = np.round(tx_count * amount_mean, 3)
+    recency_days = np.minimum(np.floor(rng.exponential(60 * (1 - actividad) + 2)), 364)
+    avg_gap_days = np.where(tx_count > 1, tenure_days / np.maximum(tx_count - 1, 1), np.nan)
+
+    cc_contacts = rng.poisson(0.8, n)
+    sin_contacto = (cc_contacts == 0) | (rng.random(n) < 0.4)
+    dias_contacto = np.floor(rng.uniform(0, 365, n)).astype(int).astype(str)
+    last_tx = fecha_fin - recency_days.astype(int)
+    amount_p95 = amount_mean * rng.uniform(1.5, 3.5, n)
+
+    return pd.DataFrame({
+        'creationflow': creationflow,
+        'age': age,
+        'gender': _elegir(rng, ['female', 'male'], n),
+        'occupation': _elegir(rng, OCUPACIONES, n),
+        'qualification': rng.integers(1, 4, n),
+        'state': _elegir(rng, ESTADOS, n),
+        'usertype': _elegir(rng, ['HYBRID', 'DIGITAL', 'ANALOG'], n, p=[0.5, 0.3, 0.2]),
+        'userchannel': userchannel,
+        'id_user': ids,
+        'tx_count': tx_count,
+        'amount_sum': amount_sum,
+        'amount_mean': amount_sum / tx_count,
+        'amount_p95': np.round(amount_p95, 3),
+        'first_tx': _fechas(last_tx - tenure_days.astype(int)),
+        'last_tx': _fechas(last_tx),
+        'recency_days': recency_days,
+        'tenure_days': tenure_days,
+        'has_transactions': True,
+        'cc_contacts': cc_contacts,
+        'cc_csats_mean': np.where(sin_contacto, 'SC', _elegir(rng, ['0.0', '0.5', '1.0'], n)),
+        'cc_fcr_rate': np.where(sin_contacto, SIN_CONTACTO, _elegir(rng, ['0.0', '1.0'], n)),
+        'tx_per_month': tx_per_month,
+        'high_ticket': amount_p95 > 3000,
+        'tx_per_week': tx_per_month / 4.345,
+        'avg_gap_days': avg_gap_days,
+        'is_digital': creationflow == 'MOBILE',
+        'churn': recency_days >= UMBRAL_CHURN_DIAS,
+        'cc_days_since_last': np.where(sin_contacto, SIN_CONTACTO, np.char.add(dias_contacto, '.0')),
+        'age_category': pd.cut(age, [0, 30, 45, 60, 200], labels=['18-30', '30-45', '45-60', '60+'], right=False).astype(str),
+        'tx_per_contact': tx_count / (cc_contacts + 1),
+        'tenure_months': tenure_months,
+        'avg_monthly_spend': amount_sum / np.maximum(tenure_months, 1),
+        'is_premium': amount_sum > 50_000,
+        'long_gap': avg_gap_days > 30
+    }, columns=COLUMNAS_BASE)
+
+
+def bloque_churn(rng, df_base, meses):
+    """Filas usuario x mes; el último mes usa la recencia de BaseDeDatos"""
+    n, m = len(df_base), len(meses)
+    recencia = df_base['recency_days'].to_numpy()
+    escala = np.maximum(recencia, 5)
+    dias = np.floor(rng.exponential(np.repeat(escala, m))).reshape(n, m).astype(np.int64)
+    dias[:, -1] = recencia
+    tx_mes = rng.poisson(np.repeat(df_base['tx_per_month'].to_numpy(), m)).reshape(n, m)
+    tx_mes[dias >= UMBRAL_CHURN_DIAS] = 0
+    monto = tx_mes * np.repeat(df_base['amount_mean'].to_numpy(), m).reshape(n, m)
+    return pd.DataFrame({
+        'mes': np.tile(meses.strftime('%Y-%m-%d').to_numpy(dtype=object), n),
+        'churn': (dias >= UMBRAL_CHURN_DIAS).ravel(),
+        'monto_total': np.round(monto.ravel(), 2),
+        'id_user': np.repeat(df_base['id_user'].to_numpy(), m),
+        'dias_sin_transacciones': dias.ravel(),
+        'tx_count': tx_mes.ravel()
+    }, columns=COLUMNAS_CHURN)
+
+
+def bloque_llamadas(rng, n, n_clientes, n_agentes, inicio, fin):
+    return pd.DataFrame({
+        'fecha_rep': _fechas(rng.integers(inicio, fin + 1, n)),
+        'Motivo': _elegir(rng, MOTIVOS, n, p=PROB_MOTIVOS),
+        'id_user': rng.integers(1, n_clientes + 1, n),
+        'id_agente': rng.integers(1, n_agentes + 1, n)
+    }, columns=COLUMNAS_LLAMADAS)
+
+
+def tabla_agentes(rng, n_agentes):
+    total = rng.integers(200, 2500, n_agentes)
+    ganados = rng.binomial(total, rng.beta(8, 10, n_agentes))
+    return pd.DataFrame({
+        'id_agente': np.arange(1, n_agentes + 1),
+        'total_casos': total,
+        'casos_ganados': ganados,
+        'casos_perdidos': total - ganados,
+        'winrate': ganados / total * 100
+    }, columns=COLUMNAS_AGENTES)
+
+
+def _escribir_por_bloques(ruta, total, filas_por_bloque, generar, etiqueta):
+    """generar(inicio, n) -> DataFrame; escribe el CSV bloque por bloque"""
+    inicio_t = time.perf_counter()
+    filas = 0
+    with open(ruta, 'w', newline='') as f:
+        for inicio in range(0, total, filas_por_bloque):
+            df = generar(inicio, min(filas_por_bloque, total - inicio))
+            df.to_csv(f, header=(inicio == 0), index=False)
+            filas += len(df)
+    segundos = time.perf_counter() - inicio_t
+    print(f"   ✓ {etiqueta}: {filas:,} filas, {os.path.getsize(ruta) / 1024 / 1024:,.1f} MB en {segundos:.1f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Genera CSV sintéticos con los esquemas que valida load_data()")
+    parser.add_argument('--salida', default=os.path.join(base_dir, 'datos_sinteticos'),
+                        help="Directorio de salida (no sobrescribe los CSV reales de app/)")
+    parser.add_argument('--clientes', type=int, default=1_000_000)
+    parser.add_argument('--meses', type=int, default=12, help="Meses de resultado_churn_por_mes (filas = clientes x meses)")
+    parser.add_argument('--llamadas', type=int, default=2_000_000)
+    parser.add_argument('--agentes', type=int, default=760)
+    parser.add_argument('--fecha-fin', default='2023-06-30', help="Último día del periodo (AAAA-MM-DD)")
+    parser.add_argument('--filas-por-bloque', type=int, default=250_000)
+    parser.add_argument('--semilla', type=int, default=42)
+    args = parser.parse_args()
+
+    print("="*80)
+    print("GENERACIÓN DE DATOS SINTÉTICOS")
+    print("="*80)
+
+    if os.path.abspath(args.salida) == base_dir:
+        print("ERROR: --salida no puede ser app/ (sobrescribiría los CSV reales)")
+        sys.exit(1)
+    os.makedirs(args.salida, exist_ok=True)
+
+    fecha_fin = np.datetime64(args.fecha_fin, 'D')
+    meses = pd.date_range(end=pd.Timestamp(args.fecha_fin), periods=args.meses, freq='MS')
+    fin = int(fecha_fin.astype(int))
+    inicio = int(np.datetime64(meses[0].date(), 'D').astype(int))
+    # Un generador por tabla: cambiar el tamaño de una no altera las demás
+    rng_base, rng_churn, rng_llamadas, rng_agentes = [
+        np.random.default_rng(s) for s in np.random.SeedSequence(args.semilla).spawn(4)
+    ]
+
+    print(f"\n1. BaseDeDatos y churn mensual ({args.clientes:,} clientes x {args.meses} meses)...")
+    ruta_churn = os.path.join(args.salida, CHURN_NOMBRE)
+    filas_churn = 0
+    inicio_t = time.perf_counter()
+    # Se generan juntas para que el último mes de churn coincida con la recencia de la base
+    with open(ruta_churn, 'w', newline='') as f_churn:
+        def generar_base(desde, n):
+            nonlocal filas_churn
+            df_base = bloque_base(rng_base, np.arange(desde + 1, desde + n + 1), fecha_fin)
+            df_churn = bloque_churn(rng_churn, df_base, meses)
+            df_churn.to_csv(f_churn, header=(filas_churn == 0), index=False)
+            filas_churn += len(df_churn)
+            return df_base
+        _escribir_por_bloques(
+            os.path.join(args.salida, BASE_DATOS_NOMBRE), args.clientes,
+            max(1, args.filas_por_bloque // max(args.meses, 1)), generar_base, BASE_DATOS_NOMBRE
+        )
+    print(f"   ✓ {CHURN_NOMBRE}: {filas_churn:,} filas, "
+          f"{os.path.getsize(ruta_churn) / 1024 / 1024:,.1f} MB en {time.perf_counter() - inicio_t:.1f}s")
+
+    print(f"\n2. Llamadas ({args.llamadas:,})...")
+    _escribir_por_bloques(
+        os.path.join(args.salida, CALLS_NOMBRE), args.llamadas, args.filas_por_bloque,
+        lambda _, n: bloque_llamadas(rng_llamadas, n, args.clientes, args.agentes, inicio, fin),
+        CALLS_NOMBRE
+    )
+
+    print(f"\n3. Agentes ({args.agentes:,})...")
+    tabla_agentes(rng_agentes, args.agentes).to_csv(os.path.join(args.salida, AGENTS_NOMBRE), index=False)
+    print(f"   ✓ {AGENTS_NOMBRE}")
+
+    print("\n" + "="*80)
+    print(f"✅ DATOS LISTOS EN {args.salida}")
+    print("="*80)
+
+
+if __name__ == "__main__":
+    main()
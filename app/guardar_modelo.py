@@ -1,16 +1,72 @@
 """
 Script para guardar el modelo de churn entrenado
+
+Uso:
+    cd app
+    python guardar_modelo.py [--modo bosque|histograma] [--max-samples 0.3] [--plegar-escalado]
+    python guardar_modelo.py --incremental [--meses-recientes 1] [--arboles-nuevos 50] [--tamano-fijo 250]
+
+Modos:
+    bosque      RandomForestClassifier (modelo de producción original)
+    histograma  HistGradientBoostingClassifier: agrupa cada feature en a lo más
+                255 bins y entrena en minutos sobre ~700K filas. No usa escalado
+                (los bins solo dependen del orden de los valores).
+
+--max-samples limita las filas de cada bootstrap del bosque (fracción o número
+de filas); en modo histograma se entrena sobre una submuestra estratificada de
+ese tamaño.
+
+--incremental carga el bosque existente (churn_model.pkl + churn_pipeline.pkl) y,
+con warm_start, le agrega árboles entrenados solo con los usuarios cuya última
+transacción cae en los meses más recientes. El mes más reciente (por last_tx) se
+reserva antes de entrenar para evaluar: los árboles nuevos usan los
+--meses-recientes meses anteriores a él. Con --tamano-fijo se descartan los
+árboles más antiguos para mantener el tamaño del ensamble. La ventana de datos de
+cada grupo de árboles queda en churn_model_info.json ('ventanas_arboles') y la de
+evaluación en 'evaluacion_incremental', con fuera_de_muestra=False si algún árbol
+anterior pudo haber visto esas filas.
 """
+import argparse
 import pickle
 import json
 import os
 import sys
+import time
 import pandas as pd
 import numpy as np
 from sklearn.model_selection import train_test_split
-from sklearn.ensemble import RandomForestClassifier
+from sklearn.ensemble import RandomForestClassifier, HistGradientBoostingClassifier
+from sklearn.utils.class_weight import compute_class_weight
 from sklearn.metrics import accuracy_score, precision_score, recall_score, f1_score, roc_auc_score
 
+from features_churn import SELECTED_FEATURES, PipelineFeatures, leer_matriz_entrenamiento
+
+parser = argparse.ArgumentParser(description="Entrena y guarda el modelo de churn para producción")
+parser.add_argument('--modo', choices=['bosque', 'histograma'], default='bosque',
+                    help="Tipo de modelo a entrenar")
+parser.add_argument('--max-samples', type=float, default=None,
+                    help="Filas por bootstrap: fracción (0.3) o número de filas (200000)")
+parser.add_argument('--plegar-escalado', action='store_true',
+                    help="Reescribir los umbrales de los árboles en unidades originales (la inferencia no escala)")
+parser.add_argument('--incremental', action='store_true',
+                    help="Agregar árboles al bosque existente usando solo los meses más recientes")
+parser.add_argument('--meses-recientes', type=int, default=1,
+                    help="Meses (por last_tx) que forman la ventana de datos nuevos, "
+                         "antes del mes más reciente que se reserva para evaluar")
+parser.add_argument('--arboles-nuevos', type=int, default=50,
+                    help="Árboles a agregar en modo incremental")
+parser.add_argument('--tamano-fijo', type=int, default=None,
+                    help="Tamaño máximo del ensamble; se descartan los árboles más antiguos")
+args = parser.parse_args()
+
+max_samples = None
+if args.max_samples is not None:
+    # Entero mayor que 1 (200000, 1e5) = número de filas; si no, fracción en (0, 1] como en sklearn
+    max_samples = int(args.max_samples) if args.max_samples > 1 and args.max_samples.is_integer() else args.max_samples
+# El modo histograma no usa escalado, no hay nada que plegar
+escalar_features = args.modo == 'bosque'
+plegar_escalado = args.plegar_escalado and escalar_features
+
 print("="*80)
 print("GUARDANDO MODELO PARA PRODUCCIÓN")
 print("="*80)
@@ -18,80 +74,179 @@ print("="*80)
 base_dir = os.path.dirname(os.path.abspath(__file__))
 os.chdir(base_dir)
 
-print("\n1. Cargando datos...")
+
+def ventana_datos(fechas):
+    """Rango (YYYY-MM-DD) de last_tx de las filas usadas para entrenar"""
+    fechas = pd.to_datetime(pd.Series(fechas), errors='coerce').dropna()
+    if fechas.empty:
+        return None, None
+    return fechas.min().strftime('%Y-%m-%d'), fechas.max().strftime('%Y-%m-%d')
+
+
+def reentrenar_incremental(args):
+    """Modo --incremental: warm_start sobre el bosque existente con los meses más recientes"""
+    model_path = os.path.join(base_dir, 'churn_model.pkl')
+    pipeline_path = os.path.join(base_dir, 'churn_pipeline.pkl')
+    model_info_path = os.path.join(base_dir, 'churn_model_info.json')
+    for ruta in (model_path, pipeline_path, model_info_path):
+        if not os.path.exists(ruta):
+            print(f"ERROR: No se encontró {ruta}; entrena primero el modelo completo")
+            sys.exit(1)
+
+    print("\n1. Cargando modelo existente...")
+    with open(model_path, 'rb') as f:
+        modelo = pickle.load(f)
+    if not isinstance(modelo, RandomForestClassifier):
+        print(f"ERROR: El modo incremental requiere un RandomForestClassifier (actual: {type(modelo).__name__})")
+        sys.exit(1)
+    # Se reutiliza el pipeline ajustado: los árboles nuevos ven las mismas features
+    pipeline = PipelineFeatures.cargar(pipeline_path)
+    with open(model_info_path) as f:
+        model_info = json.load(f)
+    n_previos = len(modelo.estimators_)
+    ventanas = model_info.get('ventanas_arboles') or [
+        {'arboles': [0, n_previos], 'desde': None, 'hasta': None, 'modo': 'completo'}
+    ]
+    print(f"   ✓ Bosque con {n_previos} árboles")
+
+    print("\n2. Cargando datos recientes...")
+    _, X_raw, y, extras = leer_matriz_entrenamiento(
+        archivo, pipeline.features, columnas_extra=['last_tx']
+    )
+    if 'last_tx' not in extras:
+        print("ERROR: BaseDeDatos.csv no tiene last_tx para definir la ventana de datos")
+        sys.exit(1)
+    last_tx = pd.to_datetime(pd.Series(extras['last_tx']), errors='coerce')
+    # El mes más reciente se reserva para evaluar antes de entrenar: los árboles nuevos no lo ven
+    mes_prueba = last_tx.max().to_period('M')
+    inicio_ventana = (mes_prueba - args.meses_recientes).to_timestamp()
+    en_prueba = (last_tx >= mes_prueba.to_timestamp()).to_numpy()
+    en_ventana = ((last_tx >= inicio_ventana) & (last_tx < mes_prueba.to_timestamp())).to_numpy()
+    X_train = pipeline.escalar(pipeline.imputar(X_raw[en_ventana]))
+    y_train = y[en_ventana]
+    X_test = pipeline.escalar(pipeline.imputar(X_raw[en_prueba]))
+    y_test = y[en_prueba]
+    del X_raw
+    desde, hasta = ventana_datos(last_tx[en_ventana])
+    prueba_desde, prueba_hasta = ventana_datos(last_tx[en_prueba])
+    print(f"   ✓ Entrenamiento {desde} a {hasta}: {len(y_train):,} filas")
+    print(f"   ✓ Evaluación (reservada) {prueba_desde} a {prueba_hasta}: {len(y_test):,} filas")
+    if len(np.unique(y_train)) < 2 or len(np.unique(y_test)) < 2:
+        print("ERROR: La ventana de entrenamiento o la de evaluación no contiene ambas clases")
+        sys.exit(1)
+    # Los árboles anteriores pudieron entrenar con el mes reservado si su ventana llega hasta él
+    hastas = [ventana.get('hasta') for ventana in ventanas]
+    fuera_de_muestra = all(hastas) and max(hastas) < prueba_desde
+
+    print(f"\n3. Agregando {args.arboles_nuevos} árboles (warm_start)...")
+    max_samples = modelo.get_params().get('max_samples')
+    if isinstance(max_samples, int) and max_samples > len(y_train):
+        modelo.set_params(max_samples=None)
+    # 'balanced' no es válido con warm_start: se fijan los pesos explícitos de esta ventana
+    class_weight = modelo.get_params().get('class_weight')
+    if class_weight in ('balanced', 'balanced_subsample'):
+        clases = np.unique(y_train)
+        pesos = compute_class_weight('balanced', classes=clases, y=y_train)
+        modelo.set_params(class_weight=dict(zip(clases.tolist(), pesos.tolist())))
+    modelo.set_params(warm_start=True, n_estimators=n_previos + args.arboles_nuevos)
+    inicio = time.perf_counter()
+    modelo.fit(X_train, y_train)
+    tiempo_entrenamiento = time.perf_counter() - inicio
+    modelo.set_params(warm_start=False, class_weight=class_weight)
+    ventanas.append({
+        'arboles': [n_previos, len(modelo.estimators_)],
+        'desde': desde,
+        'hasta': hasta,
+        'filas': int(len(y_train)),
+        'modo': 'incremental',
+        'entrenado': time.strftime('%Y-%m-%d %H:%M:%S')
+    })
+    print(f"   ✓ {args.arboles_nuevos} árboles entrenados en {tiempo_entrenamiento:.1f}s")
+
+    if args.tamano_fijo and len(modelo.estimators_) > args.tamano_fijo:
+        descartar = len(modelo.estimators_) - args.tamano_fijo
+        print(f"\n3b. Descartando los {descartar} árboles más antiguos...")
+        modelo.estimators_ = modelo.estimators_[descartar:]
+        modelo.n_estimators = len(modelo.estimators_)
+        # Reindexar las ventanas y eliminar las que quedaron vacías
+        recortadas = []
+        for ventana in ventanas:
+            inicio_v = max(ventana['arboles'][0] - descartar, 0)
+            fin_v = ventana['arboles'][1] - descartar
+            if fin_v > inicio_v:
+                recortadas.append({**ventana, 'arboles': [inicio_v, fin_v]})
+        ventanas = recortadas
+        print(f"   ✓ Bosque con {len(modelo.estimators_)} árboles")
+
+    print("\n4. Evaluando en el mes reservado...")
+    y_pred = modelo.predict(X_test)
+    y_pred_proba = modelo.predict_proba(X_test)[:, 1]
+    metricas = {
+        'accuracy': float(accuracy_score(y_test, y_pred)),
+        'precision': float(precision_score(y_test, y_pred)),
+        'recall': float(recall_score(y_test, y_pred)),
+        'f1_score': float(f1_score(y_test, y_pred)),
+        'auc_roc': float(roc_auc_score(y_test, y_pred_proba))
+    }
+    print(f"   AUC-ROC:   {metricas['auc_roc']:.4f}")
+    if not fuera_de_muestra:
+        print("   Advertencia: árboles anteriores pudieron entrenar con estas filas (métrica en muestra)")
+
+    print("\n5. Guardando archivos...")
+    with open(model_path, 'wb') as f:
+        pickle.dump(modelo, f)
+    print(f"   ✓ Modelo guardado: {model_path}")
+
+    model_info['hyperparameters']['n_estimators'] = len(modelo.estimators_)
+    model_info['metrics_incremental'] = metricas
+    model_info['evaluacion_incremental'] = {
+        'desde': prueba_desde,
+        'hasta': prueba_hasta,
+        'filas': int(len(y_test)),
+        'fuera_de_muestra': bool(fuera_de_muestra)
+    }
+    model_info['ventanas_arboles'] = ventanas
+    model_info['tiempo_entrenamiento_incremental_s'] = round(tiempo_entrenamiento, 2)
+    with open(model_info_path, 'w') as f:
+        json.dump(model_info, f, indent=2)
+    print(f"   ✓ Información del modelo guardada: {model_info_path}")
+
+    print("\n" + "="*80)
+    print("✅ MODELO ACTUALIZADO DE FORMA INCREMENTAL")
+    print("="*80)
+
+
 archivo = 'BaseDeDatos.csv'
+if args.incremental:
+    if not os.path.exists(archivo):
+        print(f"ERROR: No se encontró {archivo}")
+        sys.exit(1)
+    reentrenar_incremental(args)
+    sys.exit(0)
+
+print("\n1. Cargando datos...")
 if not os.path.exists(archivo):
     print(f"ERROR: No se encontró {archivo}")
     print("Por favor ejecuta este script desde la carpeta app/")
     sys.exit(1)
 
-df = pd.read_csv(archivo)
-print(f"   ✓ Datos cargados: {df.shape[0]:,} filas x {df.shape[1]} columnas")
+# Solo se leen (por bloques) las columnas del modelo
+pipeline, X_raw, y_final, extras = leer_matriz_entrenamiento(archivo, columnas_extra=['last_tx'])
+desde, hasta = ventana_datos(extras.get('last_tx', []))
+del extras
+categorical_cols = pipeline.categorical_cols_base
+print(f"   ✓ Datos cargados: {X_raw.shape[0]:,} filas x {len(pipeline.columnas_entrada)} columnas del modelo")
 
 print("\n2. Limpiando datos...")
-df_clean = df.copy()
-
-# Eliminar columnas no útiles
-columns_to_drop = ['id_user', 'first_tx', 'last_tx']
-df_clean = df_clean.drop(columns=columns_to_drop, errors='ignore')
-
-# Manejo de cc_csats_mean
-if 'cc_csats_mean' in df_clean.columns:
-    df_clean['has_cc_contact'] = (~df_clean['cc_csats_mean'].isnull()).astype(int)
-    df_clean['cc_csats_mean'] = df_clean['cc_csats_mean'].fillna(0)
-
-# Imputar avg_gap_days
-if 'avg_gap_days' in df_clean.columns:
-    median_value = df_clean['avg_gap_days'].median()
-    df_clean['avg_gap_days'] = df_clean['avg_gap_days'].fillna(median_value)
-
-# Eliminar columnas constantes
-if 'has_transactions' in df_clean.columns:
-    if df_clean['has_transactions'].nunique() == 1:
-        df_clean = df_clean.drop(columns=['has_transactions'])
-
-print(f"   ✓ Datos limpios: {df_clean.shape}")
+# Imputar avg_gap_days con la mediana (se guarda para la inferencia)
+pipeline.ajustar_medianas(X_raw)
+medianas = pipeline.medianas
+print(f"   ✓ Medianas imputadas: {medianas}")
 
 print("\n3. Preparando variables...")
-numeric_cols = df_clean.select_dtypes(include=['int64', 'float64']).columns.tolist()
-categorical_cols = df_clean.select_dtypes(include=['object', 'bool']).columns.tolist()
-
-if 'churn' in numeric_cols:
-    numeric_cols.remove('churn')
-if 'churn' in categorical_cols:
-    categorical_cols.remove('churn')
-
-df_encoded = pd.get_dummies(df_clean, columns=categorical_cols, drop_first=True)
-
-selected_features_clean = [
-    'tenure_months',
-    'tx_count',
-    'tx_per_contact',
-    'amount_sum',
-    'tx_per_month',
-    'avg_gap_days',
-    'cc_days_since_last_no hubo contacto',
-    'usertype_HYBRID',
-    'qualification',
-    'cc_fcr_rate_no hubo contacto',
-    'is_premium_True'
-]
-
-features_final = []
-for feat in selected_features_clean:
-    if feat in df_encoded.columns:
-        features_final.append(feat)
-    else:
-        print(f"   Advertencia: Feature '{feat}' no encontrada, se creará con valor 0")
-        df_encoded[feat] = 0
-        features_final.append(feat)
-X_selected = df_encoded[features_final].copy()
-y_selected = df_clean['churn'].copy()
-
-if y_selected.dtype == 'bool':
-    y_final = y_selected.astype(int)
-else:
-    y_final = y_selected
+features_final = list(SELECTED_FEATURES)
+numeric_cols = [regla[1] for regla in pipeline.reglas if regla[0] == 'numerica']
+X_selected = X_raw
 
 print(f"   ✓ Features preparadas: {len(features_final)} variables")
 print(f"   ✓ Dimensiones X: {X_selected.shape}")
@@ -99,9 +254,13 @@ print(f"   ✓ Dimensiones X: {X_selected.shape}")
 print("\n4. Normalizando datos...")
 from sklearn.preprocessing import StandardScaler
 scaler = StandardScaler()
-X_scaled = scaler.fit_transform(X_selected)
-X_scaled = pd.DataFrame(X_scaled, columns=X_selected.columns, index=X_selected.index)
-print("   ✓ Datos normalizados")
+scaler.fit(X_selected)
+if escalar_features:
+    pipeline.ajustar_escala(scaler.mean_, scaler.scale_)
+# Con --plegar-escalado se conserva una copia sin escalar para verificar la paridad
+X_crudo = X_selected.copy() if plegar_escalado else None
+X_scaled = pipeline.escalar(X_selected)  # In-place, float32
+print("   ✓ Datos normalizados" if escalar_features else "   - Omitido en modo histograma")
 
 print("\n5. Dividiendo datos (80/20)...")
 X_train, X_test, y_train, y_test = train_test_split(
@@ -110,26 +269,58 @@ X_train, X_test, y_train, y_test = train_test_split(
     random_state=42,
     stratify=y_final
 )
+if X_crudo is not None:
+    # Misma partición (mismo random_state y stratify), ahora sobre las features sin escalar
+    _, X_test_crudo = train_test_split(X_crudo, test_size=0.20, random_state=42, stratify=y_final)
+    del X_crudo
 print(f"   ✓ Train: {len(X_train):,} | Test: {len(X_test):,}")
 
-print("\n6. Entrenando modelo Random Forest...")
-rf_final = RandomForestClassifier(
-    n_estimators=250,
-    max_depth=25,
-    min_samples_split=50,
-    min_samples_leaf=25,
-    class_weight='balanced',
-    criterion='gini',
-    random_state=42,
-    n_jobs=-1
-)
+if args.modo == 'bosque':
+    print("\n6. Entrenando modelo Random Forest...")
+    hiperparametros = {
+        'n_estimators': 250,
+        'max_depth': 25,
+        'min_samples_split': 50,
+        'min_samples_leaf': 25,
+        'class_weight': 'balanced',
+        'criterion': 'gini',
+        'max_samples': max_samples,
+        'random_state': 42
+    }
+    modelo = RandomForestClassifier(**hiperparametros, n_jobs=-1)
+    X_fit, y_fit = X_train, y_train
+else:
+    print("\n6. Entrenando modelo por histogramas (HistGradientBoosting)...")
+    hiperparametros = {
+        'max_iter': 300,
+        'learning_rate': 0.1,
+        'max_leaf_nodes': 63,
+        'min_samples_leaf': 25,
+        'max_bins': 255,
+        'l2_regularization': 1.0,
+        'class_weight': 'balanced',
+        'early_stopping': True,
+        'random_state': 42
+    }
+    modelo = HistGradientBoostingClassifier(**hiperparametros)
+    X_fit, y_fit = X_train, y_train
+    if max_samples is not None:
+        n_fit = int(max_samples * len(y_train)) if isinstance(max_samples, float) else max_samples
+        if n_fit < len(y_train):
+            X_fit, _, y_fit, _ = train_test_split(
+                X_train, y_train, train_size=n_fit, random_state=42, stratify=y_train
+            )
+            print(f"   ✓ Submuestra estratificada: {len(y_fit):,} filas")
 
-rf_final.fit(X_train, y_train)
-print("   ✓ Modelo entrenado")
+inicio = time.perf_counter()
+modelo.fit(X_fit, y_fit)
+tiempo_entrenamiento = time.perf_counter() - inicio
+del X_fit, y_fit
+print(f"   ✓ Modelo entrenado en {tiempo_entrenamiento:.1f}s")
 
 print("\n7. Evaluando modelo...")
-y_pred = rf_final.predict(X_test)
-y_pred_proba = rf_final.predict_proba(X_test)[:, 1]
+y_pred = modelo.predict(X_test)
+y_pred_proba = modelo.predict_proba(X_test)[:, 1]
 
 accuracy = accuracy_score(y_test, y_pred)
 precision = precision_score(y_test, y_pred)
@@ -143,10 +334,20 @@ print(f"   Recall:    {recall:.4f}")
 print(f"   F1-Score:  {f1:.4f}")
 print(f"   AUC-ROC:   {auc:.4f}")
 
+if plegar_escalado:
+    print("\n7b. Plegando el escalado en los umbrales de los árboles...")
+    pipeline.plegar_escalado(modelo)
+    y_pred_proba_plegado = modelo.predict_proba(X_test_crudo)[:, 1]
+    diferencia = float(np.abs(y_pred_proba_plegado - y_pred_proba).max())
+    if diferencia > 1e-12:
+        print(f"ERROR: El modelo plegado no reproduce las probabilidades (diferencia máx. {diferencia:.3g})")
+        sys.exit(1)
+    print(f"   ✓ Paridad verificada en test (diferencia máx. {diferencia:.3g})")
+
 print("\n8. Guardando archivos...")
 model_path = os.path.join(base_dir, 'churn_model.pkl')
 with open(model_path, 'wb') as f:
-    pickle.dump(rf_final, f)
+    pickle.dump(modelo, f)
 print(f"   ✓ Modelo guardado: {model_path}")
 
 scaler_path = os.path.join(base_dir, 'churn_scaler.pkl')
@@ -154,6 +355,10 @@ with open(scaler_path, 'wb') as f:
     pickle.dump(scaler, f)
 print(f"   ✓ Scaler guardado: {scaler_path}")
 
+pipeline_path = os.path.join(base_dir, 'churn_pipeline.pkl')
+pipeline.guardar(pipeline_path)
+print(f"   ✓ Pipeline de features guardado: {pipeline_path}")
+
 features_path = os.path.join(base_dir, 'churn_features.json')
 numeric_features = [f for f in features_final if f in numeric_cols]
 categorical_features = [f for f in features_final if f not in numeric_cols]
@@ -162,7 +367,10 @@ features_info = {
     'features': features_final,
     'numeric_features': numeric_features,
     'categorical_features': categorical_features,
-    'categorical_cols_base': categorical_cols
+    'categorical_cols_base': categorical_cols,
+    'medianas': medianas,
+    'escalado_plegado': plegar_escalado,
+    'escalar_features': escalar_features and not plegar_escalado
 }
 with open(features_path, 'w') as f:
     json.dump(features_info, f, indent=2)
@@ -170,16 +378,8 @@ print(f"   ✓ Features guardadas: {features_path}")
 
 model_info_path = os.path.join(base_dir, 'churn_model_info.json')
 model_info = {
-    'model_type': 'RandomForestClassifier',
-    'hyperparameters': {
-        'n_estimators': 250,
-        'max_depth': 25,
-        'min_samples_split': 50,
-        'min_samples_leaf': 25,
-        'class_weight': 'balanced',
-        'criterion': 'gini',
-        'random_state': 42
-    },
+    'model_type': type(modelo).__name__,
+    'hyperparameters': hiperparametros,
     'metrics': {
         'accuracy': float(accuracy),
         'precision': float(precision),
@@ -189,8 +389,19 @@ model_info = {
     },
     'train_size': len(X_train),
     'test_size': len(X_test),
-    'n_features': len(features_final)
+    'n_features': len(features_final),
+    'escalado_plegado': plegar_escalado,
+    'tiempo_entrenamiento_s': round(tiempo_entrenamiento, 2)
 }
+if args.modo == 'bosque':
+    model_info['ventanas_arboles'] = [{
+        'arboles': [0, len(modelo.estimators_)],
+        'desde': desde,
+        'hasta': hasta,
+        'filas': int(len(X_train)),
+        'modo': 'completo',
+        'entrenado': time.strftime('%Y-%m-%d %H:%M:%S')
+    }]
 with open(model_info_path, 'w') as f:
     json.dump(model_info, f, indent=2)
 print(f"   ✓ Información del modelo guardada: {model_info_path}")
@@ -201,7 +412,8 @@ print("="*80)
 print("\nArchivos generados:")
 print(f"  1. {model_path}")
 print(f"  2. {scaler_path}")
-print(f"  3. {features_path}")
-print(f"  4. {model_info_path}")
+print(f"  3. {pipeline_path}")
+print(f"  4. {features_path}")
+print(f"  5. {model_info_path}")
 print("\n¡Ahora puedes ejecutar tu app de Streamlit!")
 
@@ -0,0 +1,270 @@
+"""
+Ingesta por bloques (streaming) de los CSV de origen.
+
+pd.read_csv(..., low_memory=False) carga cada archivo completo en memoria. Este
+módulo lee los archivos en bloques, conserva solo las columnas proyectadas con
+tipos compactos (float32, int32 y category para las columnas categóricas del
+modelo) y calcula de forma incremental los
+agregados mensuales y el último mes que necesita derivar_tablas(). El archivo
+crudo nunca está completo en memoria.
+
+memoria_max_mb acota cada bloque de lectura, no el pico del proceso: las tablas
+que se publican (llamadas, BaseDeDatos y el detalle de churn para churn_raw) se
+conservan completas, ya proyectadas y con tipos compactos, y crecen con la
+entrada. Lo que tiene que caber en memoria es esa proyección, no el CSV crudo.
+"""
+import json
+import os
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+from features_churn import reglas_features
+from procesamiento_datos import (
+    REQUIRED_CHURN_COLS, _avisar_consola, validar_agentes
+)
+
+MEMORIA_MAX_MB_DEFECTO = 256
+
+# Factor de holgura: el parser de pandas usa varias veces el tamaño final del bloque
+FACTOR_PARSER = 4
+
+COLUMNAS_LLAMADAS = ['fecha_rep', 'Motivo', 'id_user', 'id_agente']
+COLUMNAS_CHURN = REQUIRED_CHURN_COLS + ['tx_count']
+
+# Montos: se mantienen en float64 para no perder precisión en las sumas
+COLUMNAS_MONTO = {'monto_total', 'amount_sum'}
+
+# Columnas de BaseDeDatos que usa el dashboard (además de las del modelo)
+COLUMNAS_BASE_DASHBOARD = [
+    'id_user', 'recency_days', 'amount_sum', 'tx_count', 'tenure_months',
+    'gender', 'state', 'first_tx', 'last_tx'
+]
+
+
+def columnas_modelo(features_path):
+    """
+    Columnas de BaseDeDatos que necesita el modelo según churn_features.json.
+
+    Returns:
+        tuple: (numericas, categoricas), con las mismas reglas que features_churn.py
+    """
+    if not os.path.exists(features_path):
+        return [], []
+    with open(features_path) as f:
+        info = json.load(f)
+    reglas = reglas_features(info.get('features', []), info.get('categorical_cols_base', []))
+    numericas = [regla[1] for regla in reglas if regla[0] == 'numerica']
+    categoricas = list(dict.fromkeys(regla[1] for regla in reglas if regla[0] == 'dummy'))
+    return numericas, categoricas
+
+
+def _columnas_presentes(ruta, deseadas):
+    encabezado = pd.read_csv(ruta, nrows=0).columns
+    return [c for c in dict.fromkeys(deseadas) if c in encabezado], list(encabezado)
+
+
+def filas_por_bloque(ruta, columnas, memoria_max_mb=MEMORIA_MAX_MB_DEFECTO, muestra=2000):
+    """Estima cuántas filas caben en un bloque respetando memoria_max_mb"""
+    df_muestra = pd.read_csv(ruta, usecols=columnas, nrows=muestra, low_memory=False)
+    if df_muestra.empty:
+        return muestra
+    bytes_por_fila = df_muestra.memory_usage(deep=True).sum() / len(df_muestra)
+    filas = int(memoria_max_mb * 1024 * 1024 / (max(bytes_por_fila, 1.0) * FACTOR_PARSER))
+    return max(1000, filas)
+
+
+def _compactar(df, categoricas=(), fechas=()):
+    """Convierte un bloque a tipos compactos"""
+    for col in df.columns:
+        if col in fechas:
+            df[col] = pd.to_datetime(df[col], errors='coerce')
+        elif col in categoricas:
+            # Cada bloque infiere su propio tipo (float, bool, texto); se pasa a texto
+            # (NaN se conserva) para que union_categoricals reciba categorías del mismo tipo.
+            # Las etiquetas coinciden con las que compara _columna_dummy (astype(str))
+            df[col] = df[col].astype(str).where(df[col].notna()).astype('category')
+        elif df[col].dtype == np.float64 and col not in COLUMNAS_MONTO:
+            df[col] = df[col].astype(np.float32)
+        elif df[col].dtype == np.int64:
+            if df[col].min() >= np.iinfo(np.int32).min and df[col].max() <= np.iinfo(np.int32).max:
+                df[col] = df[col].astype(np.int32)
+    return df
+
+
+def _concatenar(bloques):
+    """Concatena bloques unificando las categorías de columnas category"""
+    if not bloques:
+        return pd.DataFrame()
+    if len(bloques) == 1:
+        return bloques[0].reset_index(drop=True)
+    columnas = {}
+    for col in bloques[0].columns:
+        if isinstance(bloques[0][col].dtype, pd.CategoricalDtype):
+            columnas[col] = pd.Categorical(union_categoricals(
+                [b[col] for b in bloques], ignore_order=True
+            ))
+        else:
+            columnas[col] = np.concatenate([b[col].to_numpy() for b in bloques])
+    return pd.DataFrame(columnas)
+
+
+def leer_tabla_streaming(ruta, columnas, memoria_max_mb=MEMORIA_MAX_MB_DEFECTO,
+                         categoricas=(), fechas=()):
+    """Lee un CSV por bloques conservando solo `columnas` con tipos compactos"""
+    presentes, _ = _columnas_presentes(ruta, columnas)
+    chunksize = filas_por_bloque(ruta, presentes, memoria_max_mb)
+    bloques = [
+        _compactar(bloque, categoricas, fechas)
+        for bloque in pd.read_csv(ruta, usecols=presentes, chunksize=chunksize, low_memory=False)
+    ]
+    return _concatenar(bloques)
+
+
+class AgregadorMensual:
+    """
+    Acumula por mes los agregados que usa construir_historial():
+    suma de churn, registros, monto total, transacciones y usuarios únicos.
+    """
+
+    def __init__(self, tx_por_usuario=None):
+        self.tx_por_usuario = tx_por_usuario
+        self.parciales = []
+        self.usuarios = {}
+
+    def agregar(self, bloque):
+        if 'tx_count' in bloque.columns:
+            tx = bloque['tx_count'].fillna(0)
+        elif self.tx_por_usuario is not None:
+            tx = bloque['id_user'].map(self.tx_por_usuario).fillna(0)
+        else:
+            tx = pd.Series(1, index=bloque.index)
+
+        agrupado = pd.DataFrame({
+            'mes': bloque['mes'],
+            'churn': bloque['churn'].astype(np.int64),
+            'monto_total': bloque['monto_total'].astype(np.float64),
+            'transacciones': tx.astype(np.float64)
+        }).groupby('mes')
+        self.parciales.append(pd.DataFrame({
+            'churn_sum': agrupado['churn'].sum(),
+            'registros': agrupado['churn'].size(),
+            'monto_total': agrupado['monto_total'].sum(),
+            'transacciones': agrupado['transacciones'].sum()
+        }))
+
+        for mes, ids in bloque.groupby('mes')['id_user']:
+            previos = self.usuarios.get(mes)
+            nuevos = np.unique(ids.to_numpy())
+            self.usuarios[mes] = nuevos if previos is None else np.union1d(previos, nuevos)
+
+    def resultado(self):
+        if not self.parciales:
+            return pd.DataFrame(columns=['mes', 'churn_sum', 'registros', 'monto_total', 'transacciones', 'usuarios'])
+        agregados = pd.concat(self.parciales).groupby(level=0).sum()
+        agregados['usuarios'] = [len(self.usuarios[mes]) for mes in agregados.index]
+        agregados.index.name = 'mes'
+        return agregados.reset_index()
+
+
+def leer_churn_streaming(ruta, memoria_max_mb=MEMORIA_MAX_MB_DEFECTO, tx_por_usuario=None,
+                         conservar_detalle=False, avisar=_avisar_consola):
+    """
+    Lee resultado_churn_por_mes.csv por bloques.
+
+    Returns:
+        tuple: (agregados, df_ultimo_mes, df_churn) donde df_churn es la proyección
+        compacta de las columnas requeridas (None si conservar_detalle=False).
+    """
+    presentes, encabezado = _columnas_presentes(ruta, COLUMNAS_CHURN)
+    missing_cols = [col for col in REQUIRED_CHURN_COLS if col not in encabezado]
+    if missing_cols:
+        raise ValueError(f"El archivo de churn no contiene las columnas: {missing_cols}")
+
+    chunksize = filas_por_bloque(ruta, presentes, memoria_max_mb)
+    agregador = AgregadorMensual(tx_por_usuario)
+    ultimo_mes = None
+    bloques_ultimo_mes = []
+    bloques_detalle = []
+    total = 0
+
+    for bloque in pd.read_csv(ruta, usecols=presentes, chunksize=chunksize, low_memory=False):
+        bloque = _compactar(bloque, fechas=('mes',))
+        # Con nulos la columna llega como object y astype(bool) convertiría NaN en True:
+        # solo True/1 cuentan como churn, como en la suma de agregar_historial_mensual
+        bloque['churn'] = bloque['churn'].eq(True)
+        total += len(bloque)
+        agregador.agregar(bloque)
+
+        # Solo se conservan las filas del mes más reciente visto hasta ahora
+        mes_bloque = bloque['mes'].max()
+        if ultimo_mes is None or mes_bloque > ultimo_mes:
+            ultimo_mes = mes_bloque
+            bloques_ultimo_mes = []
+        bloques_ultimo_mes.append(bloque[bloque['mes'] == ultimo_mes])
+
+        if conservar_detalle:
+            bloques_detalle.append(bloque)
+
+    if total == 0:
+        raise ValueError(f"El archivo {ruta} está vacío o solo tiene headers")
+    if total < 10:
+        avisar('warning', f"El archivo {ruta} tiene muy pocos registros ({total})")
+
+    df_ultimo_mes = _concatenar(bloques_ultimo_mes)
+    df_churn = _concatenar(bloques_detalle) if conservar_detalle else None
+    return agregador.resultado(), df_ultimo_mes, df_churn
+
+
+def leer_fuentes_streaming(calls_file, agents_file, churn_file, base_datos_file,
+                           features_path=None, memoria_max_mb=MEMORIA_MAX_MB_DEFECTO,
+                           avisar=_avisar_consola):
+    """
+    Equivalente en streaming de procesamiento_datos.leer_fuentes().
+
+    memoria_max_mb es el tamaño de cada bloque leído; las tablas retornadas se
+    conservan completas (proyectadas y compactas), así que el pico de memoria
+    crece con el tamaño de la entrada.
+
+    Returns:
+        tuple: (df_calls, df_agents, df_churn, df_base, agregados, df_ultimo_mes),
+        listo para derivar_tablas(..., agregados=agregados, df_ultimo_mes=df_ultimo_mes).
+    """
+    # Llamadas: solo las columnas que usa el dashboard
+    presentes, encabezado = _columnas_presentes(calls_file, COLUMNAS_LLAMADAS)
+    if 'Motivo' not in encabezado:
+        raise ValueError("El archivo de llamadas no contiene la columna 'Motivo'")
+    df_calls = leer_tabla_streaming(calls_file, presentes, memoria_max_mb, fechas=('fecha_rep',))
+    if df_calls.empty:
+        raise ValueError(f"El archivo {calls_file} está vacío o solo tiene headers")
+    if len(df_calls) < 10:
+        avisar('warning', f"El archivo {calls_file} tiene muy pocos registros ({len(df_calls)})")
+
+    # Agentes: archivo pequeño, se lee completo
+    df_agents = pd.read_csv(agents_file, low_memory=False)
+    validar_agentes(df_agents, agents_file, avisar)
+
+    # BaseDeDatos: columnas del dashboard + columnas de entrada del modelo
+    df_base = None
+    if os.path.exists(base_datos_file):
+        try:
+            numericas, categoricas = columnas_modelo(features_path or '')
+            df_base = leer_tabla_streaming(
+                base_datos_file, COLUMNAS_BASE_DASHBOARD + numericas + categoricas, memoria_max_mb,
+                categoricas=categoricas, fechas=('first_tx', 'last_tx')
+            )
+        except Exception as e:
+            avisar('warning', f"No se pudo leer {base_datos_file} ({type(e).__name__}: {e}); "
+                              "el scoring con el modelo queda desactivado")
+            df_base = None
+
+    tx_por_usuario = None
+    if df_base is not None and 'tx_count' in df_base.columns:
+        tx_por_usuario = df_base.drop_duplicates(subset='id_user').set_index('id_user')['tx_count']
+
+    agregados, df_ultimo_mes, df_churn = leer_churn_streaming(
+        churn_file, memoria_max_mb, tx_por_usuario, conservar_detalle=True, avisar=avisar
+    )
+
+    return df_calls, df_agents, df_churn, df_base, agregados, df_ultimo_mes
@@ -0,0 +1,196 @@
+"""
+Medición de tiempos por sección de cada rerun del dashboard.
+
+Cada rerun (una ejecución de app.py) se registra en un buffer circular de los
+últimos MAX_RERUNS del proceso, con la duración y el número de filas de sus
+secciones:
+
+    instrumentacion.iniciar_rerun(pagina)
+    with instrumentacion.span('carga_datos') as s:
+        data = load_data()
+        s.filas = len(data['clients'])
+    instrumentacion.seccion('clientes.matriz')   # cierra la sección anterior
+    ...
+    instrumentacion.finalizar_rerun()
+
+span() es un context manager para bloques cortos; seccion() marca secciones
+consecutivas de funciones largas sin re-indentarlas (cada una termina donde
+empieza la siguiente o al finalizar el rerun).
+
+El registro es por hilo (Streamlit ejecuta cada sesión en su propio hilo). Si
+el hilo no inició un rerun, span() retorna un objeto nulo compartido y seccion()
+no hace nada: sin perfil activo el costo es una búsqueda de atributo.
+"""
+import threading
+import time
+from collections import deque
+
+MAX_RERUNS = 50
+
+_local = threading.local()
+_reruns = deque(maxlen=MAX_RERUNS)
+_lock = threading.Lock()
+
+
+class _SpanNulo:
+    """Span sin efecto cuando el perfil está desactivado"""
+    __slots__ = ()
+    filas = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def __setattr__(self, nombre, valor):
+        pass
+
+
+_NULO = _SpanNulo()
+
+
+class Span:
+    __slots__ = ('nombre', 'filas', 'inicio', 'duracion', '_rerun')
+
+    def __init__(self, nombre, filas, rerun):
+        self.nombre = nombre
+        self.filas = filas
+        self.inicio = None
+        self.duracion = None
+        self._rerun = rerun
+
+    def __enter__(self):
+        self.inicio = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.cerrar()
+        return False
+
+    def cerrar(self):
+        if self.duracion is None:
+            self.duracion = time.perf_counter() - self.inicio
+            self._rerun.spans.append(self)
+
+
+class Rerun:
+    __slots__ = ('pagina', 'inicio', 'fin', 'spans', 'seccion_abierta')
+
+    def __init__(self, pagina):
+        self.pagina = pagina
+        self.inicio = time.perf_counter()
+        self.fin = None
+        self.spans = []
+        self.seccion_abierta = None
+
+    @property
+    def duracion(self):
+        return (self.fin or time.perf_counter()) - self.inicio
+
+    def como_dict(self):
+        return {
+            'pagina': self.pagina,
+            'duracion_s': self.duracion,
+            'spans': [{'nombre': s.nombre, 'duracion_s': s.duracion, 'filas': s.filas} for s in self.spans]
+        }
+
+
+def _rerun_actual():
+    return getattr(_local, 'rerun', None)
+
+
+def activo():
+    """True si el hilo actual está midiendo un rerun"""
+    return _rerun_actual() is not None
+
+
+def iniciar_rerun(pagina=None):
+    """Empieza a medir el rerun del hilo actual (descarta uno previo sin finalizar, p.ej. tras st.rerun)"""
+    _local.rerun = Rerun(pagina)
+
+
+def asignar_pagina(pagina):
+    rerun = _rerun_actual()
+    if rerun is not None:
+        rerun.pagina = pagina
+
+
+def finalizar_rerun():
+    """Cierra el rerun del hilo actual y lo guarda en el buffer. Returns: Rerun o None"""
+    rerun = _rerun_actual()
+    if rerun is None:
+        return None
+    if rerun.seccion_abierta is not None:
+        rerun.seccion_abierta.cerrar()
+        rerun.seccion_abierta = None
+    rerun.fin = time.perf_counter()
+    _local.rerun = None
+    with _lock:
+        _reruns.append(rerun)
+    return rerun
+
+
+def span(nombre, filas=None):
+    """Context manager que mide un bloque; el objeto retornado acepta .filas = n"""
+    rerun = _rerun_actual()
+    if rerun is None:
+        return _NULO
+    return Span(nombre, filas, rerun)
+
+
+def seccion(nombre, filas=None):
+    """Cierra la sección abierta (si hay) y abre `nombre`. Returns: el span abierto (o el nulo)"""
+    rerun = _rerun_actual()
+    if rerun is None:
+        return _NULO
+    if rerun.seccion_abierta is not None:
+        rerun.seccion_abierta.cerrar()
+    s = Span(nombre, filas, rerun)
+    s.inicio = time.perf_counter()
+    rerun.seccion_abierta = s
+    return s
+
+
+def anotar_filas(filas):
+    """Registra el número de filas de la sección abierta"""
+    rerun = _rerun_actual()
+    if rerun is not None and rerun.seccion_abierta is not None:
+        rerun.seccion_abierta.filas = filas
+
+
+def reruns_recientes(n=None):
+    """Últimos n reruns finalizados (todos si n es None), del más antiguo al más reciente"""
+    with _lock:
+        reruns = list(_reruns)
+    return reruns if n is None else reruns[-n:]
+
+
+def secciones_lentas(n_reruns=20, top=15):
+    """
+    Agrega las secciones de los últimos n_reruns.
+
+    Returns:
+        lista de dicts (pagina, seccion, llamadas, total_s, media_s, max_s,
+        filas) ordenada por max_s descendente
+    """
+    agregados = {}
+    for rerun in reruns_recientes(n_reruns):
+        for s in rerun.spans:
+            clave = (rerun.pagina, s.nombre)
+            a = agregados.setdefault(clave, {'pagina': rerun.pagina, 'seccion': s.nombre, 'llamadas': 0,
+                                             'total_s': 0.0, 'max_s': 0.0, 'filas': None})
+            a['llamadas'] += 1
+            a['total_s'] += s.duracion
+            a['max_s'] = max(a['max_s'], s.duracion)
+            if s.filas is not None:
+                a['filas'] = s.filas
+    filas = sorted(agregados.values(), key=lambda a: a['max_s'], reverse=True)[:top]
+    for a in filas:
+        a['media_s'] = a['total_s'] / a['llamadas']
+    return filas
+
+
+def limpiar():
+    with _lock:
+        _reruns.clear()
@@ -0,0 +1,104 @@
+"""
+Contabilidad de memoria y desalojo LRU de los cachés por sesión.
+
+El dataset (load_data) es uno solo por proceso y las sesiones solo guardan una
+referencia; lo que sí es propio de cada sesión son sus cachés de resultados
+(clients_cache, dashboard_cache). Cada rerun los "toca":
+
+    memoria_sesiones.tocar(id_sesion, 'clients_cache', st.session_state.clients_cache)
+
+lo que mide sus bytes (metricas.bytes_objeto) y los pone al final del orden LRU.
+Si la suma de todos los cachés del proceso supera PRESUPUESTO_BYTES, se vacían
+los menos usados recientemente (de cualquier sesión): sus valores vuelven a
+None, así el dueño simplemente recalcula en su próximo rerun.
+
+Los cachés se registran por weakref: al cerrarse una sesión y liberarse su
+session_state, su entrada desaparece sola.
+"""
+import threading
+import weakref
+from collections import OrderedDict
+
+import metricas
+
+PRESUPUESTO_BYTES = 512 * 1024 * 1024
+
+_entradas = OrderedDict()  # (id_sesion, nombre) -> {'ref': weakref, 'bytes': int}
+_lock = threading.Lock()
+
+
+class CacheSesion(dict):
+    """dict de session_state que el registro puede vaciar desde otra sesión"""
+
+    def vaciar(self):
+        for clave in self:
+            self[clave] = None
+
+
+def configurar(presupuesto_bytes):
+    global PRESUPUESTO_BYTES
+    PRESUPUESTO_BYTES = int(presupuesto_bytes)
+
+
+def _purgar_muertas():
+    for clave in [c for c, e in _entradas.items() if e['ref']() is None]:
+        del _entradas[clave]
+
+
+def tocar(id_sesion, nombre, cache):
+    """
+    Registra el uso del caché `nombre` de la sesión y desaloja otros si hace falta.
+
+    Returns:
+        lista de (id_sesion, nombre) desalojados
+    """
+    tamano = metricas.bytes_objeto(cache)
+    clave = (id_sesion, nombre)
+    desalojados = []
+    with _lock:
+        _purgar_muertas()
+        _entradas[clave] = {'ref': weakref.ref(cache), 'bytes': tamano}
+        _entradas.move_to_end(clave)
+        total = sum(e['bytes'] for e in _entradas.values())
+        # Nunca se desaloja el caché recién tocado: se recalcularía en el siguiente rerun
+        for otra in list(_entradas):
+            if total <= PRESUPUESTO_BYTES or otra == clave:
+                break
+            entrada = _entradas[otra]
+            if entrada['bytes'] == 0:
+                continue
+            victima = entrada['ref']()
+            if victima is not None:
+                victima.vaciar()
+            total -= entrada['bytes']
+            entrada['bytes'] = 0
+            desalojados.append(otra)
+    for _, nombre_desalojado in desalojados:
+        metricas.incrementar('danu_cache_sesion_desalojos_total', cache=nombre_desalojado)
+    return desalojados
+
+
+def olvidar_sesion(id_sesion):
+    with _lock:
+        for clave in [c for c in _entradas if c[0] == id_sesion]:
+            del _entradas[clave]
+
+
+def bytes_sesion(id_sesion):
+    """{nombre del caché: bytes} de una sesión"""
+    with _lock:
+        return {c[1]: e['bytes'] for c, e in _entradas.items() if c[0] == id_sesion}
+
+
+def bytes_por_cache():
+    """{nombre del caché: bytes sumados de todas las sesiones vivas}"""
+    totales = {}
+    with _lock:
+        _purgar_muertas()
+        for (_, nombre), e in _entradas.items():
+            totales[nombre] = totales.get(nombre, 0) + e['bytes']
+    return totales
+
+
+def total_bytes():
+    return sum(bytes_por_cache().values())
@@ -0,0 +1,306 @@
+"""
+Métricas del dashboard en formato texto de Prometheus.
+
+Cada proceso de Streamlit acumula en memoria contadores, histogramas y el
+tamaño de los cachés de session_state de sus sesiones:
+
+    danu_load_data_segundos{cache="hit|miss"}      duración de load_data()
+    danu_load_data_cache_total{resultado="..."}    aciertos / fallos del caché
+    danu_filas_evaluadas_total{origen="..."}       filas que pasaron por el modelo
+    danu_scoring_segundos{origen="..."}            latencia de cada predict_proba
+    danu_rerun_segundos{pagina="..."}              latencia de cada rerun
+    danu_sesiones_activas                          sesiones vistas en SESION_INACTIVA_S
+    danu_session_state_bytes{cache="..."}          bytes de los cachés por sesión (memoria_sesiones.py)
+    danu_cache_sesion_desalojos_total{cache="..."} cachés de sesión vaciados por el presupuesto
+    danu_dataset_compartido_bytes                  bytes del dataset compartido por las sesiones
+    danu_cache_sesion_presupuesto_bytes            presupuesto global de esos cachés
+
+Exportación (opcional, una vez por proceso con iniciar_exportacion):
+  - endpoint HTTP local: GET /metrics en DANU_METRICAS_PUERTO
+  - archivo reescrito cada DANU_METRICAS_INTERVALO_S segundos en
+    DANU_METRICAS_ARCHIVO (para el textfile collector de node_exporter); "{pid}"
+    en la ruta se reemplaza por el proceso y las series llevan proceso="<pid>",
+    así varios procesos pueden escribir en la misma carpeta.
+"""
+import os
+import threading
+import time
+from collections.abc import Mapping
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import pandas as pd
+
+# Límites de los buckets de latencia (segundos)
+BUCKETS_LATENCIA = [0.0005, 0.001, 0.002, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0]
+BUCKETS_RERUN = [0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0]
+SESION_INACTIVA_S = 30 * 60
+INTERVALO_ARCHIVO_S = 15
+
+DESCRIPCIONES = {
+    'danu_load_data_segundos': ('histogram', "Duración de load_data (cache=hit si respondió el caché de Streamlit)"),
+    'danu_load_data_cache_total': ('counter', "Llamadas a load_data por resultado del caché"),
+    'danu_filas_evaluadas_total': ('counter', "Filas evaluadas por el modelo de churn"),
+    'danu_scoring_segundos': ('histogram', "Latencia de cada llamada a predict_proba"),
+    'danu_rerun_segundos': ('histogram', "Latencia de cada rerun del dashboard por página"),
+    'danu_sesiones_activas': ('gauge', "Sesiones con actividad en los últimos SESION_INACTIVA_S segundos"),
+    'danu_session_state_bytes': ('gauge', "Bytes retenidos por los cachés de session_state (suma de sesiones vivas)"),
+    'danu_cache_sesion_desalojos_total': ('counter', "Cachés de sesión vaciados al superar el presupuesto global"),
+    'danu_cache_sesion_presupuesto_bytes': ('gauge', "Presupuesto global de los cachés de sesión"),
+    'danu_dataset_compartido_bytes': ('gauge', "Bytes del dataset compartido entre sesiones (una copia por proceso)"),
+}
+
+
+def _llaves(etiquetas):
+    return f'{{{etiquetas}}}' if etiquetas else ''
+
+
+class Histograma:
+    """Histograma acumulado de latencias con salida en formato Prometheus"""
+
+    def __init__(self, buckets=BUCKETS_LATENCIA):
+        self.buckets = list(buckets)
+        self.conteos = [0] * (len(self.buckets) + 1)
+        self.suma = 0.0
+        self.total = 0
+
+    def observar(self, segundos):
+        i = 0
+        while i < len(self.buckets) and segundos > self.buckets[i]:
+            i += 1
+        self.conteos[i] += 1
+        self.suma += segundos
+        self.total += 1
+
+    def percentil(self, q):
+        """Cota superior del bucket que contiene el percentil q (0-100)"""
+        if self.total == 0:
+            return None
+        objetivo = self.total * q / 100
+        acumulado = 0
+        for limite, conteo in zip(self.buckets + [float('inf')], self.conteos):
+            acumulado += conteo
+            if acumulado >= objetivo:
+                return limite
+        return float('inf')
+
+    def prometheus(self, nombre, etiquetas=''):
+        lineas = []
+        acumulado = 0
+        sep = ',' if etiquetas else ''
+        for limite, conteo in zip(self.buckets, self.conteos):
+            acumulado += conteo
+            lineas.append(f'{nombre}_bucket{{{etiquetas}{sep}le="{limite}"}} {acumulado}')
+        lineas.append(f'{nombre}_bucket{{{etiquetas}{sep}le="+Inf"}} {self.total}')
+        lineas.append(f'{nombre}_sum{_llaves(etiquetas)} {self.suma}')
+        lineas.append(f'{nombre}_count{_llaves(etiquetas)} {self.total}')
+        return lineas
+
+
+# Estado del proceso: {(nombre, etiquetas): valor | Histograma}
+_contadores = {}
+_histogramas = {}
+_gauges = {}
+_sesiones = {}  # id de sesión -> epoch de su último rerun
+_lock = threading.Lock()
+_local = threading.local()
+_exportacion = {'servidor': None, 'archivo': None}
+
+
+def _clave(nombre, etiquetas):
+    return nombre, tuple(sorted(etiquetas.items()))
+
+
+def _formatear_etiquetas(pares):
+    def escapar(v):
+        return str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    return ','.join(f'{k}="{escapar(v)}"' for k, v in pares)
+
+
+def incrementar(nombre, valor=1, **etiquetas):
+    with _lock:
+        clave = _clave(nombre, etiquetas)
+        _contadores[clave] = _contadores.get(clave, 0) + valor
+
+
+def fijar(nombre, valor, **etiquetas):
+    with _lock:
+        _gauges[_clave(nombre, etiquetas)] = valor
+
+
+def observar(nombre, segundos, buckets=BUCKETS_LATENCIA, **etiquetas):
+    with _lock:
+        clave = _clave(nombre, etiquetas)
+        if clave not in _histogramas:
+            _histogramas[clave] = Histograma(buckets)
+        _histogramas[clave].observar(segundos)
+
+
+def registrar_scoring(origen, filas, segundos):
+    incrementar('danu_filas_evaluadas_total', filas, origen=origen)
+    observar('danu_scoring_segundos', segundos, origen=origen)
+
+
+# ---------- load_data: acierto / fallo del caché ----------
+
+def marcar_ejecucion_carga():
+    """Se llama dentro del cuerpo de la función cacheada: si corre, fue un fallo del caché"""
+    _local.carga_ejecutada = True
+
+
+@contextmanager
+def medir_carga():
+    """Envuelve la llamada a la función cacheada y registra duración y hit/miss"""
+    _local.carga_ejecutada = False
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        resultado = 'miss' if _local.carga_ejecutada else 'hit'
+        incrementar('danu_load_data_cache_total', resultado=resultado)
+        observar('danu_load_data_segundos', time.perf_counter() - inicio, BUCKETS_RERUN, cache=resultado)
+
+
+# ---------- Sesiones y memoria de session_state ----------
+
+def bytes_objeto(obj):
+    """
+    Bytes aproximados de DataFrames/Series/arrays (y mappings/listas de ellos).
+
+    Usa memory_usage(deep=False): O(columnas), sin recorrer strings; las
+    columnas object cuentan solo sus punteros.
+    """
+    if obj is None:
+        return 0
+    if isinstance(obj, pd.DataFrame):
+        return int(obj.memory_usage(index=True, deep=False).sum())
+    if isinstance(obj, pd.Series):
+        return int(obj.memory_usage(index=True, deep=False))
+    if isinstance(obj, pd.Index):
+        return int(obj.memory_usage(deep=False))
+    if isinstance(obj, np.ndarray):
+        return obj.nbytes
+    if isinstance(obj, Mapping):
+        return sum(bytes_objeto(v) for v in obj.values())
+    if isinstance(obj, (list, tuple)):
+        return sum(bytes_objeto(v) for v in obj)
+    return 0
+
+
+def registrar_sesion(id_sesion):
+    """Marca la sesión como activa"""
+    with _lock:
+        _sesiones[id_sesion] = time.time()
+
+
+def olvidar_sesion(id_sesion):
+    with _lock:
+        _sesiones.pop(id_sesion, None)
+
+
+def sesiones_activas():
+    """{id de sesión: epoch del último rerun} de las vistas en SESION_INACTIVA_S (purga el resto)"""
+    limite = time.time() - SESION_INACTIVA_S
+    with _lock:
+        for id_sesion in [s for s, visto in _sesiones.items() if visto < limite]:
+            del _sesiones[id_sesion]
+        return dict(_sesiones)
+
+
+# ---------- Formato de texto ----------
+
+def texto(etiquetas_fijas=None):
+    """Todas las métricas del proceso en formato de exposición de Prometheus"""
+    fijas = tuple(sorted((etiquetas_fijas or {}).items()))
+    sesiones = sesiones_activas()
+
+    with _lock:
+        contadores = dict(_contadores)
+        gauges = dict(_gauges)
+        lineas_hist = {clave: h.prometheus(clave[0], _formatear_etiquetas(fijas + clave[1]))
+                       for clave, h in _histogramas.items()}
+
+    series = {}
+    for (nombre, etiquetas), valor in sorted(contadores.items()):
+        series.setdefault(nombre, []).append(f'{nombre}{_llaves(_formatear_etiquetas(fijas + etiquetas))} {valor}')
+    for (nombre, etiquetas), valor in sorted(gauges.items()):
+        series.setdefault(nombre, []).append(f'{nombre}{_llaves(_formatear_etiquetas(fijas + etiquetas))} {valor}')
+    for (nombre, _), lineas in sorted(lineas_hist.items()):
+        series.setdefault(nombre, []).extend(lineas)
+    series['danu_sesiones_activas'] = [f'danu_sesiones_activas{_llaves(_formatear_etiquetas(fijas))} {len(sesiones)}']
+
+    lineas = []
+    for nombre in sorted(series):
+        tipo, ayuda = DESCRIPCIONES.get(nombre, ('untyped', nombre))
+        lineas += [f'# HELP {nombre} {ayuda}', f'# TYPE {nombre} {tipo}']
+        lineas += series[nombre]
+    return '\n'.join(lineas) + '\n'
+
+
+# ---------- Exportación ----------
+
+class _ManejadorMetricas(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(404)
+            return
+        cuerpo = texto().encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(cuerpo)))
+        self.end_headers()
+        self.wfile.write(cuerpo)
+
+    def log_message(self, *args):
+        pass
+
+
+def _escribir_periodicamente(ruta, intervalo_s):
+    etiquetas = {'proceso': os.getpid()}
+    while True:
+        try:
+            temporal = f"{ruta}.{os.getpid()}.tmp"
+            with open(temporal, 'w') as f:
+                f.write(texto(etiquetas))
+            os.replace(temporal, ruta)  # Atómico: el lector nunca ve un archivo a medias
+        except OSError as e:
+            print(f"⚠ No se pudieron escribir las métricas en {ruta}: {e}")
+        time.sleep(intervalo_s)
+
+
+def iniciar_exportacion(puerto=None, archivo=None, intervalo_s=INTERVALO_ARCHIVO_S, host='127.0.0.1'):
+    """
+    Arranca (una sola vez por proceso) el endpoint HTTP y/o la escritura periódica.
+
+    Returns:
+        dict con el puerto y la ruta en uso (None si no se activó)
+    """
+    with _lock:
+        if puerto and _exportacion['servidor'] is None:
+            try:
+                servidor = ThreadingHTTPServer((host, int(puerto)), _ManejadorMetricas)
+                servidor.daemon_threads = True
+                threading.Thread(target=servidor.serve_forever, name='metricas-http', daemon=True).start()
+                _exportacion['servidor'] = servidor
+            except OSError as e:
+                print(f"⚠ No se pudo abrir el puerto de métricas {puerto}: {e}")
+                _exportacion['servidor'] = False
+        if archivo and _exportacion['archivo'] is None:
+            ruta = archivo.replace('{pid}', str(os.getpid()))
+            threading.Thread(target=_escribir_periodicamente, args=(ruta, intervalo_s),
+                             name='metricas-archivo', daemon=True).start()
+            _exportacion['archivo'] = ruta
+        servidor = _exportacion['servidor']
+    return {
+        'puerto': servidor.server_address[1] if servidor else None,
+        'archivo': _exportacion['archivo']
+    }
+
+
+def limpiar():
+    with _lock:
+        _contadores.clear()
+        _histogramas.clear()
+        _gauges.clear()
+        _sesiones.clear()
@@ -0,0 +1,159 @@
+"""
+Agrupación de solicitudes concurrentes de scoring (micro-batching).
+
+Con muchas sesiones o clientes del servicio pidiendo scores al mismo tiempo,
+llamar predict_proba por solicitud desperdicia el rendimiento vectorizado del
+bosque. MicroBatcher junta las solicitudes que llegan durante a lo más
+max_espera_ms (o hasta max_filas filas), las evalúa en una sola llamada desde un
+hilo dedicado y entrega cada resultado a quien lo pidió mediante un Future.
+
+La primera solicitud de un lote espera como máximo max_espera_ms, así que ese
+valor acota la latencia añadida (p99); max_filas acota el tamaño de cada llamada.
+"""
+import logging
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+MAX_ESPERA_MS_DEFECTO = 2.0
+MAX_FILAS_DEFECTO = 512
+
+
+class MicroBatcher:
+    """Cola de solicitudes que se evalúan en lotes en un hilo de fondo"""
+
+    def __init__(self, funcion_lote, max_espera_ms=MAX_ESPERA_MS_DEFECTO, max_filas=MAX_FILAS_DEFECTO,
+                 al_despachar=None):
+        """
+        Args:
+            funcion_lote: callable(lista de solicitudes) -> lista de resultados
+                (mismo largo y orden)
+            max_espera_ms: tiempo máximo que se espera a más solicitudes antes
+                de despachar el lote
+            max_filas: filas máximas por lote (una solicitud más grande se
+                despacha sola)
+            al_despachar: callable(filas, segundos) opcional para métricas; sus
+                errores se registran con logging y no detienen el hilo
+        """
+        self.funcion_lote = funcion_lote
+        self.max_espera = max_espera_ms / 1000
+        self.max_filas = max_filas
+        self.al_despachar = al_despachar
+        self.lotes = 0
+        self.filas = 0
+
+        self._pendientes = []  # (solicitud, filas, futuro)
+        self._filas_pendientes = 0
+        self._condicion = threading.Condition()
+        self._cerrado = False
+        self._error = None  # Excepción que detuvo el hilo de despacho
+        self._en_curso = []
+        self._hilo = threading.Thread(target=self._ciclo, name='microbatch', daemon=True)
+        self._hilo.start()
+
+    @classmethod
+    def para_modelo(cls, modelo, **kwargs):
+        """Batcher de matrices de features: cada solicitud es un arreglo (n, f) y su resultado las n probabilidades"""
+        def funcion_lote(matrices):
+            probas = modelo.predict_proba(np.vstack(matrices))[:, 1]
+            return np.split(probas, np.cumsum([len(m) for m in matrices])[:-1])
+        return cls(funcion_lote, **kwargs)
+
+    def enviar(self, solicitud, filas=1):
+        """Encola una solicitud. Returns: concurrent.futures.Future con su resultado"""
+        futuro = Future()
+        with self._condicion:
+            if self._error is not None:
+                raise RuntimeError("El hilo del MicroBatcher terminó por un error") from self._error
+            if self._cerrado:
+                raise RuntimeError("MicroBatcher cerrado")
+            self._pendientes.append((solicitud, filas, futuro))
+            self._filas_pendientes += filas
+            self._condicion.notify()
+        return futuro
+
+    def evaluar(self, solicitud, filas=1, timeout=None):
+        """Versión bloqueante de enviar()"""
+        return self.enviar(solicitud, filas).result(timeout)
+
+    def _tomar_lote(self):
+        """Espera la primera solicitud y luego hasta max_espera o max_filas"""
+        with self._condicion:
+            while not self._pendientes and not self._cerrado:
+                self._condicion.wait()
+            if not self._pendientes:
+                return []
+            limite = time.monotonic() + self.max_espera
+            while self._filas_pendientes < self.max_filas and not self._cerrado:
+                restante = limite - time.monotonic()
+                if restante <= 0:
+                    break
+                self._condicion.wait(restante)
+
+            lote, filas = [], 0
+            while self._pendientes and (not lote or filas + self._pendientes[0][1] <= self.max_filas):
+                solicitud = self._pendientes.pop(0)
+                lote.append(solicitud)
+                filas += solicitud[1]
+            self._filas_pendientes -= filas
+            return lote
+
+    def _ciclo(self):
+        try:
+            self._despachar_lotes()
+        except Exception as e:
+            # Sin hilo nadie resolvería los futuros: se fallan los pendientes y enviar() lanza error
+            logging.exception("MicroBatcher: el hilo de despacho terminó por un error")
+            with self._condicion:
+                self._error = e
+                pendientes = self._en_curso + self._pendientes
+                self._pendientes, self._en_curso = [], []
+                self._filas_pendientes = 0
+            for _, _, futuro in pendientes:
+                if not futuro.done() and (futuro.running() or futuro.set_running_or_notify_cancel()):
+                    futuro.set_exception(e)
+
+    def _despachar_lotes(self):
+        while True:
+            lote = self._tomar_lote()
+            if not lote:
+                return
+            # Un futuro cancelado por quien lo pidió no se evalúa
+            lote = [s for s in lote if s[2].set_running_or_notify_cancel()]
+            if not lote:
+                continue
+            self._en_curso = lote
+            inicio = time.perf_counter()
+            try:
+                resultados = self.funcion_lote([s[0] for s in lote])
+            except Exception as e:
+                for _, _, futuro in lote:
+                    futuro.set_exception(e)
+                self._en_curso = []
+                continue
+            for (_, _, futuro), resultado in zip(lote, resultados):
+                futuro.set_result(resultado)
+            self._en_curso = []
+            filas = sum(s[1] for s in lote)
+            self.lotes += 1
+            self.filas += filas
+            if self.al_despachar is not None:
+                try:
+                    self.al_despachar(filas, time.perf_counter() - inicio)
+                except Exception:
+                    logging.exception("MicroBatcher: error en al_despachar")
+
+    def cerrar(self):
+        """Despacha lo pendiente y detiene el hilo"""
+        with self._condicion:
+            self._cerrado = True
+            self._condicion.notify_all()
+        self._hilo.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.cerrar()
@@ -0,0 +1,247 @@
+"""
+Precálculo offline de las tablas del dashboard.
+
+Ejecuta la derivación completa (historial, predicciones futuras, clientes con
+probabilidades ML, Riesgo y Segmento) fuera del proceso web y la materializa como
+artefactos Parquet versionados más un manifest.json. app.py solo tiene que
+leer esos archivos al iniciar.
+
+Los CSV de origen se leen de --datos (por defecto DANU_DATOS_DIR, como la app).
+
+Uso:
+    cd app
+    python precalcular_tablas.py [--datos DIR] [--salida artefactos] [--sin-modelo] [--conservar 3]
+                                 [--streaming] [--memoria-max-mb 256] [--procesos 4]
+"""
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import sys
+import time
+from datetime import datetime
+
+from procesamiento_datos import TABLAS, leer_fuentes, derivar_tablas
+from ingesta_streaming import MEMORIA_MAX_MB_DEFECTO, leer_fuentes_streaming
+
+base_dir = os.path.dirname(os.path.abspath(__file__))
+ARTEFACTOS_DIR = os.path.join(base_dir, "artefactos")
+MANIFEST_NOMBRE = "manifest.json"
+VERSION_FORMATO = 1
+
+# Mismo directorio de datos que app.py
+DATOS_DIR = os.environ.get('DANU_DATOS_DIR', base_dir)
+CALLS_NOMBRE = "debug_central_period_last_report_v2_filtrado.csv"
+AGENTS_NOMBRE = "agent_score_central_period_v2.csv"
+CHURN_NOMBRE = "resultado_churn_por_mes.csv"
+BASE_DATOS_NOMBRE = "BaseDeDatos.csv"
+FEATURES_FILE = os.path.join(base_dir, "churn_features.json")
+
+
+def huella_archivo(ruta):
+    """Tamaño y fecha de modificación de un archivo de origen (None si no existe)"""
+    if not os.path.exists(ruta):
+        return None
+    stat = os.stat(ruta)
+    return {'bytes': stat.st_size, 'mtime': stat.st_mtime}
+
+
+def huellas_fuentes(fuentes):
+    return {os.path.basename(ruta): huella_archivo(ruta) for ruta in fuentes}
+
+
+def escribir_artefactos(tablas, salida=ARTEFACTOS_DIR, fuentes=None, modelo_info=None, conservar=3):
+    """
+    Escribe cada tabla como Parquet dentro de un directorio versionado y
+    actualiza el manifest de forma atómica.
+
+    Returns:
+        dict: el manifest escrito
+    """
+    os.makedirs(salida, exist_ok=True)
+
+    huellas = huellas_fuentes(fuentes or [])
+    firma = hashlib.sha1(json.dumps(huellas, sort_keys=True).encode()).hexdigest()[:8]
+    version = f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{firma}"
+    dir_version = os.path.join(salida, version)
+    os.makedirs(dir_version)
+
+    archivos = {}
+    for nombre in TABLAS:
+        df = tablas.get(nombre)
+        if df is None:
+            continue
+        ruta = os.path.join(dir_version, f"{nombre}.parquet")
+        df.to_parquet(ruta, index=False)
+        archivos[nombre] = {
+            'ruta': os.path.join(version, f"{nombre}.parquet"),
+            'filas': int(len(df)),
+            'columnas': [str(c) for c in df.columns],
+            'bytes': os.path.getsize(ruta)
+        }
+
+    manifest = {
+        'formato': VERSION_FORMATO,
+        'version': version,
+        'creado': datetime.now().isoformat(timespec='seconds'),
+        'tablas': archivos,
+        'fuentes': huellas,
+        'modelo': modelo_info
+    }
+
+    # Escritura atómica: la app nunca ve un manifest a medio escribir
+    ruta_manifest = os.path.join(salida, MANIFEST_NOMBRE)
+    ruta_tmp = ruta_manifest + ".tmp"
+    with open(ruta_tmp, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(ruta_tmp, ruta_manifest)
+
+    # Conservar solo las últimas N versiones
+    versiones = sorted(
+        d for d in os.listdir(salida)
+        if os.path.isdir(os.path.join(salida, d)) and d != version
+    )
+    for vieja in versiones[:max(0, len(versiones) - (conservar - 1))]:
+        shutil.rmtree(os.path.join(salida, vieja), ignore_errors=True)
+
+    return manifest
+
+
+def leer_manifest(salida=ARTEFACTOS_DIR):
+    """Retorna el manifest vigente o None si no hay artefactos precalculados"""
+    ruta_manifest = os.path.join(salida, MANIFEST_NOMBRE)
+    if not os.path.exists(ruta_manifest):
+        return None
+    with open(ruta_manifest) as f:
+        manifest = json.load(f)
+    if manifest.get('formato') != VERSION_FORMATO:
+        return None
+    return manifest
+
+
+def fuentes_modificadas(manifest, fuentes):
+    """Lista de archivos de origen que cambiaron desde que se generó el manifest"""
+    actuales = huellas_fuentes(fuentes)
+    return [
+        nombre for nombre, huella in actuales.items()
+        if manifest['fuentes'].get(nombre) != huella
+    ]
+
+
+def cargar_artefactos(salida=ARTEFACTOS_DIR, manifest=None):
+    """
+    Carga las tablas precalculadas.
+
+    Parquet se decodifica siempre a memoria propia (no hay columnas respaldadas
+    por el archivo); split_blocks evita consolidar las columnas en bloques nuevos
+    y self_destruct libera cada columna de Arrow al convertirla, así el pico es
+    una sola copia de cada tabla en vez de Arrow + pandas.
+
+    Returns:
+        dict con las llaves de TABLAS (las ausentes quedan en None), o None si
+        no hay manifest.
+    """
+    import pyarrow.parquet as pq
+
+    if manifest is None:
+        manifest = leer_manifest(salida)
+    if manifest is None:
+        return None
+
+    data = {nombre: None for nombre in TABLAS}
+    for nombre, info in manifest['tablas'].items():
+        tabla = pq.read_table(os.path.join(salida, info['ruta']))
+        data[nombre] = tabla.to_pandas(split_blocks=True, self_destruct=True)
+        del tabla
+    return data
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Precalcula las tablas del dashboard como artefactos Parquet")
+    parser.add_argument('--datos', default=DATOS_DIR, help="Directorio de los CSV de origen (DANU_DATOS_DIR)")
+    parser.add_argument('--salida', default=ARTEFACTOS_DIR, help="Directorio de artefactos")
+    parser.add_argument('--sin-modelo', action='store_true', help="No usar el modelo ML (probabilidad por días sin transacciones)")
+    parser.add_argument('--conservar', type=int, default=3, help="Número de versiones a conservar")
+    parser.add_argument('--streaming', action='store_true', help="Leer los CSV por bloques (archivos más grandes que la RAM)")
+    parser.add_argument('--procesos', type=int, default=0, help="Procesos para evaluar el modelo (0 = proceso actual)")
+    parser.add_argument('--memoria-max-mb', type=int, default=MEMORIA_MAX_MB_DEFECTO,
+                        help="Memoria por bloque de lectura en modo streaming (no acota el pico: "
+                             "las tablas proyectadas se conservan completas)")
+    args = parser.parse_args()
+    calls_file, agents_file, churn_file, base_datos_file = (
+        os.path.join(args.datos, nombre) for nombre in (CALLS_NOMBRE, AGENTS_NOMBRE, CHURN_NOMBRE, BASE_DATOS_NOMBRE)
+    )
+
+    print("="*80)
+    print("PRECÁLCULO DE TABLAS DEL DASHBOARD")
+    print("="*80)
+
+    inicio = time.perf_counter()
+
+    print("\n1. Cargando fuentes...")
+    agregados, df_ultimo_mes = None, None
+    try:
+        if args.streaming:
+            df_calls, df_agents, df_churn, df_base, agregados, df_ultimo_mes = leer_fuentes_streaming(
+                calls_file, agents_file, churn_file, base_datos_file,
+                FEATURES_FILE, args.memoria_max_mb
+            )
+        else:
+            df_calls, df_agents, df_churn, df_base = leer_fuentes(
+                calls_file, agents_file, churn_file, base_datos_file
+            )
+    except FileNotFoundError as e:
+        print(f"ERROR: No se encontró {e.filename}")
+        sys.exit(1)
+    print(f"   ✓ Llamadas: {len(df_calls):,} | Agentes: {len(df_agents):,} | Churn: {len(df_churn):,}")
+    print(f"   ✓ BaseDeDatos: {'no disponible' if df_base is None else f'{len(df_base):,} filas'}")
+
+    print("\n2. Cargando modelo...")
+    predictor = None
+    modelo_info = None
+    if not args.sin_modelo:
+        try:
+            from churn_predictor import ChurnPredictor
+            predictor = ChurnPredictor(procesos=args.procesos)
+            ruta_info = os.path.join(base_dir, 'churn_model_info.json')
+            if os.path.exists(ruta_info):
+                with open(ruta_info) as f:
+                    modelo_info = json.load(f)
+            print("   ✓ Modelo cargado")
+        except Exception as e:
+            print(f"   Advertencia: no se pudo cargar el modelo ({e}), se usará el método alternativo")
+    else:
+        print("   - Omitido (--sin-modelo)")
+
+    print("\n3. Derivando tablas...")
+    try:
+        tablas = derivar_tablas(
+            df_calls, df_agents, df_churn, df_base, predictor,
+            agregados=agregados, df_ultimo_mes=df_ultimo_mes
+        )
+    finally:
+        if predictor is not None:
+            predictor.cerrar()
+    for nombre in TABLAS:
+        if tablas[nombre] is not None:
+            print(f"   ✓ {nombre}: {len(tablas[nombre]):,} filas")
+
+    print("\n4. Escribiendo artefactos...")
+    manifest = escribir_artefactos(
+        tablas,
+        salida=args.salida,
+        fuentes=[calls_file, agents_file, churn_file, base_datos_file],
+        modelo_info=modelo_info,
+        conservar=args.conservar
+    )
+    print(f"   ✓ Versión: {manifest['version']}")
+    print(f"   ✓ Manifest: {os.path.join(args.salida, MANIFEST_NOMBRE)}")
+
+    print("\n" + "="*80)
+    print(f"✅ TABLAS PRECALCULADAS EN {time.perf_counter() - inicio:.1f}s")
+    print("="*80)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,442 @@
+"""
+Derivación de las tablas del dashboard a partir de los CSV de origen.
+
+Este módulo contiene la lógica que antes vivía dentro de load_data() en app.py:
+historial mensual de churn, predicciones futuras, clientes con probabilidad ML,
+Riesgo y Segmento. No depende de Streamlit, por lo que se usa tanto desde la app
+como desde el proceso batch precalcular_tablas.py.
+"""
+import os
+import logging
+import time
+import numpy as np
+import pandas as pd
+
+import instrumentacion
+import metricas
+
+UMBRAL_CHURN_ML = 0.5  # Para modelo ML
+UMBRAL_CHURN_DIAS = 42  # Regla de negocio: días para considerar churn real
+
+REQUIRED_AGENT_COLS = ['id_agente', 'winrate', 'casos_ganados', 'total_casos']
+REQUIRED_CHURN_COLS = ['mes', 'churn', 'monto_total', 'id_user', 'dias_sin_transacciones']
+
+# Nombres de las tablas que componen el diccionario `data` del dashboard
+TABLAS = ['history', 'calls', 'agents', 'future', 'clients', 'churn_raw', 'base_datos']
+
+
+def _avisar_consola(nivel, mensaje):
+    """Destino por defecto de los avisos cuando no hay Streamlit (procesos batch)"""
+    print(f"   [{nivel.upper()}] {mensaje}")
+
+
+def estimar_ingresos_desde_monto_total(monto_total, num_usuarios=None, num_transacciones=None):
+    """
+    Estima ingresos de DANU basados en tasa de comisión efectiva realista.
+
+    Considerando que:
+    - Solo ~25-30% de transacciones generan comisión
+    - La mayoría son transferencias GRATIS
+    - Depósitos con tarjeta (2.2%) son minoría
+    - Comisiones fijas ($12-18) son sobre transacciones específicas
+
+    Tasa de comisión efectiva típica en fintechs: 0.3% - 0.5% del monto transaccionado
+    """
+
+    # Tasa de comisión efectiva conservadora
+    # Basada en: ~25% de transacciones generan comisión promedio de 1.5%
+    # Tasa efectiva = 0.25 * 0.015 = 0.00375 ≈ 0.4%
+    TASA_COMISION_EFECTIVA = 0.004  # 0.4% del monto total
+
+    # Calcular ingresos base por comisiones porcentuales
+    ingresos_porcentuales = monto_total * TASA_COMISION_EFECTIVA
+
+    # Agregar ingresos por comisiones fijas (basado en usuarios)
+    ingresos_fijos = 0
+    if num_usuarios and num_usuarios > 0:
+        # Comisiones fijas estimadas por usuario activo por mes:
+        # - ~20% hacen depósito efectivo ($13): 0.20 * $13 = $2.60
+        # - ~15% hacen retiro QR ($12): 0.15 * $12 = $1.80
+        # - ~5% hacen retiro sin tarjeta ($18): 0.05 * $18 = $0.90
+        # - ~5% hacen 3ra+ transferencia ($2.55): 0.05 * $2.55 = $0.13
+        # - ~0.5% reponen tarjeta ($55): 0.005 * $55 = $0.28
+        # Total por usuario activo: ~$5.70/mes
+        INGRESO_FIJO_POR_USUARIO = 5.70
+        ingresos_fijos = num_usuarios * INGRESO_FIJO_POR_USUARIO
+    elif num_transacciones and num_transacciones > 0:
+        # Si no tenemos usuarios, estimar basado en transacciones
+        # Asumiendo ~8 transacciones por usuario
+        usuarios_estimados = num_transacciones / 8
+        ingresos_fijos = usuarios_estimados * 5.70
+
+    ingresos_totales = ingresos_porcentuales + ingresos_fijos
+
+    return ingresos_totales
+
+
+def leer_fuentes(calls_file, agents_file, churn_file, base_datos_file, avisar=_avisar_consola):
+    """
+    Lee y valida los CSV de origen.
+
+    Returns:
+        tuple: (df_calls, df_agents, df_churn, df_base). df_base es None si
+        BaseDeDatos.csv no existe o no se pudo leer.
+    """
+    # Cargar CSV de llamadas/reportes
+    df_calls = pd.read_csv(calls_file, low_memory=False)
+    validar_llamadas(df_calls, calls_file, avisar)
+
+    # Cargar CSV de agentes
+    df_agents = pd.read_csv(agents_file, low_memory=False)
+    validar_agentes(df_agents, agents_file, avisar)
+
+    # Cargar CSV de churn por mes
+    df_churn = pd.read_csv(churn_file, low_memory=False)
+    validar_churn(df_churn, churn_file, avisar)
+
+    df_base = None
+    if os.path.exists(base_datos_file):
+        try:
+            df_base = pd.read_csv(base_datos_file, low_memory=False)
+            if 'first_tx' in df_base.columns:
+                df_base['first_tx'] = pd.to_datetime(df_base['first_tx'], errors='coerce')
+            if 'last_tx' in df_base.columns:
+                df_base['last_tx'] = pd.to_datetime(df_base['last_tx'], errors='coerce')
+        except Exception:
+            df_base = None
+
+    return df_calls, df_agents, df_churn, df_base
+
+
+def validar_llamadas(df_calls, calls_file, avisar=_avisar_consola):
+    if df_calls.empty:
+        raise ValueError(f"El archivo {calls_file} está vacío o solo tiene headers")
+    if len(df_calls) < 10:
+        avisar('warning', f"El archivo {calls_file} tiene muy pocos registros ({len(df_calls)})")
+    if 'fecha_rep' in df_calls.columns:
+        df_calls['fecha_rep'] = pd.to_datetime(df_calls['fecha_rep'], errors='coerce')
+    if 'Motivo' not in df_calls.columns:
+        raise ValueError("El archivo de llamadas no contiene la columna 'Motivo'")
+
+
+def validar_agentes(df_agents, agents_file, avisar=_avisar_consola):
+    if df_agents.empty:
+        raise ValueError(f"El archivo {agents_file} está vacío o solo tiene headers")
+    if len(df_agents) < 10:
+        avisar('warning', f"El archivo {agents_file} tiene muy pocos registros ({len(df_agents)})")
+    missing_cols = [col for col in REQUIRED_AGENT_COLS if col not in df_agents.columns]
+    if missing_cols:
+        raise ValueError(f"El archivo de agentes no contiene las columnas: {missing_cols}")
+
+
+def validar_churn(df_churn, churn_file, avisar=_avisar_consola):
+    if df_churn.empty:
+        raise ValueError(f"El archivo {churn_file} está vacío o solo tiene headers")
+    if len(df_churn) < 10:
+        avisar('warning', f"El archivo {churn_file} tiene muy pocos registros ({len(df_churn)})")
+    df_churn['mes'] = pd.to_datetime(df_churn['mes'], errors='coerce')
+    missing_cols = [col for col in REQUIRED_CHURN_COLS if col not in df_churn.columns]
+    if missing_cols:
+        raise ValueError(f"El archivo de churn no contiene las columnas: {missing_cols}")
+
+
+def agregar_historial_mensual(df_churn, df_base=None):
+    """
+    Agrega el archivo de churn por mes.
+
+    Returns:
+        DataFrame con columnas ['mes', 'churn_sum', 'registros', 'monto_total',
+        'transacciones', 'usuarios'] (una fila por mes). 'transacciones' es la
+        suma de tx_count si está disponible; si no, el conteo de registros usuario-mes.
+    """
+    if 'tx_count' not in df_churn.columns and df_base is not None:
+        # Si no tiene tx_count, intentar obtenerlo de BaseDeDatos
+        if 'tx_count' in df_base.columns and 'id_user' in df_base.columns:
+            df_churn = df_churn.merge(
+                df_base[['id_user', 'tx_count']].groupby('id_user')['tx_count'].first().reset_index(),
+                on='id_user',
+                how='left'
+            )
+            df_churn['tx_count'] = df_churn['tx_count'].fillna(0)
+
+    agrupado = df_churn.groupby('mes')
+    agregados = pd.DataFrame({
+        'churn_sum': agrupado['churn'].sum(),
+        'registros': agrupado['churn'].size(),
+        'monto_total': agrupado['monto_total'].sum(),
+        # Fallback: registros usuario-mes (no transacciones reales)
+        'transacciones': agrupado['tx_count'].sum() if 'tx_count' in df_churn.columns else agrupado['id_user'].count(),
+        'usuarios': agrupado['id_user'].nunique()
+    }).reset_index()
+    return agregados
+
+
+def construir_historial(agregados, avisar=_avisar_consola):
+    """Convierte los agregados mensuales en la tabla `history` del dashboard"""
+    df_history = pd.DataFrame({
+        'Fecha': agregados['mes'],
+        'Tasa Churn': agregados['churn_sum'] / agregados['registros'] * 100,  # Porcentaje de churn
+        'Monto_Transaccionado': agregados['monto_total'],  # Ingresos totales del mes
+        'Transacciones': agregados['transacciones']
+    })
+
+    df_history['Ingresos'] = [
+        estimar_ingresos_desde_monto_total(monto_total=monto, num_usuarios=usuarios)
+        for monto, usuarios in zip(agregados['monto_total'], agregados['usuarios'])
+    ]
+
+    df_history = df_history[['Fecha', 'Tasa Churn', 'Ingresos', 'Transacciones']]
+    df_history = df_history.sort_values('Fecha').reset_index(drop=True)
+
+    # Validar que no esté vacío
+    if df_history.empty:
+        raise ValueError("No hay datos históricos después del procesamiento")
+    if len(df_history) < 10:
+        avisar('warning', f"El archivo de churn tiene muy pocos registros ({len(df_history)})")
+
+    return df_history
+
+
+def construir_futuro(df_history, churn_rate_actual=None):
+    """
+    Genera las predicciones de los próximos 3 meses.
+
+    Si se conoce la tasa de churn actual estimada por el modelo ML, la proyección
+    parte de ella; si no, se extrapola desde el último mes histórico.
+    """
+    dates_future = pd.date_range(start=df_history['Fecha'].max(), periods=4, freq='M')[1:]
+
+    last_churn = df_history['Tasa Churn'].iloc[-1]
+    trend = df_history['Tasa Churn'].diff().mean() if len(df_history) > 1 else 0
+
+    ingresos_promedio = df_history['Ingresos'].mean()
+
+    if len(df_history) >= 2:
+        tasa_crecimiento_ingresos = (df_history['Ingresos'].iloc[-1] / df_history['Ingresos'].iloc[-2]) if df_history['Ingresos'].iloc[-2] > 0 else 1.0
+    else:
+        tasa_crecimiento_ingresos = 1.0
+
+    ultimo_ingreso = df_history['Ingresos'].iloc[-1] if not df_history.empty else ingresos_promedio
+    ingresos_proyectados = [ultimo_ingreso * (tasa_crecimiento_ingresos ** i) for i in range(1, 4)]
+
+    if churn_rate_actual is not None:
+        future_churn_rates = [max(0, min(100, churn_rate_actual + (trend * i))) for i in range(1, 4)]
+    else:
+        future_churn_rates = [last_churn + trend*i for i in range(1, 4)]
+
+    return pd.DataFrame({
+        "Fecha": dates_future,
+        "Predicción Churn": future_churn_rates,
+        "Ingresos Proyectados": ingresos_proyectados
+    })
+
+
+def construir_clientes(df_ultimo_mes, df_base=None, predictor=None, avisar=_avisar_consola):
+    """
+    Construye la tabla `clients` a partir de los registros del último mes.
+
+    Aplica el modelo ML (solo a usuarios activos), asigna Riesgo según la regla
+    de 42 días y Segmento según el monto histórico acumulado.
+    """
+    df_ultimo_mes = df_ultimo_mes.copy()
+
+    # CORRECCIÓN CONCEPTUAL: Separar clientes en categorías según umbral de 42 días
+    # Categorizar: Activo (<30), En Riesgo (30-42), Churneado (>=42)
+    df_ultimo_mes['estado_cliente'] = pd.cut(
+        df_ultimo_mes['dias_sin_transacciones'],
+        bins=[0, 30, UMBRAL_CHURN_DIAS, float('inf')],
+        labels=['Activo', 'En Riesgo', 'Churneado']
+    )
+
+    # Incluir TODOS los usuarios (incluidos churneados) para permitir filtrado en UI
+    # El ML se aplicará solo a usuarios activos
+    df_clients = df_ultimo_mes
+
+    # CORRECCIÓN CONCEPTUAL: Bins de riesgo alineados con regla de 42 días
+    # Riesgo basado en % del umbral: 50%, 75%, 100%, >100%
+    bins_riesgo = [
+        0,
+        UMBRAL_CHURN_DIAS * 0.5,   # 21 días = Bajo
+        UMBRAL_CHURN_DIAS * 0.75,  # 31.5 días = Medio
+        UMBRAL_CHURN_DIAS,         # 42 días = Alto (límite)
+        float('inf')               # 42+ días = Crítico (churneado)
+    ]
+    labels_riesgo = ['Bajo', 'Medio', 'Alto', 'Crítico']
+
+    # Fallback: probabilidad basada en días sin transacciones
+    # CORRECCIÓN: El nivel de Riesgo SIEMPRE se basa en días sin transacciones
+    # No en la probabilidad del ML - respeta la regla de negocio de 42 días
+    # Crítico = 42+ días, Alto = 31.5-42, Medio = 21-31.5, Bajo = 0-21
+    proba_fallback = (df_clients['dias_sin_transacciones'] / 100).clip(0, 1)
+    df_clients['Probabilidad Churn'] = proba_fallback
+    df_clients['Riesgo'] = pd.cut(
+        df_clients['dias_sin_transacciones'],
+        bins=bins_riesgo,
+        labels=labels_riesgo
+    )
+
+    # Si tenemos BaseDeDatos, usar el modelo ML para calcular probabilidades reales
+    # CORRECCIÓN CONCEPTUAL: Filtrar SOLO usuarios activos antes de predecir
+    if df_base is not None and predictor is not None:
+        try:
+            # Obtener IDs de todos los clientes del último mes (incluidos churneados)
+            client_ids = df_clients['id_user'].unique()
+
+            # FILTRAR solo usuarios NO churneados (activos) usando recency_days de BaseDeDatos.csv
+            usuarios_activos = df_base[
+                (df_base['id_user'].isin(client_ids)) &
+                (df_base['recency_days'] < UMBRAL_CHURN_DIAS)
+            ]
+
+            # VALIDAR calidad de datos antes de predecir
+            validation = predictor.validate_data_quality(usuarios_activos)
+
+            if not validation['is_valid']:
+                avisar('error', "Problemas con datos para ML:")
+                for issue in validation['issues']:
+                    avisar('error', f"  - {issue}")
+            else:
+                for warning in validation['warnings']:
+                    avisar('warning', f"ML: {warning}")
+
+                if usuarios_activos.empty:
+                    avisar('warning', "No hay usuarios activos para predecir con ML (todos tienen recency_days >= 42)")
+                else:
+                    # Predecir con el modelo solo para usuarios activos
+                    with instrumentacion.span('scoring_ml.clientes', filas=len(usuarios_activos)):
+                        inicio = time.perf_counter()
+                        probas = predictor.predict_proba(usuarios_activos)
+                        metricas.registrar_scoring('clientes', len(usuarios_activos), time.perf_counter() - inicio)
+
+                    # Mapear probabilidades solo a estos usuarios activos
+                    proba_dict = dict(zip(usuarios_activos['id_user'], probas))
+
+                    # Rellenar probabilidades faltantes con método basado en días sin transacciones
+                    df_clients['Probabilidad Churn'] = df_clients['id_user'].map(proba_dict).fillna(
+                        df_clients['dias_sin_transacciones'] / 100
+                    ).clip(0, 1)
+        except Exception as e:
+            # Si hay error con el modelo, usar método anterior
+            avisar('warning', f"Error al usar modelo ML, usando método alternativo: {e}")
+            df_clients['Probabilidad Churn'] = proba_fallback
+
+    # PRIMERO: Obtener monto histórico acumulado de BaseDeDatos para segmentación
+    if df_base is not None and 'amount_sum' in df_base.columns:
+        df_clients = df_clients.merge(
+            df_base[['id_user', 'amount_sum']].drop_duplicates(subset='id_user'),
+            on='id_user',
+            how='left'
+        )
+        # Usar amount_sum (histórico) para segmentación, fallback a monto_total del mes
+        df_clients['monto_para_segmentar'] = df_clients['amount_sum'].fillna(df_clients['monto_total'])
+    else:
+        df_clients['monto_para_segmentar'] = df_clients['monto_total']
+
+    # Crear segmentos basados en monto HISTÓRICO usando percentiles fijos
+    if not df_clients['monto_para_segmentar'].empty and len(df_clients) > 0:
+        # Filtrar usuarios con monto positivo para calcular percentiles más representativos
+        montos_positivos = df_clients[df_clients['monto_para_segmentar'] > 0]['monto_para_segmentar']
+
+        if len(montos_positivos) > 0:
+            # Calcular percentiles 33 y 66 SOLO de usuarios con actividad
+            p33 = montos_positivos.quantile(0.33)
+            p66 = montos_positivos.quantile(0.66)
+
+            # Asignar segmentos con función vectorizada
+            conditions = [
+                df_clients['monto_para_segmentar'] <= p33,  # Bajo monto -> Básico
+                (df_clients['monto_para_segmentar'] > p33) & (df_clients['monto_para_segmentar'] <= p66),  # Medio -> Premium
+                df_clients['monto_para_segmentar'] > p66  # Alto -> VIP
+            ]
+            choices = ['Básico', 'Premium', 'VIP']
+
+            df_clients['Segmento'] = np.select(conditions, choices, default='Básico')
+        else:
+            # Todos tienen monto 0
+            df_clients['Segmento'] = 'Básico'
+
+        # Convertir a categoría para mejor manejo
+        df_clients['Segmento'] = pd.Categorical(
+            df_clients['Segmento'],
+            categories=['Básico', 'Premium', 'VIP'],
+            ordered=True
+        )
+    else:
+        df_clients['Segmento'] = 'Básico'
+
+    # Validar distribución de segmentos (solo loggear si hay problema)
+    segmento_counts_final = df_clients['Segmento'].value_counts()
+    total_clientes = len(df_clients)
+
+    if total_clientes > 0:
+        min_pct = (segmento_counts_final.min() / total_clientes * 100) if len(segmento_counts_final) > 0 else 0
+        if min_pct < 5 and len(segmento_counts_final) < 3:
+            logging.warning(f"Distribución de segmentos no equitativa. Segmentos con datos: {len(segmento_counts_final)}. Distribución: {segmento_counts_final.to_dict()}")
+
+    # Incluir campo churn para filtrado
+    # Usar monto_para_segmentar que ya tiene el monto histórico (del merge anterior)
+    df_clients = df_clients[['id_user', 'Segmento', 'Probabilidad Churn', 'Riesgo',
+                              'dias_sin_transacciones', 'monto_para_segmentar', 'churn']].copy()
+
+    df_clients.columns = ['ID', 'Segmento', 'Probabilidad Churn', 'Riesgo',
+                           'Días sin Trans', 'Monto Total', 'Churn']
+
+    # Asegurar que churn sea boolean
+    df_clients['Churn'] = df_clients['Churn'].astype(bool)
+
+    return df_clients
+
+
+def tasa_churn_ml(df_base, predictor):
+    """Tasa de churn (%) estimada por el modelo sobre toda la base, o None si no es posible"""
+    if df_base is None or predictor is None:
+        return None
+    try:
+        with instrumentacion.span('scoring_ml.tasa_base', filas=len(df_base)):
+            inicio = time.perf_counter()
+            probas = predictor.predict_proba(df_base)
+            metricas.registrar_scoring('tasa_base', len(df_base), time.perf_counter() - inicio)
+        return (probas >= UMBRAL_CHURN_ML).mean() * 100
+    except Exception:
+        return None
+
+
+def derivar_tablas(df_calls, df_agents, df_churn, df_base=None, predictor=None,
+                   avisar=_avisar_consola, agregados=None, df_ultimo_mes=None):
+    """
+    Deriva todas las tablas del dashboard.
+
+    Args:
+        df_calls, df_agents, df_churn, df_base: DataFrames ya validados (ver leer_fuentes)
+        predictor: objeto con predict_proba/validate_data_quality, o None para usar el fallback
+        avisar: callable(nivel, mensaje) para advertencias ('warning' / 'error')
+        agregados: agregados mensuales precalculados (ver agregar_historial_mensual);
+            si es None se calculan a partir de df_churn
+        df_ultimo_mes: registros del último mes precalculados; si es None se filtran de df_churn
+
+    Returns:
+        dict con las llaves de TABLAS
+    """
+    if agregados is None:
+        agregados = agregar_historial_mensual(df_churn, df_base)
+    df_history = construir_historial(agregados, avisar)
+
+    # Calcular predicciones futuras
+    df_future = construir_futuro(df_history, tasa_churn_ml(df_base, predictor))
+
+    # Clientes en Riesgo (del archivo de churn)
+    # Tomamos el último mes disponible
+    if df_ultimo_mes is None:
+        ultimo_mes = df_churn['mes'].max()
+        df_ultimo_mes = df_churn[df_churn['mes'] == ultimo_mes]
+    df_clients = construir_clientes(df_ultimo_mes, df_base, predictor, avisar)
+
+    return {
+        "history": df_history,
+        "calls": df_calls,
+        "agents": df_agents,
+        "future": df_future,
+        "clients": df_clients,
+        "churn_raw": df_churn,
+        "base_datos": df_base
+    }
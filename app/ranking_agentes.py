@@ -0,0 +1,222 @@
+"""
+Puntuación de agentes para el ranking (página Ranking Agentes).
+
+Todas las columnas se calculan como expresiones sobre arreglos de NumPy (sin
+apply por fila), así el costo crece linealmente con el número de agentes:
+
+  - bayesian_score: promedio bayesiano del winrate. Agrega `confianza_minima`
+    casos virtuales con el winrate global del equipo (ponderado por casos), lo
+    que acerca al promedio a los agentes con pocos casos:
+
+        bayesian_score = (ganados + confianza * winrate_global/100) / (total + confianza) * 100
+
+    Ej. con confianza=10 y winrate_global=48%: 2/2 (100%) -> 56.7; 80/100 (80%) -> 77.1
+  - wilson_inferior: límite inferior del intervalo de Wilson (z=1.96, 95%) del
+    winrate; una cota pesimista que no depende del resto del equipo
+  - rank_bayesiano / rank_wilson / rank_winrate: posición 1..n (1 = mejor;
+    empates por orden de aparición)
+
+IndiceRanking puntúa al equipo una sola vez y guarda el orden por cada criterio
+(bayesian_score, winrate, casos_ganados) y los percentiles; top-k es un corte
+del orden precalculado y los filtros de la página son máscaras sobre él.
+
+comparativa_agentes arma la tabla larga (agente x métrica) del comparador.
+
+No depende de Streamlit; app.py cachea un índice por carga de datos.
+"""
+import numpy as np
+
+CONFIANZA_MINIMA = 10
+WINRATE_DEFECTO = 48  # Prior cuando el equipo filtrado no tiene casos
+Z_WILSON = 1.96
+
+COLUMNAS_REQUERIDAS = ['id_agente', 'winrate', 'casos_ganados', 'total_casos']
+CRITERIOS = ('bayesian_score', 'winrate', 'casos_ganados')
+
+# Métricas del comparador: (etiqueta, columna, escala de la barra, sufijo del texto).
+# Total Casos se divide entre 10 para que quepa en el mismo eje que el winrate
+METRICAS_COMPARADOR = (
+    ('Winrate', 'winrate', 1.0, '%'),
+    ('Casos Ganados', 'casos_ganados', 1.0, ''),
+    ('Total Casos', 'total_casos', 0.1, ''),
+)
+
+
+def winrate_global(casos_ganados, total_casos):
+    """Winrate ponderado por casos (sum(ganados)/sum(total)*100), o WINRATE_DEFECTO sin casos"""
+    total = float(np.sum(total_casos))
+    return float(np.sum(casos_ganados)) / total * 100 if total > 0 else WINRATE_DEFECTO
+
+
+def promedio_bayesiano(casos_ganados, total_casos, confianza_minima=CONFIANZA_MINIMA, winrate_global=None):
+    """Winrate ajustado (0-100) por casos virtuales con el winrate global"""
+    if winrate_global is None:
+        winrate_global = WINRATE_DEFECTO
+    ganados = np.asarray(casos_ganados, dtype=np.float64)
+    total = np.asarray(total_casos, dtype=np.float64)
+    return (ganados + confianza_minima * winrate_global / 100) / (total + confianza_minima) * 100
+
+
+def limite_inferior_wilson(casos_ganados, total_casos, z=Z_WILSON):
+    """Límite inferior (0-100) del intervalo de Wilson del winrate; 0 para agentes sin casos"""
+    ganados = np.asarray(casos_ganados, dtype=np.float64)
+    n = np.asarray(total_casos, dtype=np.float64)
+    con_casos = n > 0
+    n_seguro = np.where(con_casos, n, 1.0)
+    p = np.clip(ganados / n_seguro, 0.0, 1.0)
+    z2 = z * z
+    centro = p + z2 / (2 * n_seguro)
+    margen = z * np.sqrt(p * (1 - p) / n_seguro + z2 / (4 * n_seguro * n_seguro))
+    limite = (centro - margen) / (1 + z2 / n_seguro)
+    return np.where(con_casos, np.maximum(limite, 0.0) * 100, 0.0)
+
+
+def _posiciones(valores):
+    """Posición 1..n por valor descendente (orden estable: empates por aparición)"""
+    orden = np.argsort(-np.asarray(valores, dtype=np.float64), kind='stable')
+    rank = np.empty(len(orden), dtype=np.int64)
+    rank[orden] = np.arange(1, len(orden) + 1)
+    return rank
+
+
+def puntuar_agentes(df_agentes, confianza_minima=CONFIANZA_MINIMA, z=Z_WILSON):
+    """
+    Agrega bayesian_score, wilson_inferior y los ranks al DataFrame de agentes.
+
+    El prior bayesiano es el winrate global de las filas recibidas (el equipo
+    filtrado), como en el ranking original.
+
+    Returns:
+        DataFrame nuevo ordenado por bayesian_score descendente
+    """
+    ganados = df_agentes['casos_ganados'].to_numpy(dtype=np.float64)
+    total = df_agentes['total_casos'].to_numpy(dtype=np.float64)
+    bayesiano = promedio_bayesiano(ganados, total, confianza_minima, winrate_global(ganados, total))
+
+    resultado = df_agentes.copy(deep=False)
+    resultado['bayesian_score'] = bayesiano
+    resultado['wilson_inferior'] = limite_inferior_wilson(ganados, total, z)
+    resultado['rank_bayesiano'] = _posiciones(bayesiano)
+    resultado['rank_wilson'] = _posiciones(resultado['wilson_inferior'].to_numpy())
+    resultado['rank_winrate'] = _posiciones(df_agentes['winrate'].to_numpy(dtype=np.float64))
+
+    orden = np.argsort(resultado['rank_bayesiano'].to_numpy(), kind='stable')
+    return resultado.iloc[orden]
+
+
+def mascara_agentes(df_agentes, id_agente=None, winrate_range=None):
+    """Máscara booleana de los filtros de la página: ID exacto y rango de winrate (inclusive)"""
+    mascara = np.ones(len(df_agentes), dtype=bool)
+    if id_agente is not None:
+        mascara &= df_agentes['id_agente'].to_numpy() == id_agente
+    if winrate_range is not None:
+        winrate = df_agentes['winrate'].to_numpy()
+        mascara &= (winrate >= winrate_range[0]) & (winrate <= winrate_range[1])
+    return mascara
+
+
+class IndiceRanking:
+    """
+    Agentes puntuados y preordenados por cada criterio de CRITERIOS.
+
+    El equipo se puntúa completo (el prior bayesiano es el winrate de todo el
+    equipo), así que rank_* y percentil_* son posiciones en el equipo y un filtro
+    no cambia el score de nadie. `agentes` está ordenado por bayesian_score.
+
+    Consultas:
+      - top(k, criterio): corte O(k) del orden precalculado; con máscara, un solo
+        recorrido vectorizado del orden (sin volver a ordenar)
+      - percentil(valor, criterio): búsqueda binaria O(log n)
+      - agente(id_agente): búsqueda binaria sobre los ids ordenados
+    """
+
+    def __init__(self, df_agentes, confianza_minima=CONFIANZA_MINIMA, z=Z_WILSON):
+        # Una fila por agente (el CSV podría repetir ids; se conserva la primera)
+        if not df_agentes['id_agente'].is_unique:
+            df_agentes = df_agentes.drop_duplicates(subset=['id_agente'], keep='first')
+        agentes = puntuar_agentes(df_agentes, confianza_minima, z).reset_index(drop=True)
+
+        self._orden = {}
+        self._ascendentes = {}
+        for criterio in CRITERIOS:
+            valores = agentes[criterio].to_numpy(dtype=np.float64)
+            self._orden[criterio] = np.argsort(-valores, kind='stable')
+            self._ascendentes[criterio] = np.sort(valores)
+        agentes['percentil_bayesiano'] = self.percentil(agentes['bayesian_score'].to_numpy(), 'bayesian_score')
+        agentes['percentil_winrate'] = self.percentil(agentes['winrate'].to_numpy(), 'winrate')
+        self.agentes = agentes
+
+        ids = agentes['id_agente'].to_numpy()
+        self._posicion_por_id = np.argsort(ids, kind='stable')
+        self._ids_ordenados = ids[self._posicion_por_id]
+
+    def __len__(self):
+        return len(self.agentes)
+
+    def percentil(self, valor, criterio='bayesian_score'):
+        """% del equipo con valor <= `valor` en el criterio (escalar o arreglo)"""
+        ascendentes = self._ascendentes[criterio]
+        if len(ascendentes) == 0:
+            return np.zeros_like(np.asarray(valor, dtype=np.float64))
+        return np.searchsorted(ascendentes, valor, side='right') / len(ascendentes) * 100
+
+    def agente(self, id_agente):
+        """Fila del agente (con ranks y percentiles) o None si no existe"""
+        i = np.searchsorted(self._ids_ordenados, id_agente)
+        if i == len(self._ids_ordenados) or self._ids_ordenados[i] != id_agente:
+            return None
+        return self.agentes.iloc[self._posicion_por_id[i]]
+
+    def mascara(self, id_agente=None, winrate_range=None):
+        """Máscara de los filtros alineada con `agentes` (o None si no hay filtros)"""
+        if id_agente is None and winrate_range is None:
+            return None
+        return mascara_agentes(self.agentes, id_agente, winrate_range)
+
+    def filtrar(self, mascara=None):
+        """Agentes que pasan la máscara, en orden de bayesian_score"""
+        if mascara is None:
+            return self.agentes.copy(deep=False)
+        return self.agentes[mascara]
+
+    def top(self, k, criterio='bayesian_score', mascara=None):
+        """Los k mejores agentes por `criterio` entre los que pasan la máscara"""
+        orden = self._orden[criterio]
+        if mascara is not None:
+            orden = orden[mascara[orden]]
+        return self.agentes.iloc[orden[:k]]
+
+
+def etiqueta_agente(id_agente):
+    """'Agente <id>' sin forzar el tipo del id (12.0 -> 'Agente 12'; texto o NaN tal cual)"""
+    if isinstance(id_agente, (float, np.floating)) and float(id_agente).is_integer():
+        id_agente = int(id_agente)
+    return f"Agente {id_agente}"
+
+
+def comparativa_agentes(df_agentes, ids_agentes):
+    """
+    Tabla larga (una fila por agente y métrica) para el comparador de agentes.
+
+    Los agentes quedan en el orden de `ids_agentes`; los que no estén en
+    df_agentes se omiten.
+
+    Returns:
+        DataFrame (id_agente, agente, metrica, valor, texto, real) donde `valor`
+        es la altura de la barra (ya escalada) y `real` el valor sin escalar
+    """
+    columnas = [columna for _, columna, _, _ in METRICAS_COMPARADOR]
+    ids = np.asarray(ids_agentes)
+    por_id = df_agentes.drop_duplicates(subset=['id_agente']).set_index('id_agente')
+    seleccion = por_id.reindex(ids[np.isin(ids, por_id.index.to_numpy())])[columnas]
+
+    larga = seleccion.reset_index().melt(
+        id_vars='id_agente', value_vars=columnas, var_name='columna', value_name='real'
+    )
+    larga['real'] = larga['real'].astype(np.float64)
+    larga['agente'] = larga['id_agente'].map(etiqueta_agente)
+    larga['metrica'] = larga['columna'].map({c: etiqueta for etiqueta, c, _, _ in METRICAS_COMPARADOR})
+    larga['valor'] = larga['real'] * larga['columna'].map({c: escala for _, c, escala, _ in METRICAS_COMPARADOR})
+    larga['texto'] = (larga['real'].fillna(0).round(0).astype('int64').astype(str)
+                      + larga['columna'].map({c: sufijo for _, c, _, sufijo in METRICAS_COMPARADOR}))
+    return larga[['id_agente', 'agente', 'metrica', 'valor', 'texto', 'real']]
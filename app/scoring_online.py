@@ -0,0 +1,212 @@
+"""
+Scoring en línea de un solo cliente.
+
+ScorerOnline precalcula una vez el vector de features de cada usuario de
+BaseDeDatos (índice id_user -> fila) y recorre los árboles compilados
+(bosque_compacto.py) para una sola fila: todos los árboles avanzan un nivel a la
+vez con operaciones NumPy sobre arreglos de n_arboles elementos, sin DataFrames.
+
+Además de la probabilidad retorna las contribuciones por feature (método de
+Saabas): en cada nodo del camino, el cambio de probabilidad entre el nodo y el
+hijo elegido se atribuye a la feature de la división. sesgo + suma de
+contribuciones = probabilidad.
+"""
+import numpy as np
+import pandas as pd
+
+from bosque_compacto import BosqueCompacto, HOJA
+from features_churn import COLUMNAS_IMPUTAR_MEDIANA, calcular_medianas, imputar
+
+
+class ScorerOnline:
+    """Probabilidad de churn y contribuciones para un usuario o un vector de features"""
+
+    def __init__(self, predictor, df_base=None, top_k=5):
+        """
+        Args:
+            predictor: ChurnPredictor ya cargado (modelo + pipeline)
+            df_base: BaseDeDatos con las columnas de entrada del modelo; si es
+                None solo está disponible score_features()
+            top_k: número de contribuciones a retornar
+        """
+        self.predictor = predictor
+        self.pipeline = predictor.pipeline
+        self.features = list(predictor.features)
+        self.top_k = top_k
+
+        modelo = predictor.model
+        if isinstance(modelo, BosqueCompacto):
+            self.bosque = modelo
+        elif hasattr(modelo, 'estimators_') and hasattr(modelo.estimators_[0], 'tree_'):
+            self.bosque = BosqueCompacto.desde_sklearn(modelo, self.features)
+        else:
+            self.bosque = None  # Otros modelos (p.ej. HistGradientBoosting): sin contribuciones
+
+        self.posiciones = {}
+        self.X = np.empty((0, len(self.features)), dtype=np.float32)
+        self.crudos = None
+        if df_base is not None and 'id_user' in df_base.columns:
+            # Una fila por usuario (la primera, como drop_duplicates en el dashboard)
+            df_unico = df_base.drop_duplicates(subset='id_user')
+            columnas = [c for c in self.pipeline.columnas_entrada if c in df_unico.columns]
+            self.crudos = df_unico[columnas].reset_index(drop=True)
+            # Las categóricas (ingesta por bloques) se pasan a object para poder editarlas
+            categoricas = [c for c in columnas if isinstance(self.crudos[c].dtype, pd.CategoricalDtype)]
+            if categoricas:
+                self.crudos = self.crudos.astype({c: object for c in categoricas})
+            self.X = predictor._prepare_features(self.crudos)
+            self.posiciones = {id_user: i for i, id_user in enumerate(df_unico['id_user'].to_numpy())}
+
+        # Medianas para imputar filas sueltas: las del entrenamiento o, en pipelines
+        # legados sin medianas guardadas, las de BaseDeDatos (las mismas que usó self.X)
+        self.medianas = dict(self.pipeline.medianas)
+        if not self.medianas and self.crudos is not None and len(self.crudos):
+            self.medianas = calcular_medianas(self.pipeline.transform(self.crudos, escalar=False), self.pipeline.reglas)
+        self.sin_mediana = [regla[1] for regla in self.pipeline.reglas if regla[0] == 'numerica'
+                            and regla[1] in COLUMNAS_IMPUTAR_MEDIANA and regla[1] not in self.medianas]
+
+    def __contains__(self, id_user):
+        return id_user in self.posiciones
+
+    def _valores_originales(self, x):
+        """Vector en unidades originales (deshace el escalado del pipeline si lo hay)"""
+        if self.pipeline.media is None:
+            return x.astype(np.float64)
+        return x * self.pipeline.escala + self.pipeline.media
+
+    def columnas_sin_mediana(self, valores):
+        """Columnas de valores (dict) con NaN que habría que imputar y no tienen mediana"""
+        return [col for col in self.sin_mediana
+                if col in valores and pd.isna(pd.to_numeric(pd.Series([valores[col]]), errors='coerce').iloc[0])]
+
+    def preparar(self, filas):
+        """
+        Matriz de features para filas crudas (DataFrame o dict de arreglos),
+        imputada con self.medianas en vez de las medianas del propio lote.
+
+        Raises:
+            ValueError: si hay NaN en una columna a imputar sin mediana (pipeline
+                legado sin medianas guardadas y sin BaseDeDatos)
+        """
+        if self.pipeline.medianas:
+            return self.pipeline.transform(filas)
+        X = self.pipeline.transform(filas, escalar=False)
+        faltantes = [regla[1] for j, regla in enumerate(self.pipeline.reglas)
+                     if regla[1] in self.sin_mediana and np.isnan(X[:, j]).any()]
+        if faltantes:
+            raise ValueError(f"Sin medianas para imputar {faltantes}: el pipeline no las guarda")
+        imputar(X, self.pipeline.reglas, self.medianas)
+        return self.pipeline.escalar(X)
+
+    def _recorrer(self, x):
+        """Recorre todos los árboles para una fila. Returns: (probabilidad, sesgo, contribuciones)"""
+        b = self.bosque
+        nodos = np.array(b.raices, dtype=np.int64)
+        contribuciones = np.zeros(len(self.features), dtype=np.float64)
+        while True:
+            feat = b.feature[nodos]
+            activos = feat != HOJA
+            if not activos.any():
+                break
+            nodos_activos = nodos[activos]
+            feat_activos = feat[activos]
+            siguiente = np.where(
+                b.va_izquierda(x[feat_activos], nodos_activos),
+                b.izquierdo[nodos_activos],
+                b.derecho[nodos_activos]
+            )
+            contribuciones += np.bincount(
+                feat_activos,
+                weights=b.valor[siguiente].astype(np.float64) - b.valor[nodos_activos],
+                minlength=len(contribuciones)
+            )
+            nodos[activos] = siguiente
+        n = b.n_arboles
+        return float(b.valor[nodos].mean(dtype=np.float64)), float(b.valor[b.raices].mean(dtype=np.float64)), contribuciones / n
+
+    def score_vector(self, x):
+        """
+        Scoring de un vector de features ya transformado por el pipeline.
+
+        Returns:
+            dict con 'probabilidad', 'riesgo', 'sesgo' y 'contribuciones'
+            (lista de dicts feature/valor/aporte ordenada por |aporte|)
+        """
+        x = np.asarray(x, dtype=np.float32)
+        if self.bosque is None:
+            proba = float(self.predictor.model.predict_proba(x[None, :])[0, 1])
+            return {'probabilidad': proba, 'riesgo': self.predictor.get_risk_level(proba),
+                    'sesgo': None, 'contribuciones': []}
+
+        proba, sesgo, contribuciones = self._recorrer(x)
+        valores = self._valores_originales(x)
+        orden = np.argsort(-np.abs(contribuciones))[:self.top_k]
+        return {
+            'probabilidad': proba,
+            'riesgo': self.predictor.get_risk_level(proba),
+            'sesgo': sesgo,
+            'contribuciones': [
+                {'feature': self.features[j], 'valor': float(valores[j]), 'aporte': float(contribuciones[j])}
+                for j in orden
+            ]
+        }
+
+    def score_features(self, valores):
+        """
+        Scoring a partir de las columnas crudas de BaseDeDatos (dict columna -> valor).
+        Las columnas ausentes se tratan como en el entrenamiento (0 / mediana).
+        Los NaN se imputan con las medianas del entrenamiento (o de BaseDeDatos).
+        """
+        fila = {col: np.array([valor]) for col, valor in valores.items()}
+        if not fila:
+            fila = {self.pipeline.columnas_entrada[0]: np.array([np.nan])}
+        return self.score_vector(self.preparar(fila)[0])
+
+    def fila_cruda(self, id_user):
+        """Valores crudos de las columnas del modelo para un usuario (dict) o None"""
+        pos = self.posiciones.get(id_user)
+        if pos is None or self.crudos is None:
+            return None
+        return self.crudos.iloc[pos].to_dict()
+
+    def score_one(self, id_user, cambios=None):
+        """
+        Scoring de un usuario del índice.
+
+        Args:
+            cambios: dict columna -> nuevo valor para re-scorear con campos editados
+                (sin modificar el índice). None usa el vector precalculado.
+
+        Returns:
+            dict (ver score_vector) con 'id_user', o None si el usuario no está en el índice
+        """
+        pos = self.posiciones.get(id_user)
+        if pos is None:
+            return None
+        if cambios:
+            resultado = self.score_features({**self.fila_cruda(id_user), **cambios})
+        else:
+            resultado = self.score_vector(self.X[pos])
+        resultado['id_user'] = id_user
+        return resultado
+
+    def actualizar(self, id_user, cambios):
+        """
+        Aplica cambios persistentes a un usuario (p.ej. tras una nueva transacción)
+        y actualiza su vector en el índice. Si el usuario no existe se agrega.
+        """
+        pos = self.posiciones.get(id_user)
+        fila = {**(self.fila_cruda(id_user) or {}), **cambios}
+        x = self.preparar({col: np.array([v]) for col, v in fila.items()})[0]
+        if pos is None:
+            pos = len(self.X)
+            self.X = np.vstack([self.X, x[None, :]])
+            nueva = pd.DataFrame([fila])
+            self.crudos = nueva if self.crudos is None else pd.concat([self.crudos, nueva], ignore_index=True)
+            self.posiciones[id_user] = pos
+        else:
+            self.X[pos] = x
+            for col, valor in cambios.items():
+                if col in self.crudos.columns:
+                    self.crudos.at[pos, col] = valor
+        return self.score_one(id_user)
@@ -0,0 +1,190 @@
+"""
+Scoring del bosque de churn en un pool de procesos.
+
+El bosque se lee de su directorio aplanado (bosque_compacto.py) con
+np.load(mmap_mode='r'): cada proceso lo abre una sola vez al iniciar y todos
+comparten las mismas páginas del archivo, sin volver a serializar el modelo por
+tarea. Las filas a evaluar se copian una vez a un bloque de
+multiprocessing.shared_memory; cada tarea solo recibe (inicio, fin) y escribe sus
+probabilidades en otro bloque compartido.
+
+Uso desde código:
+    with ScoringParalelo(predictor.model, procesos=4) as ejecutor:
+        probas = ejecutor.predict_proba(X)[:, 1]
+
+Si no se llama cerrar() (o no se usa `with`), el pool y el directorio temporal
+se liberan al terminar el intérprete (atexit).
+
+Medición de escalamiento:
+    cd app
+    python scoring_paralelo.py [--filas 500000] [--procesos 1,2,4]
+"""
+import argparse
+import atexit
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from bosque_compacto import BosqueCompacto
+
+FILAS_POR_TAREA = 20_000
+
+# Estado de cada proceso del pool (se asigna en _iniciar_proceso)
+_bosque_proceso = None
+
+
+def _iniciar_proceso(directorio):
+    global _bosque_proceso
+    _bosque_proceso = BosqueCompacto.cargar(directorio, mmap=True)
+
+
+def _evaluar_rango(nombre_X, nombre_salida, forma, inicio, fin):
+    """Evalúa X[inicio:fin] (memoria compartida) y escribe las probabilidades de churn"""
+    shm_X = shared_memory.SharedMemory(name=nombre_X)
+    shm_salida = shared_memory.SharedMemory(name=nombre_salida)
+    try:
+        X = np.ndarray(forma, dtype=np.float32, buffer=shm_X.buf)
+        salida = np.ndarray((forma[0],), dtype=np.float64, buffer=shm_salida.buf)
+        salida[inicio:fin] = _bosque_proceso.predict_proba(X[inicio:fin])[:, 1]
+        del X, salida
+    finally:
+        shm_X.close()
+        shm_salida.close()
+    return fin - inicio
+
+
+class ScoringParalelo:
+    """predict_proba de un bosque repartido en bloques de filas entre procesos"""
+
+    def __init__(self, modelo, procesos=None, filas_por_tarea=FILAS_POR_TAREA):
+        """
+        Args:
+            modelo: BosqueCompacto (idealmente cargado de disco) o
+                RandomForestClassifier de sklearn, que se aplana una vez a un
+                directorio temporal
+            procesos: número de procesos (None = os.cpu_count())
+            filas_por_tarea: filas por tarea; lotes menores se evalúan en el
+                proceso actual
+        """
+        self.procesos = procesos or os.cpu_count() or 1
+        self.filas_por_tarea = filas_por_tarea
+        self._dir_temporal = None
+
+        if isinstance(modelo, BosqueCompacto):
+            self.bosque = modelo
+        elif hasattr(modelo, 'estimators_') and hasattr(modelo.estimators_[0], 'tree_'):
+            self.bosque = BosqueCompacto.desde_sklearn(modelo)
+        else:
+            raise ValueError(f"Solo se puede paralelizar un bosque de árboles (recibido: {type(modelo).__name__})")
+
+        self.directorio = getattr(self.bosque, 'directorio', None)
+        if self.directorio is None:
+            self._dir_temporal = tempfile.mkdtemp(prefix='bosque_')
+            self.bosque.guardar(self._dir_temporal)
+            self.directorio = self._dir_temporal
+
+        # spawn: los procesos no heredan el estado del proceso padre (p.ej. Streamlit)
+        self._pool = ProcessPoolExecutor(
+            max_workers=self.procesos,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_iniciar_proceso,
+            initargs=(self.directorio,)
+        )
+        # Dueños de larga vida (p.ej. el predictor cacheado del dashboard) no llaman cerrar()
+        atexit.register(self.cerrar)
+
+    def predict_proba(self, X):
+        """Misma salida que RandomForestClassifier.predict_proba: (n_filas, 2)"""
+        X = np.asarray(X, dtype=np.float32)
+        n = len(X)
+        if self.procesos == 1 or n <= self.filas_por_tarea:
+            return self.bosque.predict_proba(X)
+
+        shm_X = shared_memory.SharedMemory(create=True, size=X.nbytes)
+        shm_salida = shared_memory.SharedMemory(create=True, size=n * 8)
+        try:
+            X_compartida = np.ndarray(X.shape, dtype=np.float32, buffer=shm_X.buf)
+            X_compartida[:] = X
+            # Al menos una tarea por proceso para repartir la carga
+            paso = min(self.filas_por_tarea, -(-n // self.procesos))
+            futuros = [
+                self._pool.submit(_evaluar_rango, shm_X.name, shm_salida.name, X.shape, inicio, min(inicio + paso, n))
+                for inicio in range(0, n, paso)
+            ]
+            for futuro in futuros:
+                futuro.result()
+            p1 = np.ndarray((n,), dtype=np.float64, buffer=shm_salida.buf).copy()
+            del X_compartida
+        finally:
+            shm_X.close()
+            shm_X.unlink()
+            shm_salida.close()
+            shm_salida.unlink()
+        return np.column_stack([1.0 - p1, p1])
+
+    def predict(self, X, threshold=0.5):
+        return (self.predict_proba(X)[:, 1] >= threshold).astype(int)
+
+    def cerrar(self):
+        atexit.unregister(self.cerrar)
+        self._pool.shutdown()
+        if self._dir_temporal is not None:
+            shutil.rmtree(self._dir_temporal, ignore_errors=True)
+            self._dir_temporal = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.cerrar()
+
+
+def _lista_enteros(texto):
+    return [int(v) for v in texto.split(',') if v.strip()]
+
+
+def main():
+    from churn_predictor import ChurnPredictor
+
+    parser = argparse.ArgumentParser(description="Throughput del scoring del bosque por número de procesos")
+    parser.add_argument('--filas', type=int, default=500_000, help="Filas sintéticas a evaluar")
+    parser.add_argument('--procesos', default=f"1,2,{os.cpu_count()}", help="Números de procesos separados por coma")
+    args = parser.parse_args()
+
+    print("="*80)
+    print("SCORING EN PARALELO")
+    print("="*80)
+
+    print("\n1. Cargando modelo...")
+    predictor = ChurnPredictor()
+    rng = np.random.default_rng(42)
+    X = rng.standard_normal((args.filas, len(predictor.features))).astype(np.float32)
+    print(f"   ✓ {type(predictor.model).__name__}, {args.filas:,} filas sintéticas")
+
+    print("\n2. Midiendo throughput...")
+    referencia = None
+    base = None
+    for procesos in sorted(set(_lista_enteros(args.procesos))):
+        with ScoringParalelo(predictor.model, procesos=procesos) as ejecutor:
+            ejecutor.predict_proba(X[:ejecutor.filas_por_tarea * procesos + 1])  # Arranque de los procesos
+            inicio = time.perf_counter()
+            probas = ejecutor.predict_proba(X)[:, 1]
+            segundos = time.perf_counter() - inicio
+        if referencia is None:
+            referencia = probas
+        filas_s = args.filas / segundos
+        base = base or filas_s
+        print(f"   {procesos:>3} procesos: {filas_s:>12,.0f} filas/s  (x{filas_s / base:.2f}, "
+              f"dif. máx. {np.abs(probas - referencia).max():.1e})")
+
+    print("\n" + "="*80)
+
+
+if __name__ == "__main__":
+    main()
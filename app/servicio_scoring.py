@@ -0,0 +1,408 @@
+"""
+Servicio HTTP local de scoring de churn.
+
+Servidor asyncio (solo biblioteca estándar) que carga el modelo una vez
+(ChurnPredictor + pipeline de churn_features.json) y el índice de usuarios de
+BaseDeDatos.csv (scoring_online.py). Las solicitudes que llegan al mismo tiempo
+se agrupan en un solo predict_proba (microbatch.py): --max-espera-ms y
+--max-filas-lote controlan cuánto se espera y qué tan grande es cada lote.
+
+Endpoints:
+    POST /score         {"id_user": 123} | {"features": {...columnas crudas...}}
+                        opcional "explicar": true -> factores principales
+    POST /score/batch   {"id_users": [...]} | {"registros": [{...}, ...]}
+    GET  /health        estado, número de usuarios y columnas de entrada
+    GET  /metrics       histogramas de latencia (formato texto de Prometheus)
+
+Uso:
+    cd app
+    python servicio_scoring.py servir [--host 127.0.0.1] [--puerto 8765] [--max-espera-ms 2] [--max-filas-lote 512]
+    python servicio_scoring.py carga [--url http://127.0.0.1:8765] [--concurrencia 32] [--solicitudes 5000]
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+from urllib.parse import urlparse
+
+import numpy as np
+import pandas as pd
+
+from metricas import Histograma
+from microbatch import MAX_ESPERA_MS_DEFECTO, MAX_FILAS_DEFECTO, MicroBatcher
+
+base_dir = os.path.dirname(os.path.abspath(__file__))
+BASE_DATOS_FILE = os.path.join(base_dir, "BaseDeDatos.csv")
+
+MAX_CUERPO_BYTES = 16 * 1024 * 1024
+
+
+class ErrorSolicitud(Exception):
+    def __init__(self, estado, mensaje):
+        super().__init__(mensaje)
+        self.estado = estado
+
+
+class ServicioScoring:
+    """Modelo cargado una vez + agrupación de solicitudes concurrentes (microbatch.py)"""
+
+    def __init__(self, predictor, scorer, max_espera_ms=MAX_ESPERA_MS_DEFECTO, max_filas_lote=MAX_FILAS_DEFECTO):
+        self.predictor = predictor
+        self.scorer = scorer
+        self.latencias = {}
+        self.tamanos_lote = Histograma([1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024])
+        self.batcher = MicroBatcher(
+            self._evaluar_lote, max_espera_ms=max_espera_ms, max_filas=max_filas_lote,
+            al_despachar=lambda filas, _: self.tamanos_lote.observar(filas)
+        )
+
+    # ---------- scoring ----------
+
+    def _probabilidades(self, X):
+        if len(X) == 0:
+            return np.array([], dtype=np.float64)
+        # El bosque aplanado evita el costo fijo por llamada de sklearn (hilos, validación)
+        modelo = self.scorer.bosque if self.scorer.bosque is not None else self.predictor.model
+        return modelo.predict_proba(X)[:, 1]
+
+    def _matriz_registros(self, registros):
+        """
+        Features de registros crudos de una solicitud. Se agrupan por conjunto de
+        columnas presentes: una columna ausente vale 0 y un nulo se imputa con la
+        mediana (PipelineFeatures.transform), y mezclar registros con columnas
+        distintas en un solo DataFrame convertiría las ausentes en nulos.
+        """
+        X = np.empty((len(registros), len(self.scorer.features)), dtype=np.float32)
+        grupos = {}
+        for i, registro in enumerate(registros):
+            grupos.setdefault(frozenset(registro), []).append(i)
+        for indices in grupos.values():
+            X[indices] = self.scorer.preparar(pd.DataFrame.from_records([registros[i] for i in indices]))
+        return X
+
+    def _evaluar_lote(self, solicitudes):
+        """
+        Evalúa en una sola llamada al modelo un lote de solicitudes
+        {'id_users': [...]} o {'registros': [...]} (hilo del MicroBatcher).
+        Cada solicitud se prepara por separado: el resultado de una no depende
+        de con cuáles comparte lote, y un error solo afecta a la suya.
+
+        Returns:
+            Por solicitud, lista de probabilidades (None para ids desconocidos)
+            o la excepción que produjo al preparar sus registros
+        """
+        bloques, filas, errores = [], [], {}
+        for k, s in enumerate(solicitudes):
+            try:
+                if 'registros' in s:
+                    bloque = self._matriz_registros(s['registros'])
+                    filas.append([True] * len(bloque))
+                else:
+                    posiciones = [self.scorer.posiciones.get(_normalizar_id(i)) for i in s['id_users']]
+                    bloque = self.scorer.X[[p for p in posiciones if p is not None]]
+                    filas.append([p is not None for p in posiciones])
+            except Exception as e:
+                errores[k] = e
+                filas.append([])
+                continue
+            bloques.append(bloque)
+
+        X = np.vstack(bloques) if bloques else np.empty((0, len(self.scorer.features)), dtype=np.float32)
+        probas = iter(self._probabilidades(X).tolist())
+        return [
+            errores[k] if k in errores else [next(probas) if valida else None for valida in validas]
+            for k, validas in enumerate(filas)
+        ]
+
+    async def score_lote(self, id_users=None, registros=None):
+        """Probabilidad y nivel de riesgo por id_user o registro crudo (vía el batcher)"""
+        solicitud = {'id_users': id_users} if id_users is not None else {'registros': registros}
+        filas = len(id_users if id_users is not None else registros)
+        probas = await asyncio.wrap_future(self.batcher.enviar(solicitud, filas=filas))
+        if isinstance(probas, ValueError):
+            raise ErrorSolicitud(400, str(probas))
+        if isinstance(probas, Exception):
+            raise probas
+        return [
+            {'probabilidad': p, 'riesgo': self.predictor.get_risk_level(p)} if p is not None else None
+            for p in probas
+        ]
+
+    # ---------- HTTP ----------
+
+    def observar(self, ruta, segundos):
+        self.latencias.setdefault(ruta, Histograma()).observar(segundos)
+
+    async def atender(self, metodo, ruta, cuerpo):
+        if metodo == 'GET' and ruta == '/health':
+            return 200, 'application/json', {
+                'estado': 'ok',
+                'modelo': type(self.predictor.model).__name__,
+                'usuarios': len(self.scorer.posiciones),
+                'columnas_entrada': self.predictor.columnas_entrada,
+                'columnas_numericas': [r[1] for r in self.predictor.pipeline.reglas if r[0] == 'numerica'],
+                'ids_muestra': [_json_default(i) if isinstance(i, np.generic) else i
+                                for i in list(self.scorer.posiciones)[:1000]]
+            }
+        if metodo == 'GET' and ruta == '/metrics':
+            return 200, 'text/plain; version=0.0.4', self.metricas()
+        if metodo != 'POST':
+            raise ErrorSolicitud(404, f"Ruta no encontrada: {metodo} {ruta}")
+
+        try:
+            datos = json.loads(cuerpo or b'{}')
+        except json.JSONDecodeError:
+            raise ErrorSolicitud(400, "El cuerpo no es JSON válido")
+
+        if ruta == '/score':
+            return 200, 'application/json', await self._score(datos)
+        if ruta == '/score/batch':
+            if 'id_users' in datos:
+                resultados = await self.score_lote(id_users=datos['id_users'])
+            elif 'registros' in datos:
+                for registro in datos['registros']:
+                    self._validar_registro(registro)
+                resultados = await self.score_lote(registros=datos['registros'])
+            else:
+                raise ErrorSolicitud(400, "Se esperaba 'id_users' o 'registros'")
+            return 200, 'application/json', {'resultados': resultados}
+        raise ErrorSolicitud(404, f"Ruta no encontrada: {metodo} {ruta}")
+
+    def _validar_registro(self, registro):
+        faltantes = self.scorer.columnas_sin_mediana(registro)
+        if faltantes:
+            raise ErrorSolicitud(400, f"Valores nulos sin mediana para imputar: {faltantes}")
+
+    async def _score(self, datos):
+        if 'id_user' in datos:
+            id_user = _normalizar_id(datos['id_user'])
+            if id_user not in self.scorer:
+                raise ErrorSolicitud(404, f"Usuario no encontrado: {datos['id_user']}")
+            if datos.get('explicar'):
+                return self.scorer.score_one(id_user) | {'id_user': datos['id_user']}
+            return (await self.score_lote(id_users=[id_user]))[0]
+        if 'features' in datos:
+            self._validar_registro(datos['features'])
+            if datos.get('explicar'):
+                return self.scorer.score_features(datos['features'])
+            return (await self.score_lote(registros=[datos['features']]))[0]
+        raise ErrorSolicitud(400, "Se esperaba 'id_user' o 'features'")
+
+    def metricas(self):
+        lineas = [
+            '# HELP churn_scoring_latencia_segundos Latencia de las solicitudes de scoring',
+            '# TYPE churn_scoring_latencia_segundos histogram'
+        ]
+        for ruta, hist in sorted(self.latencias.items()):
+            lineas += hist.prometheus('churn_scoring_latencia_segundos', f'ruta="{ruta}"')
+        lineas += [
+            '# HELP churn_scoring_tamano_lote Filas por llamada agrupada al modelo',
+            '# TYPE churn_scoring_tamano_lote histogram'
+        ]
+        lineas += self.tamanos_lote.prometheus('churn_scoring_tamano_lote')
+        return '\n'.join(lineas) + '\n'
+
+    async def conexion(self, reader, writer):
+        """Atiende una conexión HTTP/1.1 (con keep-alive)"""
+        try:
+            while True:
+                linea = await reader.readline()
+                if not linea:
+                    break
+                try:
+                    metodo, ruta, _ = linea.decode('latin-1').split(' ', 2)
+                except ValueError:
+                    break
+                encabezados = {}
+                while True:
+                    h = await reader.readline()
+                    if h in (b'\r\n', b'\n', b''):
+                        break
+                    nombre, _, valor = h.decode('latin-1').partition(':')
+                    encabezados[nombre.strip().lower()] = valor.strip()
+                largo = int(encabezados.get('content-length', 0))
+                if largo > MAX_CUERPO_BYTES:
+                    break
+                cuerpo = await reader.readexactly(largo) if largo else b''
+                ruta = urlparse(ruta).path
+
+                inicio = time.perf_counter()
+                try:
+                    estado, tipo, respuesta = await self.atender(metodo, ruta, cuerpo)
+                except ErrorSolicitud as e:
+                    estado, tipo, respuesta = e.estado, 'application/json', {'error': str(e)}
+                except Exception as e:
+                    estado, tipo, respuesta = 500, 'application/json', {'error': str(e)}
+                self.observar(ruta, time.perf_counter() - inicio)
+
+                datos = respuesta if isinstance(respuesta, str) else json.dumps(respuesta, default=_json_default)
+                datos = datos.encode()
+                cerrar = encabezados.get('connection', '').lower() == 'close'
+                writer.write(
+                    f"HTTP/1.1 {estado} {'OK' if estado == 200 else 'Error'}\r\n"
+                    f"Content-Type: {tipo}\r\nContent-Length: {len(datos)}\r\n"
+                    f"Connection: {'close' if cerrar else 'keep-alive'}\r\n\r\n".encode() + datos
+                )
+                await writer.drain()
+                if cerrar:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+
+def _normalizar_id(id_user):
+    """Los ids llegan como JSON (int/str); el índice usa los tipos del CSV"""
+    if isinstance(id_user, str) and id_user.lstrip('-').isdigit():
+        return int(id_user)
+    return id_user
+
+
+def _json_default(valor):
+    if isinstance(valor, np.generic):
+        return valor.item()
+    raise TypeError(f"No serializable: {type(valor)}")
+
+
+def cargar_servicio(base_datos_file=BASE_DATOS_FILE, **opciones_lote):
+    from churn_predictor import ChurnPredictor
+    from scoring_online import ScorerOnline
+
+    predictor = ChurnPredictor()
+    df_base = None
+    if os.path.exists(base_datos_file):
+        columnas = ['id_user'] + predictor.columnas_entrada
+        encabezado = pd.read_csv(base_datos_file, nrows=0).columns
+        df_base = pd.read_csv(base_datos_file, usecols=[c for c in columnas if c in encabezado], low_memory=False)
+    return ServicioScoring(predictor, ScorerOnline(predictor, df_base), **opciones_lote)
+
+
+async def servir(host, puerto, max_espera_ms, max_filas_lote):
+    print("Cargando modelo e índice de usuarios...")
+    servicio = cargar_servicio(max_espera_ms=max_espera_ms, max_filas_lote=max_filas_lote)
+    print(f"   ✓ {len(servicio.scorer.posiciones):,} usuarios indexados")
+    servidor = await asyncio.start_server(servicio.conexion, host, puerto)
+    print(f"Servicio de scoring en http://{host}:{puerto} (Ctrl+C para detener)")
+    async with servidor:
+        await servidor.serve_forever()
+
+
+# ============================================================
+# Prueba de carga con un cliente sintético
+# ============================================================
+
+async def _cliente(host, puerto, cola, latencias, errores, cuerpo_fn):
+    reader, writer = await asyncio.open_connection(host, puerto)
+    try:
+        while True:
+            try:
+                cola.get_nowait()
+            except asyncio.QueueEmpty:
+                break
+            ruta, cuerpo = cuerpo_fn()
+            cuerpo = json.dumps(cuerpo).encode()
+            inicio = time.perf_counter()
+            writer.write(
+                f"POST {ruta} HTTP/1.1\r\nHost: {host}\r\nContent-Type: application/json\r\n"
+                f"Content-Length: {len(cuerpo)}\r\n\r\n".encode() + cuerpo
+            )
+            await writer.drain()
+            estado = (await reader.readline()).split(b' ')[1]
+            largo = 0
+            while True:
+                h = await reader.readline()
+                if h in (b'\r\n', b''):
+                    break
+                if h.lower().startswith(b'content-length'):
+                    largo = int(h.split(b':')[1])
+
+            await reader.readexactly(largo)
+            latencias.append(time.perf_counter() - inicio)
+            if estado != b'200':
+                errores.append(estado)
+    finally:
+        writer.close()
+
+
+async def prueba_carga(url, concurrencia, solicitudes, proporcion_lote, tamano_lote, proporcion_ids):
+    destino = urlparse(url)
+    host, puerto = destino.hostname, destino.port or 80
+
+    # Ids y columnas numéricas del modelo para generar solicitudes sintéticas
+    reader, writer = await asyncio.open_connection(host, puerto)
+    writer.write(f"GET /health HTTP/1.1\r\nHost: {host}\r\nConnection: close\r\n\r\n".encode())
+    respuesta = await reader.read()
+    writer.close()
+    salud = json.loads(respuesta.split(b'\r\n\r\n', 1)[1])
+    ids, columnas = salud['ids_muestra'], salud['columnas_numericas']
+    rng = random.Random(42)
+
+    def registro():
+        # Solo columnas numéricas: las categóricas ausentes se tratan como en el entrenamiento
+        return {c: rng.lognormvariate(2, 1) for c in columnas}
+
+    def cuerpo_fn():
+        if rng.random() < proporcion_lote:
+            return '/score/batch', {'registros': [registro() for _ in range(tamano_lote)]}
+        if ids and rng.random() < proporcion_ids:
+            return '/score', {'id_user': rng.choice(ids)}
+        return '/score', {'features': registro()}
+
+    cola = asyncio.Queue()
+    for i in range(solicitudes):
+        cola.put_nowait(i)
+    latencias, errores = [], []
+    inicio = time.perf_counter()
+    await asyncio.gather(*[
+        _cliente(host, puerto, cola, latencias, errores, cuerpo_fn) for _ in range(concurrencia)
+    ])
+    duracion = time.perf_counter() - inicio
+
+    lat = np.array(latencias) * 1e3
+    print("="*80)
+    print("PRUEBA DE CARGA DEL SERVICIO DE SCORING")
+    print("="*80)
+    print(f"   Solicitudes:   {len(lat):,} ({len(errores)} errores) en {duracion:.2f}s")
+    print(f"   Throughput:    {len(lat) / duracion:,.0f} solicitudes/s")
+    print(f"   Latencia p50:  {np.percentile(lat, 50):.2f} ms")
+    print(f"   Latencia p95:  {np.percentile(lat, 95):.2f} ms")
+    print(f"   Latencia p99:  {np.percentile(lat, 99):.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servicio HTTP local de scoring de churn")
+    sub = parser.add_subparsers(dest='comando', required=True)
+    p_servir = sub.add_parser('servir', help="Iniciar el servicio")
+    p_servir.add_argument('--host', default='127.0.0.1')
+    p_servir.add_argument('--puerto', type=int, default=8765)
+    p_servir.add_argument('--max-espera-ms', type=float, default=MAX_ESPERA_MS_DEFECTO,
+                          help="Espera máxima para agrupar solicitudes concurrentes")
+    p_servir.add_argument('--max-filas-lote', type=int, default=MAX_FILAS_DEFECTO,
+                          help="Filas máximas por llamada al modelo")
+    p_carga = sub.add_parser('carga', help="Prueba de carga con un cliente sintético")
+    p_carga.add_argument('--url', default='http://127.0.0.1:8765')
+    p_carga.add_argument('--concurrencia', type=int, default=32)
+    p_carga.add_argument('--solicitudes', type=int, default=5000)
+    p_carga.add_argument('--proporcion-lote', type=float, default=0.0, help="Fracción de solicitudes a /score/batch")
+    p_carga.add_argument('--tamano-lote', type=int, default=100)
+    p_carga.add_argument('--proporcion-ids', type=float, default=0.5, help="Fracción de /score por id_user (resto por features)")
+    args = parser.parse_args()
+
+    try:
+        if args.comando == 'servir':
+            asyncio.run(servir(args.host, args.puerto, args.max_espera_ms, args.max_filas_lote))
+        else:
+            asyncio.run(prueba_carga(args.url, args.concurrencia, args.solicitudes, args.proporcion_lote, args.tamano_lote, args.proporcion_ids))
+    except KeyboardInterrupt:
+        pass
+    except ConnectionRefusedError:
+        print(f"ERROR: No hay servicio escuchando en {args.url}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()